@@ -1,5 +1,6 @@
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, Body, Path
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import uuid
 from sqlalchemy.sql.expression import case
@@ -19,6 +20,7 @@ from app.schemas.accuracy import (
     AccuracyTest
 )
 from app.services.accuracy_service import AccuracyService
+from app.services.accuracy_runner import accuracy_runner, parse_batch_settings
 
 router = APIRouter()
 
@@ -79,21 +81,38 @@ def get_accuracy_test_items(
         "offset": offset
     }
 
-@router.post("/start", response_model=AccuracyTestDetail)
-def start_accuracy_test(
-    data: StartAccuracyTestRequest,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
-):
-    """开始精度评测"""
+def _prepare_accuracy_test_start(db: Session, data: StartAccuracyTestRequest):
+    """校验并将测试状态更新为运行中（同步数据库操作，在线程池中执行）"""
     service = AccuracyService(db)
     try:
-        test = service.start_test(data.accuracy_test_id)
-        if not test:
+        existing = service.get_test_detail(data.accuracy_test_id)
+        if not existing:
             raise HTTPException(status_code=404, detail="精度评测不存在")
-        return test
+        if data.judge_config:
+            if existing.evaluation_type == "manual":
+                raise HTTPException(status_code=400, detail="人工评测不能由服务端执行")
+            parse_batch_settings(existing.batch_settings)
+        service.check_incremental_start(existing, data.judge_config)
+
+        test = service.start_test(data.accuracy_test_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not test:
+        raise HTTPException(status_code=404, detail="精度评测不存在")
+    return test
+
+@router.post("/start", response_model=AccuracyTestDetail)
+async def start_accuracy_test(
+    data: StartAccuracyTestRequest,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """开始精度评测，提供评测模型配置时由服务端执行AI评测"""
+    # 数据库操作放到线程池，避免阻塞事件循环；服务端评测任务需要在事件循环中启动
+    test = await run_in_threadpool(_prepare_accuracy_test_start, db, data)
+    if data.judge_config:
+        accuracy_runner.start(test.id, data.judge_config)
+    return test
 
 @router.post("/{test_id}/update-progress", response_model=AccuracyTestProgress)
 def update_test_progress(
@@ -164,6 +183,18 @@ def submit_test_item_results(
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/{test_id}/lexical-metrics", response_model=Dict[str, Any])
+def update_lexical_metrics(
+    test_id: uuid.UUID,
+    db: Session = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """重新计算评测项的词汇重合指标（EM、F1、ROUGE-L、chrF），不调用大模型"""
+    service = AccuracyService(db)
+    if not service.get_test_detail(test_id):
+        raise HTTPException(status_code=404, detail="精度评测不存在")
+    return {"updated": service.update_lexical_metrics(test_id)}
+
 @router.post("/{test_id}/human-assignments", response_model=HumanAssignmentDetail)
 def create_human_assignment(
     test_id: uuid.UUID,
@@ -210,7 +241,9 @@ async def interrupt_test(
 ):
     """将测试标记为中断状态"""
     service = AccuracyService(db)
-    return service.mark_test_interrupted(test_id, data.reason)
+    test = service.mark_test_interrupted(test_id, data.reason)
+    accuracy_runner.cancel(test_id)
+    return test
 
 @router.post("/{test_id}/reset")
 async def reset_test(
@@ -1,13 +1,21 @@
+import asyncio
+import json
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app import schemas, models
 from app.api import deps
 from app.api.deps import get_current_user
+from app.db.base import SessionLocal
 from app.models.user import User
 from app.schemas.rag_answer import RAGAnswerWithQuestion
 from app.services.performance_service import performance_service
+from app.services.performance_runner import performance_runner, parse_load_config
+from app.services.live_metrics import live_metrics
+from app.services.slo import parse_slo
 from app.services import rag_service
 from app.schemas.common import PaginatedResponse
 
@@ -35,6 +43,39 @@ def get_project_performance_tests(
     return performance_service.get_by_project(db=db, project_id=project_id)
 
 
+@router.get("/compare")
+def compare_performance_tests(
+    *,
+    db: Session = Depends(deps.get_db),
+    a: str = Query(..., description="基线测试ID"),
+    b: str = Query(..., description="待比较的测试ID"),
+    confidence: float = Query(0.95, gt=0, lt=1, description="置信水平"),
+    resamples: int = Query(10000, ge=100, le=100000, description="自助法重采样次数"),
+    threshold: float = Query(0.0, ge=0, description="判定退化的相对变化阈值，如0.1表示10%"),
+    seed: Optional[int] = Query(None, description="随机种子，用于复现结果"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    对比两次性能测试的延迟分布
+    返回各分位数差值的置信区间、Mann-Whitney U检验和吞吐量比值；
+    某分位数的regressed为true表示在该置信水平下相对变化超过threshold
+    """
+    test_a = performance_service.get(db=db, id=a)
+    test_b = performance_service.get(db=db, id=b)
+    if not test_a or not test_b:
+        raise HTTPException(status_code=404, detail="Performance test not found")
+
+    return performance_service.compare_tests(
+        db,
+        test_a,
+        test_b,
+        n_resamples=resamples,
+        confidence=confidence,
+        regression_threshold=threshold,
+        seed=seed
+    )
+
+
 @router.get("/{performance_test_id}", response_model=schemas.performance.PerformanceTestOut)
 def get_performance_test_by_id(
     *,
@@ -49,14 +90,11 @@ def get_performance_test_by_id(
     return test
 
 
-@router.post("/start", response_model=schemas.performance.PerformanceTestOut)
-def start_performance_test(
-        *,
-        db: Session = Depends(deps.get_db),
-        start_request: schemas.performance.StartPerformanceTestRequest,
-        current_user: User = Depends(get_current_user),
+def _prepare_performance_test_start(
+        db: Session,
+        start_request: schemas.performance.StartPerformanceTestRequest
 ) -> Any:
-    """开始执行性能测试"""
+    """校验并将测试状态更新为运行中（同步数据库操作，在线程池中执行）"""
     # 获取性能测试
     test = performance_service.get(db=db, id=start_request.performance_test_id)
     if not test:
@@ -66,12 +104,40 @@ def start_performance_test(
     if test.status == "running":
         raise HTTPException(status_code=400, detail="Test is already running")
 
+    # 服务端执行前先校验负载配置，SLO配置在开始前校验以免测试完成后才发现无法判定
+    try:
+        if start_request.api_config:
+            parse_load_config(test.config)
+        if (test.config or {}).get("slo"):
+            parse_slo(test.config["slo"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # 将测试状态更新为运行中
-    test = performance_service.start_performance_test(
+    return performance_service.start_performance_test(
         db=db, performance_test_id=start_request.performance_test_id
     )
 
 
+@router.post("/start", response_model=schemas.performance.PerformanceTestOut)
+async def start_performance_test(
+        *,
+        db: Session = Depends(deps.get_db),
+        start_request: schemas.performance.StartPerformanceTestRequest,
+        current_user: User = Depends(get_current_user),
+) -> Any:
+    """开始执行性能测试"""
+    # 数据库操作放到线程池，避免阻塞事件循环；服务端引擎需要在事件循环中启动，所以接口本身保持异步
+    test = await run_in_threadpool(_prepare_performance_test_start, db, start_request)
+
+    # 提供了RAG接口配置时，由服务端引擎执行测试
+    if start_request.api_config:
+        performance_runner.start(
+            test.id,
+            start_request.api_config,
+            start_request.question_ids
+        )
+
     return test
 
 
@@ -110,6 +176,96 @@ def fail_performance_test(
     )
 
 
+def _load_live_test_status(token: str, performance_test_id: str) -> str:
+    """
+    校验用户并读取测试状态（同步数据库操作，在线程池中执行）
+
+    使用独立会话并在推送开始前关闭，推送期间不占用数据库连接
+    """
+    db = SessionLocal()
+    try:
+        deps.get_current_user(db=db, token=token)
+        test = performance_service.get(db=db, id=performance_test_id)
+        if not test:
+            raise HTTPException(status_code=404, detail="Performance test not found")
+        return test.status
+    finally:
+        db.close()
+
+
+@router.get("/{performance_test_id}/live")
+async def stream_live_metrics(
+    *,
+    request: Request,
+    performance_test_id: str,
+    token: str = Depends(deps.oauth2_scheme),
+) -> Any:
+    """以SSE方式每秒推送运行中测试的滚动窗口指标，推送期间的数据来自内存，不查询数据库"""
+    status = await run_in_threadpool(_load_live_test_status, token, performance_test_id)
+
+    async def event_stream():
+        metrics = live_metrics.get(performance_test_id)
+        if metrics is None and status == "running":
+            metrics = live_metrics.get_or_create(performance_test_id)
+        if metrics is None:
+            yield f"data: {json.dumps({'test_id': performance_test_id, 'finished': True, 'status': status})}\n\n"
+            return
+
+        while True:
+            snapshot = metrics.snapshot()
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            if snapshot["finished"] or await request.is_disconnected():
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    )
+
+
+@router.get("/{performance_test_id}/timeline")
+def get_performance_test_timeline(
+    *,
+    db: Session = Depends(deps.get_db),
+    performance_test_id: str,
+    resolution: Optional[float] = Query(None, gt=0, description="时间桶宽度(秒)，按存储的桶宽整数倍合并"),
+    max_points: Optional[int] = Query(500, ge=1, le=10000, description="最多返回的桶数"),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """获取性能测试按时间分桶的吞吐、失败和耗时曲线"""
+    test = performance_service.get(db=db, id=performance_test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Performance test not found")
+
+    timeline = performance_service.get_timeline(test, resolution=resolution, max_points=max_points)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="该测试尚未生成时间线")
+    return timeline
+
+
+@router.get("/{performance_test_id}/verdict")
+def get_performance_test_verdict(
+    *,
+    db: Session = Depends(deps.get_db),
+    performance_test_id: str,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    获取性能测试的SLO判定结果，供流水线作为门禁使用
+    passed为true/false表示通过/不通过，测试未完成时为null；violations列出不满足的指标
+    """
+    test = performance_service.get(db=db, id=performance_test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Performance test not found")
+
+    verdict = performance_service.get_verdict(test)
+    if verdict is None:
+        raise HTTPException(status_code=404, detail="该测试未配置SLO")
+    return verdict
+
+
 @router.get("/{performance_test_id}/qa-pairs", response_model=PaginatedResponse[RAGAnswerWithQuestion])
 def get_performance_test_qa_pairs(
     performance_test_id: str,
@@ -145,6 +301,7 @@ async def interrupt_test(
     test = performance_service.mark_test_interrupted(db, test_id, reason.get("reason", "页面刷新导致评测中断"))
     if not test:
         raise HTTPException(status_code=404, detail="测试不存在")
+    performance_runner.cancel(test_id)
     return test
 
 @router.post("/{test_id}/reset", response_model=schemas.performance.PerformanceTestOut)
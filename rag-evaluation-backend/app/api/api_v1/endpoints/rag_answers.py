@@ -16,11 +16,13 @@ from app.schemas.rag_answer import (
     ApiRequestConfig,
     CollectionProgress,
     RagAnswerCreate,
-    RagAnswerUpdate
+    RagAnswerUpdate,
+    PerformanceAnswerBulkCreate
 )
 from app.services.rag_service import RagService
 from app.models.rag_answer import RagAnswer
-from app.models.dataset import Dataset
+from app.models.dataset import Dataset, ProjectDataset
+from app.models.performance import PerformanceTest
 
 router = APIRouter()
 
@@ -41,13 +43,15 @@ async def collect_rag_answers(
     if project.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="无权在此项目中收集回答")
     
-    # 检查问题是否属于项目
-    questions = db.query(Question).filter(
+    # 检查问题是否属于项目关联的数据集
+    question_count = db.query(Question.id).join(
+        ProjectDataset, ProjectDataset.dataset_id == Question.dataset_id
+    ).filter(
         Question.id.in_(req.question_ids),
-        Question.project_id == req.project_id
-    ).all()
+        ProjectDataset.project_id == req.project_id
+    ).distinct().count()
     
-    if len(questions) != len(req.question_ids):
+    if question_count != len(set(req.question_ids)):
         raise HTTPException(status_code=400, detail="部分问题ID无效或不属于此项目")
     
     # 创建服务实例并收集回答
@@ -55,10 +59,9 @@ async def collect_rag_answers(
     results = await rag_service.collect_answers_batch(
         req.question_ids,
         req.api_config,
-        req.concurrent_requests,
-        req.max_attempts,
-        req.source_system,
-        req.collect_performance
+        concurrent_requests=req.concurrent_requests,
+        max_attempts=req.max_attempts,
+        collect_performance=req.collect_performance
     )
     
     return results
@@ -253,6 +256,28 @@ def create_rag_answer(
     
     return rag_answer
 
+@router.post("/bulk", response_model=Dict[str, Any])
+def bulk_create_rag_answers(
+    *,
+    db: Session = Depends(get_db),
+    req: PerformanceAnswerBulkCreate,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    批量写入性能测试结果，返回每条记录的写入状态
+    """
+    performance_test = db.query(PerformanceTest).filter(PerformanceTest.id == req.performance_test_id).first()
+    if not performance_test:
+        raise HTTPException(status_code=404, detail="性能测试不存在")
+
+    # 检查项目权限
+    project = db.query(Project).filter(Project.id == performance_test.project_id).first()
+    if project and project.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="无权写入此性能测试的结果")
+
+    rag_service = RagService(db)
+    return rag_service.bulk_create_performance_answers(performance_test, req.items)
+
 @router.get("/question/{question_id}/version/{version}", response_model=RagAnswerOut)
 def get_rag_answer_by_version(
     *,
@@ -13,6 +13,8 @@ import httpx
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, get_db
+from app.core.http_client import http_client_registry
+from app.core.rate_limiter import llm_rate_limiter
 from app.models.user import User
 
 router = APIRouter()
@@ -40,48 +42,48 @@ async def proxy_rag_request(
     
     async def generate_response():
         try:
-            # 设置超时
-            timeout = httpx.Timeout(request.timeout)
+            # 复用目标主机的共享连接池，超时按请求设置
+            client = http_client_registry.get_client(request.url)
+
+            # 准备请求参数
+            req_kwargs = {
+                "method": request.method,
+                "url": request.url,
+                "headers": request.headers,
+                "timeout": request.timeout,
+            }
             
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                # 准备请求参数
-                req_kwargs = {
-                    "method": request.method,
-                    "url": request.url,
-                    "headers": request.headers,
-                }
-                
-                if request.body:
-                    req_kwargs["json"] = request.body
-                
-                # 检查是否为流式请求
-                content_type = request.headers.get('Accept', '')
-                is_stream = 'text/event-stream' in content_type or 'stream' in str(request.body).lower()
-                
-                if is_stream:
-                    # 流式请求
-                    async with client.stream(**req_kwargs) as response:
-                        if response.status_code != 200:
-                            error_text = await response.aread()
-                            yield f"data: {json.dumps({'error': f'HTTP {response.status_code}: {error_text.decode()}'})}\n\n"
-                            return
-                        
-                        # 转发流式响应
-                        async for chunk in response.aiter_bytes():
-                            if chunk:
-                                yield chunk.decode('utf-8', errors='ignore')
-                else:
-                    # 非流式请求
-                    response = await client.request(**req_kwargs)
-                    
+            if request.body:
+                req_kwargs["json"] = request.body
+            
+            # 检查是否为流式请求
+            content_type = request.headers.get('Accept', '')
+            is_stream = 'text/event-stream' in content_type or 'stream' in str(request.body).lower()
+            
+            if is_stream:
+                # 流式请求
+                async with client.stream(**req_kwargs) as response:
                     if response.status_code != 200:
-                        error_text = response.text
-                        yield json.dumps({'error': f'HTTP {response.status_code}: {error_text}'})
+                        error_text = await response.aread()
+                        yield f"data: {json.dumps({'error': f'HTTP {response.status_code}: {error_text.decode()}'})}\n\n"
                         return
                     
-                    # 返回完整响应
-                    yield response.text
-                    
+                    # 转发流式响应
+                    async for chunk in response.aiter_bytes():
+                        if chunk:
+                            yield chunk.decode('utf-8', errors='ignore')
+            else:
+                # 非流式请求
+                response = await client.request(**req_kwargs)
+                
+                if response.status_code != 200:
+                    error_text = response.text
+                    yield json.dumps({'error': f'HTTP {response.status_code}: {error_text}'})
+                    return
+                
+                # 返回完整响应
+                yield response.text
+                
         except httpx.TimeoutException:
             yield json.dumps({'error': '请求超时'})
         except httpx.ConnectError:
@@ -120,31 +122,31 @@ async def test_rag_proxy(
     测试RAG代理连接
     """
     try:
-        timeout = httpx.Timeout(10)  # 测试时使用较短超时
+        client = http_client_registry.get_client(request.url)
+
+        req_kwargs = {
+            "method": request.method,
+            "url": request.url,
+            "headers": request.headers,
+            "timeout": 10,  # 测试时使用较短超时
+        }
+        
+        if request.body:
+            req_kwargs["json"] = request.body
+        
+        start_time = time.time()
+        response = await client.request(**req_kwargs)
+        response_time = time.time() - start_time
+        
+        return {
+            "success": True,
+            "status_code": response.status_code,
+            "response_time": round(response_time * 1000, 2),  # 毫秒
+            "content_length": len(response.content),
+            "content_preview": response.text[:200] if response.text else "",
+            "headers": dict(response.headers)
+        }
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            req_kwargs = {
-                "method": request.method,
-                "url": request.url,
-                "headers": request.headers,
-            }
-            
-            if request.body:
-                req_kwargs["json"] = request.body
-            
-            start_time = time.time()
-            response = await client.request(**req_kwargs)
-            response_time = time.time() - start_time
-            
-            return {
-                "success": True,
-                "status_code": response.status_code,
-                "response_time": round(response_time * 1000, 2),  # 毫秒
-                "content_length": len(response.content),
-                "content_preview": response.text[:200] if response.text else "",
-                "headers": dict(response.headers)
-            }
-            
     except httpx.TimeoutException:
         return {
             "success": False,
@@ -162,4 +164,24 @@ async def test_rag_proxy(
             "success": False,
             "error": f"请求失败: {str(e)}",
             "error_type": "unknown"
-        } 
\ No newline at end of file
+        } 
+
+
+@router.get("/pool-stats")
+async def get_pool_stats(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    查看出站HTTP连接池的统计信息（连接数、复用率）
+    """
+    return {"pools": http_client_registry.stats()}
+
+
+@router.get("/rate-limit-stats")
+async def get_rate_limit_stats(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    查看大模型请求限流器的限额和累计用量（按服务商、模型和API密钥摘要）
+    """
+    return {"limits": llm_rate_limiter.stats()}
@@ -65,6 +65,24 @@ class Settings(BaseSettings):
     # Redis设置
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
+
+    # 出站HTTP连接池设置（RAG系统与大模型调用共享）
+    HTTP2_ENABLED: bool = False
+    HTTP_KEEPALIVE_ENABLED: bool = True
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_DEFAULT_POOL_SIZE: int = 10
+    HTTP_DEFAULT_TIMEOUT: float = 60.0
+
+    # 大模型评测结果缓存的进程内LRU容量（条），数据库中的缓存不受此限制
+    JUDGE_CACHE_SIZE: int = 10000
+
+    # 大模型请求限流（按服务商主机名、模型和API密钥计数），0表示不限制
+    LLM_DEFAULT_RPM: int = 0
+    LLM_DEFAULT_TPM: int = 0
+    # 按 "主机名/模型" 或 "主机名" 单独配置，如 {"api.openai.com/gpt-4o": {"rpm": 500, "tpm": 30000}}
+    LLM_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    # 令牌桶容量为多少秒的配额，决定空闲后允许的突发量
+    LLM_RATE_LIMIT_BURST_SECONDS: float = 10.0
     
     # CORS设置
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
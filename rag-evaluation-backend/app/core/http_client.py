@@ -0,0 +1,216 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 被替换的旧连接池每隔多少秒检查一次是否已空闲
+RETIRED_POOL_CHECK_SECONDS = 1.0
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """响应体读完或关闭时把请求计为完成"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, owner: "_PooledClient"):
+        self._stream = stream
+        self._owner = owner
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._owner.in_flight -= 1
+        await self._stream.aclose()
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """包装默认传输层，统计从发出请求到响应关闭之间的在途请求数"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, owner: "_PooledClient"):
+        self._transport = transport
+        self._owner = owner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._owner.in_flight += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._owner.in_flight -= 1
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_CountedStream(response.stream, self._owner),
+            extensions=response.extensions,
+            request=request
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class _PooledClient:
+    """单个目标主机的连接池及其统计信息"""
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.loop = asyncio.get_running_loop()
+        self.requests = 0
+        self.connections_opened = 0
+        # 正在发送或尚未读完响应的请求数
+        self.in_flight = 0
+        # 通过 lease() 持有该客户端的测试数
+        self.holders = 0
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY if settings.HTTP_KEEPALIVE_ENABLED else 0
+        )
+        self.client = httpx.AsyncClient(
+            timeout=settings.HTTP_DEFAULT_TIMEOUT,
+            transport=_CountingTransport(
+                httpx.AsyncHTTPTransport(http2=settings.HTTP2_ENABLED, limits=limits), self
+            ),
+            event_hooks={"request": [self._on_request]}
+        )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        # 每建立一条新的TCP连接记一次，用于确认连接是否被复用
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "http2": settings.HTTP2_ENABLED,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": 1 - self.connections_opened / self.requests if self.requests else None
+        }
+
+
+class HttpClientRegistry:
+    """应用级的出站HTTP客户端注册表
+
+    按目标主机(scheme, host, port)维护共享连接池，所有RAG和大模型请求复用连接，
+    避免每个问题都重新进行TCP+TLS握手。请求的连接池大小超过现有池时会新建更大的池，
+    旧池在持有它的测试结束、在途请求完成后关闭；事件循环变化后遗留的旧池也会被关闭。
+    需要在整个测试期间使用同一客户端的调用方应通过 lease() 获取，单次请求可直接用 get_client()。
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str, Optional[int]], _PooledClient] = {}
+        self._retired: List[_PooledClient] = []
+        self._close_tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _host_key(url: str) -> Tuple[str, str, Optional[int]]:
+        parts = urlsplit(url)
+        return parts.scheme, parts.hostname or "", parts.port
+
+    def _get_entry(self, url: str, pool_size: Optional[int]) -> _PooledClient:
+        pool_size = max(pool_size or 0, settings.HTTP_DEFAULT_POOL_SIZE)
+        key = self._host_key(url)
+        current_loop = asyncio.get_running_loop()
+
+        entry = self._clients.get(key)
+        if entry is not None and entry.loop is not current_loop:
+            # 连接绑定在创建它的事件循环上，循环已变化时关闭旧池
+            self._close_foreign(entry)
+            entry = None
+        if entry is not None and entry.pool_size < pool_size:
+            self._retire(entry)
+            entry = None
+        if entry is None:
+            entry = _PooledClient(pool_size)
+            self._clients[key] = entry
+        return entry
+
+    def get_client(self, url: str, pool_size: Optional[int] = None) -> httpx.AsyncClient:
+        """获取目标URL所在主机的共享客户端，pool_size通常取测试并发数"""
+        return self._get_entry(url, pool_size).client
+
+    @asynccontextmanager
+    async def lease(self, url: str, pool_size: Optional[int] = None) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        在一次测试期间持有共享客户端
+
+        持有期间即使连接池被更大的池替换也不会被关闭，最后一个持有者退出后旧池才会关闭
+        """
+        entry = self._get_entry(url, pool_size)
+        entry.holders += 1
+        try:
+            yield entry.client
+        finally:
+            entry.holders -= 1
+
+    def _retire(self, entry: _PooledClient) -> None:
+        """替换下来的连接池在没有持有者和在途请求后关闭"""
+        self._retired.append(entry)
+        task = asyncio.get_running_loop().create_task(self._close_when_drained(entry))
+        self._close_tasks.add(task)
+        task.add_done_callback(self._close_tasks.discard)
+
+    async def _close_when_drained(self, entry: _PooledClient) -> None:
+        # 连续两次检查之间没有新请求才关闭，避免刚通过 get_client() 取得客户端的调用方发送失败
+        seen = None
+        while entry.holders or entry.in_flight or entry.requests != seen:
+            seen = entry.requests
+            await asyncio.sleep(RETIRED_POOL_CHECK_SECONDS)
+        if entry in self._retired:
+            self._retired.remove(entry)
+        await entry.client.aclose()
+
+    def _close_foreign(self, entry: _PooledClient) -> None:
+        """关闭绑定在其他事件循环上的连接池"""
+        if entry in self._retired:
+            self._retired.remove(entry)
+        if entry.loop.is_running() and not entry.loop.is_closed():
+            # 其他线程中的事件循环仍在运行，交给它关闭
+            asyncio.run_coroutine_threadsafe(entry.client.aclose(), entry.loop)
+        else:
+            # 事件循环已结束，无法再 await aclose()；丢弃引用后由asyncio传输层在回收时关闭套接字
+            logger.debug(f"连接池所属的事件循环已结束，丢弃连接池: {entry.stats()}")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各主机连接池的统计信息"""
+        result = []
+        for (scheme, host, port), entry in self._clients.items():
+            result.append({
+                "host": f"{scheme}://{host}" + (f":{port}" if port else ""),
+                **entry.stats()
+            })
+        return result
+
+    async def aclose(self) -> None:
+        """关闭全部连接池"""
+        current_loop = asyncio.get_running_loop()
+        for task in list(self._close_tasks):
+            if task.get_loop() is current_loop:
+                task.cancel()
+        entries = list(self._clients.values()) + self._retired
+        self._clients.clear()
+        self._retired.clear()
+        for entry in entries:
+            if entry.loop is current_loop:
+                await entry.client.aclose()
+            else:
+                self._close_foreign(entry)
+
+
+http_client_registry = HttpClientRegistry()
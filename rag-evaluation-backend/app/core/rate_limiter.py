@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+
+# 中日韩文字大约每个字一个token，其余文本大约每4个字符一个token
+_CJK_CHAR = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# 每条消息的格式开销
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """不依赖分词器粗略估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_CHAR.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """估算chat/completions请求中messages的token数"""
+    return sum(estimate_tokens(str(message.get("content") or "")) + MESSAGE_TOKEN_OVERHEAD for message in messages)
+
+
+class _TokenBucket:
+    """按分钟配额匀速补充的令牌桶，容量为 LLM_RATE_LIMIT_BURST_SECONDS 秒的配额
+
+    余量可以被扣成负数（单次请求超过桶容量、或实际用量超过预估时），之后的请求等到补回为止
+    """
+
+    def __init__(self, per_minute: int):
+        self.level = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+        self.set_rate(per_minute)
+        self.level = self.capacity
+
+    def set_rate(self, per_minute: int) -> None:
+        self._refill()
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * settings.LLM_RATE_LIMIT_BURST_SECONDS)
+        self.level = min(self.level, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """取得amount个令牌还需等待的秒数，超过桶容量的请求只需等桶满"""
+        self._refill()
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class _ProviderLimit:
+    """单个 (服务商, 模型, API密钥) 的RPM/TPM限额"""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = _TokenBucket(rpm) if rpm else None
+        self.tokens = _TokenBucket(tpm) if tpm else None
+        # 请求按到达顺序依次取得令牌，避免并发请求同时醒来后一起超额；锁绑定在使用它的事件循环上
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.blocked_until = 0.0
+        self.stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "waited_seconds": 0.0, "throttled": 0}
+
+    def update(self, rpm: int, tpm: int) -> None:
+        for name, per_minute in (("requests", rpm), ("tokens", tpm)):
+            bucket = getattr(self, name)
+            if not per_minute:
+                setattr(self, name, None)
+            elif bucket is None:
+                setattr(self, name, _TokenBucket(per_minute))
+            elif bucket.per_minute != per_minute:
+                bucket.set_rate(per_minute)
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self, prompt_tokens: int) -> None:
+        async with self._get_lock():
+            start = time.monotonic()
+            while True:
+                wait = max(
+                    self.blocked_until - time.monotonic(),
+                    self.requests.wait_time(1) if self.requests else 0.0,
+                    self.tokens.wait_time(prompt_tokens) if self.tokens else 0.0,
+                )
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(prompt_tokens)
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["waited_seconds"] += time.monotonic() - start
+
+    def settle(self, tokens: int) -> None:
+        """按响应中的用量补扣令牌（完成token数及实际与预估prompt token数的差值）"""
+        if self.tokens and tokens:
+            self.tokens.consume(tokens)
+
+    def throttle(self, seconds: float) -> None:
+        """服务商返回429时暂停发送新请求"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.stats["throttled"] += 1
+
+
+class RatePermit:
+    """一次已放行的请求，调用方收到响应后通过它回报实际用量"""
+
+    def __init__(self, limits: List[_ProviderLimit], prompt_tokens: int):
+        self._limits = limits
+        self.prompt_tokens = prompt_tokens
+
+    def record_usage(self, usage: Optional[Dict[str, Any]], completion_text: Optional[str] = None) -> None:
+        """
+        按响应的usage补扣TPM令牌；响应没有usage时按回复内容估算完成token数
+        """
+        if not self._limits:
+            return
+        usage = usage if isinstance(usage, dict) else {}
+        try:
+            completion_tokens = int(usage["completion_tokens"])
+        except (KeyError, TypeError, ValueError):
+            completion_tokens = estimate_tokens(completion_text)
+        extra = completion_tokens
+        try:
+            extra += int(usage["prompt_tokens"]) - self.prompt_tokens
+        except (KeyError, TypeError, ValueError):
+            pass
+        for limit in self._limits:
+            limit.stats["completion_tokens"] += completion_tokens
+            limit.settle(extra)
+
+    def throttle(self, retry_after: Optional[float]) -> None:
+        """服务商返回429时调用，按Retry-After（缺省1秒）暂停同一限额下的所有请求"""
+        for limit in self._limits:
+            limit.throttle(retry_after if retry_after and retry_after > 0 else 1.0)
+
+
+class LLMRateLimiter:
+    """应用级的大模型请求限流器
+
+    按 (服务商, 模型, API密钥) 维护RPM和TPM两个令牌桶，精度评测的评测模型调用和问答对生成共用，
+    同一密钥下不同用户、不同测试的请求一起计入限额。服务商以接口地址的主机名区分。
+    发送前按估算的prompt token数取令牌，收到响应后按实际用量补扣，使吞吐量稳定在配额附近而不是反复触发429。
+    共享限额只取自 LLM_RATE_LIMITS 中 "主机名/模型" 或 "主机名" 的配置，其次是 LLM_DEFAULT_RPM/LLM_DEFAULT_TPM，
+    为0表示不限制。调用方传入的rpm/tpm另建令牌桶，请求须同时取得两边的令牌，即按较严格的限额执行，
+    不会修改或取消其他调用方共用的限额。限流状态保存在进程内，多进程部署时各进程分别计数。
+    """
+
+    def __init__(self):
+        self._limits: Dict[Tuple[str, str, str], _ProviderLimit] = {}
+        # 调用方传入的限额，相同限额的调用方共用令牌桶
+        self._overrides: Dict[Tuple[str, str, str, int, int], _ProviderLimit] = {}
+
+    @staticmethod
+    def _provider(base_url: str) -> str:
+        parts = urlsplit(base_url)
+        return (parts.hostname or base_url) + (f":{parts.port}" if parts.port else "")
+
+    @staticmethod
+    def _configured(provider: str, model: str) -> Dict[str, int]:
+        configured = settings.LLM_RATE_LIMITS or {}
+        return configured.get(f"{provider}/{model}") or configured.get(provider) or {}
+
+    def _get_limits(
+        self,
+        base_url: str,
+        model: str,
+        api_key: Optional[str],
+        rpm: Optional[int],
+        tpm: Optional[int]
+    ) -> List[_ProviderLimit]:
+        """返回本次请求需要取得令牌的限额：调用方的限额（如有）和系统配置的共享限额（如有）"""
+        provider = self._provider(base_url)
+        # 只保存密钥的摘要
+        key = (provider, model, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16])
+
+        limits = []
+        if rpm or tpm:
+            override_key = key + (rpm or 0, tpm or 0)
+            override = self._overrides.get(override_key)
+            if override is None:
+                override = _ProviderLimit(rpm or 0, tpm or 0)
+                self._overrides[override_key] = override
+            limits.append(override)
+
+        configured = self._configured(provider, model)
+        shared_rpm = configured.get("rpm", settings.LLM_DEFAULT_RPM)
+        shared_tpm = configured.get("tpm", settings.LLM_DEFAULT_TPM)
+        if not shared_rpm and not shared_tpm:
+            self._limits.pop(key, None)
+            return limits
+        # 共享限额只随系统配置变化
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = _ProviderLimit(shared_rpm, shared_tpm)
+            self._limits[key] = limit
+        else:
+            limit.update(shared_rpm, shared_tpm)
+        limits.append(limit)
+        return limits
+
+    @asynccontextmanager
+    async def limit(
+        self,
+        base_url: str,
+        model: str,
+        api_key: Optional[str],
+        messages: List[Dict[str, Any]],
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None
+    ) -> AsyncIterator[RatePermit]:
+        """
+        在限额内发送一次chat/completions请求，rpm/tpm只能在共享限额之外进一步收紧
+
+        用法: async with llm_rate_limiter.limit(...) as permit: 发送请求后调用 permit.record_usage(usage)
+        """
+        limits = self._get_limits(base_url, model, api_key, rpm, tpm)
+        prompt_tokens = estimate_prompt_tokens(messages)
+        # 先取调用方限额的令牌，避免在共享限额上占位后再等待自己的限额
+        for limit in limits:
+            await limit.acquire(prompt_tokens)
+        yield RatePermit(limits, prompt_tokens)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各限额的配置和累计用量，scope为shared（系统配置的共享限额）或caller（调用方传入的限额）"""
+        result = []
+        entries = [("shared", key, limit) for key, limit in self._limits.items()]
+        entries += [("caller", key[:3], limit) for key, limit in self._overrides.items()]
+        for scope, (provider, model, key_digest), limit in entries:
+            result.append({
+                "provider": provider,
+                "model": model,
+                "api_key": key_digest[:8],
+                "scope": scope,
+                "rpm": limit.requests.per_minute if limit.requests else 0,
+                "tpm": limit.tokens.per_minute if limit.tokens else 0,
+                **limit.stats,
+                "waited_seconds": round(limit.stats["waited_seconds"], 3),
+            })
+        return result
+
+
+llm_rate_limiter = LLMRateLimiter()
@@ -0,0 +1,23 @@
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """共享的异步Redis客户端，首次执行命令时才建立连接"""
+    global _client
+    if _client is None:
+        _client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, decode_responses=True)
+    return _client
+
+
+async def close_redis() -> None:
+    """关闭Redis连接池"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
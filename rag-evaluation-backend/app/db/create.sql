@@ -409,7 +409,8 @@ create table public.performance_tests
     success_questions   integer                  default 0                            not null,
     failed_questions    integer                  default 0                            not null,
     summary_metrics     jsonb                    default '{}'::jsonb                  not null,
-    rag_config          varchar(200)
+    rag_config          varchar(200),
+    timeline            jsonb
 );
 
 comment on table public.performance_tests is 'RAG系统性能测试表';
@@ -428,6 +429,8 @@ comment on column public.performance_tests.concurrency is '并发请求数量';
 
 comment on column public.performance_tests.version is '版本标识，与rag_answers表中的version对应';
 
+comment on column public.performance_tests.timeline is '按时间分桶的完成数、失败数、平均/p95耗时和在途请求数(列式数组)';
+
 comment on column public.performance_tests.created_at is '测试创建时间';
 
 comment on column public.performance_tests.started_at is '测试开始时间';
@@ -527,6 +530,11 @@ create table public.rag_answers
             references public.performance_tests
             on delete set null,
     sequence_number       integer,
+    first_byte_time       numeric(10, 3),
+    generation_time       numeric(10, 3),
+    chunk_offsets         bytea,
+    attempts              integer,
+    attempt_errors        jsonb,
     constraint unique_question_version
         unique (question_id, version)
 );
@@ -557,6 +565,16 @@ comment on column public.rag_answers.performance_test_id is '关联的性能测
 
 comment on column public.rag_answers.sequence_number is '在性能测试中的序号';
 
+comment on column public.rag_answers.first_byte_time is '首字节到达时间(秒)';
+
+comment on column public.rag_answers.generation_time is '首个内容token到回答结束的生成耗时(秒)';
+
+comment on column public.rag_answers.chunk_offsets is '流式分片到达时间：首个值为首个分片到达的毫秒数，其余为相邻分片间隔毫秒数，小端int32编码';
+
+comment on column public.rag_answers.attempts is '请求尝试次数，为空表示1次';
+
+comment on column public.rag_answers.attempt_errors is '失败尝试的错误分类列表(JSON数组)，按尝试顺序排列';
+
 alter table public.rag_answers
     owner to postgres;
 
@@ -708,6 +726,7 @@ create table public.accuracy_test_items
     ai_evaluation_reason    text,
     ai_evaluation_time      timestamp with time zone,
     ai_raw_response         jsonb,
+    lexical_metrics         jsonb,
     human_score             numeric,
     human_dimension_scores  jsonb,
     human_evaluation_reason text,
@@ -749,6 +768,8 @@ comment on column public.accuracy_test_items.ai_evaluation_time is 'AI评测时
 
 comment on column public.accuracy_test_items.ai_raw_response is 'AI评测原始响应。样例：{"id":"chatcmpl-123", "choices":[{"index":0, "message":{"role":"assistant", "content":"评分：4分。理由：回答准确包含了大部分关键信息，但缺少了一些细节。"}, "finish_reason":"stop"}], "usage":{"prompt_tokens":420, "completion_tokens":65, "total_tokens":485}}';
 
+comment on column public.accuracy_test_items.lexical_metrics is '参考答案与RAG回答的词汇重合指标（0-1），创建评测时计算。样例：{"exact_match": 0, "token_f1": 0.82, "char_f1": 0.85, "rouge_l": 0.76, "chrf": 0.71}';
+
 comment on column public.accuracy_test_items.human_score is '人工评测评分';
 
 comment on column public.accuracy_test_items.human_dimension_scores is '人工评测各维度评分详情。样例：{"accuracy": 5, "relevance": 4, "completeness": 4}';
@@ -853,3 +874,34 @@ create index idx_human_assignments_access_code
 
 create index idx_human_assignments_status
     on public.accuracy_human_assignments (status);
+
+create table public.llm_judge_cache
+(
+    cache_key         varchar(64)              not null
+        primary key,
+    model_name        varchar(255)             not null,
+    overall_score     numeric                  not null,
+    dimension_scores  jsonb,
+    evaluation_reason text,
+    usage             jsonb,
+    created_at        timestamp with time zone default CURRENT_TIMESTAMP
+);
+
+comment on table public.llm_judge_cache is '大模型评测结果缓存表，按评测输入内容寻址';
+
+comment on column public.llm_judge_cache.cache_key is '缓存键：模型、提示词模板、评分方法、评估维度、问题、参考答案和RAG回答的SHA-256';
+
+comment on column public.llm_judge_cache.model_name is '评测模型名称';
+
+comment on column public.llm_judge_cache.overall_score is '总体评分';
+
+comment on column public.llm_judge_cache.dimension_scores is '各维度评分。样例：{"accuracy": 4, "relevance": 3}';
+
+comment on column public.llm_judge_cache.evaluation_reason is '评估理由';
+
+comment on column public.llm_judge_cache.usage is '首次评测时接口返回的token用量';
+
+comment on column public.llm_judge_cache.created_at is '创建时间';
+
+alter table public.llm_judge_cache
+    owner to postgres;
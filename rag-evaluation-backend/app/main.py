@@ -1,10 +1,24 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
+from app.core.http_client import http_client_registry
+from app.core.redis_client import close_redis
 from app.api.api_v1.api import api_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 关闭时释放共享的出站连接池
+    await http_client_registry.aclose()
+    await close_redis()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     # openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
@@ -81,6 +81,9 @@ class AccuracyTestItem(Base):
     ai_evaluation_time = Column(DateTime(timezone=True))
     ai_raw_response = Column(JSONB)
     
+    # 参考答案与RAG回答的词汇重合指标（exact_match、token_f1、char_f1、rouge_l、chrf），创建评测时计算
+    lexical_metrics = Column(JSONB)
+    
     # 人工评测结果
     human_score = Column(Numeric)
     human_dimension_scores = Column(JSONB)
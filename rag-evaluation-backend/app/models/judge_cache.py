@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, Text, DateTime, Numeric
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class JudgeCacheEntry(Base):
+    """大模型评测结果缓存表，缓存键为评测输入内容的哈希"""
+    __tablename__ = "llm_judge_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    model_name = Column(String(255), nullable=False)
+    overall_score = Column(Numeric, nullable=False)
+    dimension_scores = Column(JSONB)
+    evaluation_reason = Column(Text)
+    usage = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
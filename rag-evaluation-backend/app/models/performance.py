@@ -31,4 +31,5 @@ class PerformanceTest(Base):
     failed_questions = Column(Integer, default=0, nullable=False)
     
     summary_metrics = Column(JSONB, default={}, nullable=False)
+    timeline = Column(JSONB)  # 按时间分桶的吞吐/失败/耗时/在途请求数，列式存储
     rag_config = Column(String(200), nullable=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Float, UniqueConstraint
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Integer, Float, LargeBinary, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -22,7 +22,12 @@ class RagAnswer(Base):
     first_response_time = Column(Float)  # 首次响应时间(秒)，使用numeric(10,3)
     total_response_time = Column(Float)  # 总响应时间(秒)，使用numeric(10,3)
     character_count = Column(Integer)  # 字符数
-    characters_per_second = Column(Float)  # 生成速度(字符/秒)，使用numeric(10,2)
+    characters_per_second = Column(Float)  # 生成速度(字符/秒)，仅按生成耗时计算，使用numeric(10,2)
+    first_byte_time = Column(Float)  # 首字节到达时间(秒)
+    generation_time = Column(Float)  # 首个内容token到回答结束的生成耗时(秒)
+    chunk_offsets = Column(LargeBinary)  # 流式分片到达时间，差分编码的毫秒数(小端int32)
+    attempts = Column(Integer)  # 请求尝试次数，为空表示1次
+    attempt_errors = Column(JSONB)  # 失败尝试的错误分类，按尝试顺序排列
     
     raw_response = Column(JSONB)  # 原始API响应
     # 删除不存在的字段
@@ -1,3 +1,5 @@
+import uuid
+
 from sqlalchemy import CHAR, TypeDecorator
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -11,8 +13,11 @@ class StringUUID(TypeDecorator):
             return value
         elif dialect.name == "postgresql":
             return str(value)
-        else:
+        elif isinstance(value, uuid.UUID):
             return value.hex
+        else:
+            # 其他数据库中查询结果是字符串，再次作为参数时需要统一成相同格式
+            return uuid.UUID(str(value)).hex
 
     def load_dialect_impl(self, dialect):
         if dialect.name == "postgresql":
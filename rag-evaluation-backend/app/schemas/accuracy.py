@@ -22,6 +22,7 @@ class AccuracyTestBase(BaseModel):
 class AccuracyTestCreate(AccuracyTestBase):
     project_id: UUID
     dataset_id: UUID
+    base_test_id: Optional[UUID] = None  # 可选，基于已有测试增量评测，内容未变化的评测项直接复制评分
 
 # 创建响应
 class AccuracyTestCreateResponse(AccuracyTestBase):
@@ -104,6 +105,7 @@ class AccuracyTestItemDetail(BaseModel):
     human_evaluation_reason: Optional[str] = None
     human_evaluator_id: Optional[str] = None
     human_evaluation_time: Optional[datetime] = None
+    lexical_metrics: Optional[Dict[str, float]] = None
     sequence_number: Optional[int] = None
     
     # 额外信息 - 从关联表中获取
@@ -138,9 +140,19 @@ class HumanAssignmentDetail(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+# 评测模型配置（OpenAI兼容接口），只在启动时传入，API密钥不保存
+class JudgeModelConfig(BaseModel):
+    base_url: str  # 如 https://api.openai.com/v1
+    api_key: Optional[str] = None
+    model_name: str
+    additional_params: Optional[Dict[str, Any]] = None  # 附加请求参数，如temperature、max_tokens
+    rpm: Optional[int] = Field(None, ge=0)  # 每分钟请求数限额，与系统配置的限额同时生效（取较严格者），不填或0为不另加限制
+    tpm: Optional[int] = Field(None, ge=0)  # 每分钟token数限额，与系统配置的限额同时生效（取较严格者），不填或0为不另加限制
+
 # 开始测试请求
 class StartAccuracyTestRequest(BaseModel):
     accuracy_test_id: UUID
+    judge_config: Optional[JudgeModelConfig] = None  # 可选，提供时由服务端执行AI评测，否则由前端执行
 
 # 获取评测项的请求
 class GetTestItemsRequest(BaseModel):
@@ -3,6 +3,8 @@ from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
 import uuid
 
+from app.schemas.rag_answer import ApiRequestConfig
+
 class PerformanceTestBase(BaseModel):
     name: str
     project_id: str
@@ -54,4 +56,5 @@ class PerformanceMetrics(BaseModel):
 
 class StartPerformanceTestRequest(BaseModel):
     performance_test_id: str
-    question_ids: Optional[List[str]] = None  # 可选，如果为空则使用数据集中的所有问题 
\ No newline at end of file
+    question_ids: Optional[List[str]] = None  # 可选，如果为空则使用数据集中的所有问题
+    api_config: Optional[ApiRequestConfig] = None  # 可选，提供时由服务端执行测试，否则由前端执行 
\ No newline at end of file
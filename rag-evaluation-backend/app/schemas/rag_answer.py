@@ -1,8 +1,10 @@
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from datetime import datetime
 import uuid
 
+import numpy as np
+
 class RagAnswerBase(BaseModel):
     question_id: str
     answer: str
@@ -44,6 +46,17 @@ class RagAnswerOut(RagAnswerInDBBase):
 class RagAnswerDetail(RagAnswerInDBBase):
     raw_response: Optional[Dict[str, Any]] = None
     characters_per_second: Optional[float] = None
+    first_byte_time: Optional[float] = None
+    generation_time: Optional[float] = None
+    chunk_offsets: Optional[List[int]] = None  # 各流式分片相对请求开始的到达时间(毫秒)
+
+    @field_validator("chunk_offsets", mode="before")
+    @classmethod
+    def decode_chunk_offsets(cls, v: Any) -> Any:
+        # 数据库中为差分编码的二进制，返回时还原为累计毫秒数
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            return np.cumsum(np.frombuffer(v, dtype="<i4")).tolist()
+        return v
 
 # API请求模型
 class ApiRequestConfig(BaseModel):
@@ -52,6 +65,8 @@ class ApiRequestConfig(BaseModel):
     headers: Optional[Dict[str, str]] = None
     request_template: Dict[str, Any]
     response_path: str = "answer"  # 从响应中提取答案的JSON路径
+    stream_event_field: Optional[str] = None  # 流式响应中用于筛选内容事件的字段，如Dify的event
+    stream_event_value: Optional[str] = None  # 流式响应中内容事件的字段值，如Dify的message
     timeout: int = 60  # 秒
 
 class BatchCollectionRequest(BaseModel):
@@ -81,6 +96,31 @@ class CollectionProgress(BaseModel):
 class RagAnswerBatchCreate(BaseModel):
     items: List[RagAnswerCreate]
 
+# 性能测试结果批量写入的单条记录
+class PerformanceAnswerItem(BaseModel):
+    question_id: str
+    answer: Optional[str] = None
+    success: bool = True
+    version: Optional[str] = None
+    sequence_number: Optional[int] = None
+    first_response_time: Optional[float] = None
+    total_response_time: Optional[float] = None
+    first_byte_time: Optional[float] = None
+    generation_time: Optional[float] = None
+    character_count: Optional[int] = None
+    characters_per_second: Optional[float] = None
+    raw_response: Optional[Dict[str, Any]] = None
+    error_details: Optional[Dict[str, Any]] = None
+    chunk_offsets: Optional[List[float]] = None  # 各内容分片相对请求开始的到达时间(秒)
+    attempts: Optional[int] = None  # 请求尝试次数
+    attempt_errors: Optional[List[str]] = None  # 各失败尝试的错误分类
+    completed_at: Optional[datetime] = None  # 客户端收到完整回答或请求失败的时间，缺省为写入时间
+
+# 性能测试结果批量写入请求
+class PerformanceAnswerBulkCreate(BaseModel):
+    performance_test_id: str
+    items: List[PerformanceAnswerItem] = Field(..., max_length=1000)
+
 class RAGAnswerWithQuestion(BaseModel):
     id: str
     question_id: str
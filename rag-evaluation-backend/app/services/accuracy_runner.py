@@ -0,0 +1,418 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.orm import Session
+
+from app.core.http_client import http_client_registry
+from app.db.base import SessionLocal
+from app.models.accuracy import AccuracyTest, AccuracyTestItem
+from app.models.question import Question
+from app.models.rag_answer import RagAnswer
+from app.schemas.accuracy import JudgeModelConfig
+from app.services.accuracy_service import AccuracyService
+from app.services.judge_cache import judge_cache, judge_cache_key
+from app.services.llm_judge import (
+    batch_prompt_template,
+    build_judge_prompt,
+    judge_batch_with_retry,
+    judge_with_retry
+)
+
+logger = logging.getLogger(__name__)
+
+# 与前端执行器的默认并发数一致
+DEFAULT_CONCURRENCY = 6
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_TIMEOUT_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+# 记入 results_summary.judge_batching，说明批量评测与逐项评测的区别
+BATCH_PROMPT_NOTE = (
+    "批量评测以测试的提示词模板为评分规则，多个评测项合并在一个请求中并按JSON数组输出，"
+    "评分规则相同但上下文和输出格式不同，分数可能与逐项评测略有差异，评测结果缓存与逐项评测分开"
+)
+# 默认每个请求只评测一个评测项，批量评测需显式开启
+DEFAULT_JUDGE_BATCH_SIZE = 1
+
+
+def parse_batch_settings(batch_settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    解析并校验服务端评测使用的 batch_settings
+
+    - concurrency: 同时进行的评测请求数，默认6
+    - batch_size: 每攒够多少条结果写一次数据库，默认10
+    - timeout_seconds: 单次评测请求超时(秒)，默认300
+    - max_attempts: 单个评测项的最大尝试次数（超时、429、5xx、输出格式不正确时重试），默认3
+    - use_cache: 是否使用评测结果缓存，评测输入完全相同时直接复用以前的评分，默认true
+    - judge_batch_size: 每个评测请求包含的评测项数，大于1时开启批量评测，默认1
+    """
+    batch_settings = batch_settings or {}
+    parsed = {}
+    for key, default, cast in (
+        ("concurrency", DEFAULT_CONCURRENCY, int),
+        ("batch_size", DEFAULT_BATCH_SIZE, int),
+        ("timeout_seconds", DEFAULT_TIMEOUT_SECONDS, float),
+        ("max_attempts", DEFAULT_MAX_ATTEMPTS, int),
+        ("judge_batch_size", DEFAULT_JUDGE_BATCH_SIZE, int),
+    ):
+        value = batch_settings.get(key)
+        try:
+            parsed[key] = cast(value) if value is not None else default
+        except (TypeError, ValueError):
+            raise ValueError(f"batch_settings.{key} 必须是数字")
+        if parsed[key] <= 0:
+            raise ValueError(f"batch_settings.{key} 必须大于0")
+    parsed["use_cache"] = bool(batch_settings.get("use_cache", True))
+    return parsed
+
+
+class AccuracyRunner:
+    """服务端精度评测执行引擎
+
+    以 batch_settings.concurrency 个asyncio工作协程调用评测模型，逐项评测测试中待评测的评测项，
+    结果按批经 AccuracyService.submit_test_item_results 写入数据库，浏览器关闭后评测仍会继续执行。
+    只处理状态为pending的评测项，中断后重新启动时跳过已完成的评测项。
+    评测前先按输入内容查询评测结果缓存（judge_cache），命中的评测项不再调用评测模型，
+    命中率记录在 results_summary.judge_cache 中。
+    judge_batch_size 大于1时每个工作协程一次取出多个评测项合并成一个请求，批量提示词以测试的提示词模板为评分规则、
+    要求按JSON数组输出；回复中缺失或格式不正确的评测项改用测试的提示词模板逐项评测，
+    请求数和两种方式的差异说明记录在 results_summary.judge_batching 中。
+    缓存键包含实际使用的提示词模板，批量评测与逐项评测的结果分开缓存，只查询本次评测方式对应的缓存。
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def is_running(self, test_id: str) -> bool:
+        """检查评测是否正在服务端执行"""
+        task = self._tasks.get(str(test_id))
+        return task is not None and not task.done()
+
+    def start(self, test_id: str, judge_config: JudgeModelConfig) -> asyncio.Task:
+        """在当前事件循环中启动评测任务"""
+        test_id = str(test_id)
+        if self.is_running(test_id):
+            raise ValueError("评测已在服务端执行中")
+
+        task = asyncio.create_task(self._run(test_id, judge_config))
+        self._tasks[test_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(test_id, None))
+        return task
+
+    def cancel(self, test_id: str) -> bool:
+        """取消正在执行的评测，返回是否存在对应任务"""
+        task = self._tasks.get(str(test_id))
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def _load_pending_items(self, db: Session, test_id: str) -> List[Tuple[str, str, str, str]]:
+        """加载待评测项的问题ID、问题、参考答案和RAG回答"""
+        rows = db.query(
+            AccuracyTestItem.question_id,
+            Question.question_text,
+            Question.standard_answer,
+            RagAnswer.answer
+        ).join(
+            Question, AccuracyTestItem.question_id == Question.id
+        ).join(
+            RagAnswer, AccuracyTestItem.rag_answer_id == RagAnswer.id
+        ).filter(
+            AccuracyTestItem.evaluation_id == test_id,
+            AccuracyTestItem.status == "pending"
+        ).order_by(AccuracyTestItem.sequence_number).all()
+        return [(str(row[0]), row[1], row[2], row[3]) for row in rows]
+
+    def _cache_key(
+        self,
+        test: AccuracyTest,
+        judge_config: JudgeModelConfig,
+        prompt_template: Optional[str],
+        item: Tuple[str, str, str, str]
+    ) -> str:
+        """prompt_template为得出评分时实际使用的模板：测试的提示词模板或批量评测的内置模板"""
+        _, question_text, standard_answer, answer = item
+        return judge_cache_key(
+            judge_config.model_name, prompt_template, test.scoring_method, test.dimensions,
+            question_text, standard_answer, answer
+        )
+
+    def _lookup_cache(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return judge_cache.get_many(db, keys)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _completed_row(question_id: str, evaluation: Dict[str, Any], raw_response: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": question_id,
+            "status": "ai_completed",
+            "ai_score": evaluation["overall_score"],
+            "ai_dimension_scores": evaluation["dimension_scores"],
+            "ai_evaluation_reason": evaluation["evaluation_reason"],
+            "ai_raw_response": raw_response,
+        }
+
+    async def _judge_item(
+        self,
+        client: httpx.AsyncClient,
+        test: AccuracyTest,
+        judge_config: JudgeModelConfig,
+        settings: Dict[str, Any],
+        item: Tuple[str, str, str, str]
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]:
+        """
+        评测单个评测项，返回submit_test_item_results使用的结果、需要写入缓存的评估结果（失败时为None）
+        和使用的提示词模板
+        """
+        question_id, question_text, standard_answer, answer = item
+        prompt = build_judge_prompt(
+            test.prompt_template, question_text, standard_answer, answer, test.scoring_method, test.dimensions
+        )
+        result = await judge_with_retry(
+            client,
+            judge_config,
+            prompt,
+            test.scoring_method,
+            test.dimensions,
+            settings["timeout_seconds"],
+            settings["max_attempts"]
+        )
+        raw_response = {
+            "content": result["content"],
+            "usage": result["usage"],
+            "attempts": result["attempts"],
+            "elapsed": result["elapsed"],
+        }
+        if result["evaluation"] is None:
+            return {
+                "id": question_id,
+                "status": "failed",
+                "error_message": result["error"],
+            }, None, test.prompt_template
+        evaluation = result["evaluation"]
+        return (
+            self._completed_row(question_id, evaluation, raw_response),
+            {**evaluation, "usage": result["usage"]},
+            test.prompt_template
+        )
+
+    async def _judge_batch(
+        self,
+        client: httpx.AsyncClient,
+        test: AccuracyTest,
+        judge_config: JudgeModelConfig,
+        settings: Dict[str, Any],
+        items: List[Tuple[str, str, str, str]],
+        batch_stats: Dict[str, int]
+    ) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]]:
+        """在一个请求中评测多个评测项，返回值与逐项调用_judge_item相同，批量得出的评分对应嵌入测试模板的批量提示词模板"""
+        result = await judge_batch_with_retry(
+            client,
+            judge_config,
+            [(question_text, standard_answer, answer) for _, question_text, standard_answer, answer in items],
+            test.scoring_method,
+            test.dimensions,
+            settings["timeout_seconds"],
+            settings["max_attempts"],
+            test.prompt_template
+        )
+        batch_stats["batch_requests"] += 1
+        # 用量属于整个批量请求，不按评测项拆分
+        raw_response = {
+            "batch_size": len(items),
+            "usage": result["usage"],
+            "attempts": result["attempts"],
+            "elapsed": result["elapsed"],
+        }
+
+        outcomes = []
+        for index, (item, evaluation) in enumerate(zip(items, result["evaluations"])):
+            if evaluation is None:
+                # 批量回复中没有可用结果，逐项重新评测；在当前工作协程中顺序执行，不超出并发数
+                batch_stats["fallback_items"] += 1
+                outcomes.append(await self._judge_item(client, test, judge_config, settings, item))
+                continue
+            batch_stats["batched_items"] += 1
+            outcomes.append((
+                self._completed_row(item[0], evaluation, {**raw_response, "batch_index": index}),
+                {**evaluation, "usage": None},
+                batch_prompt_template(test.prompt_template)
+            ))
+        return outcomes
+
+    def _flush(
+        self,
+        test_id: str,
+        model_name: str,
+        rows: List[Dict[str, Any]],
+        cache_entries: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """在线程池中写入一批评测结果和新的缓存，并由AccuracyService更新进度（全部完成时自动完成测试）"""
+        db = SessionLocal()
+        try:
+            judge_cache.put_many(db, model_name, cache_entries)
+            AccuracyService(db).submit_test_item_results(test_id, rows)
+        finally:
+            db.close()
+
+    def _finish(self, test_id: str, run_stats: Dict[str, Any]) -> None:
+        """
+        评测项全部处理后，测试仍为运行中（如部分评测项不在本次范围内）时标记完成，
+        并把缓存命中、批量评测等执行情况记入结果汇总
+        """
+        db = SessionLocal()
+        try:
+            service = AccuracyService(db)
+            test = db.query(AccuracyTest).filter(AccuracyTest.id == test_id).first()
+            if test and test.status == "running":
+                test = service.complete_test(test_id)
+            if test and run_stats:
+                test.results_summary = {**(test.results_summary or {}), **run_stats}
+                db.commit()
+        finally:
+            db.close()
+
+    def _prepare(
+        self, test_id: str, judge_config: JudgeModelConfig
+    ) -> Optional[Tuple[AccuracyTest, List[Tuple[str, str, str, str]]]]:
+        """
+        记录评测模型并加载待评测项（同步数据库操作，在线程池中执行）
+
+        返回的测试对象已脱离会话，评测期间只读取其列值。
+        """
+        db = SessionLocal()
+        try:
+            test = db.query(AccuracyTest).filter(AccuracyTest.id == test_id).first()
+            if not test:
+                return None
+
+            # 记录使用的评测模型，API密钥不保存
+            test.model_config_test = {
+                **(test.model_config_test or {}),
+                "model_name": judge_config.model_name,
+                "base_url": judge_config.base_url,
+            }
+            db.commit()
+            db.refresh(test)
+            db.expunge(test)
+            return test, self._load_pending_items(db, test_id)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _fail(test_id: str, message: str) -> None:
+        """标记测试失败（同步数据库操作，在线程池中执行）"""
+        db = SessionLocal()
+        try:
+            AccuracyService(db).fail_test(test_id, {"message": message})
+        finally:
+            db.close()
+
+    async def _run(self, test_id: str, judge_config: JudgeModelConfig) -> None:
+        # 数据库操作都在线程池中以独立会话执行，加载大量评测项时不阻塞同一事件循环中的其他评测
+        try:
+            prepared = await asyncio.to_thread(self._prepare, test_id, judge_config)
+            if prepared is None:
+                logger.error(f"精度评测不存在: {test_id}")
+                return
+            test, items = prepared
+
+            settings = parse_batch_settings(test.batch_settings)
+            results: List[Dict[str, Any]] = []
+            cache_entries: Dict[str, Dict[str, Any]] = {}
+            write_lock = asyncio.Lock()
+
+            async def flush(force: bool = False) -> None:
+                # 检查阈值和取出缓冲区之间没有await，不会与其他工作协程交错；取出后其他协程可以继续评测和攒结果
+                if not results or (not force and len(results) < settings["batch_size"]):
+                    return
+                rows, entries = results[:], dict(cache_entries)
+                results.clear()
+                cache_entries.clear()
+                # 写库按取出的顺序串行执行，避免并发事务各自统计进度时互相覆盖
+                async with write_lock:
+                    await asyncio.to_thread(self._flush, test_id, judge_config.model_name, rows, entries)
+
+            judge_batch_size = settings["judge_batch_size"]
+            # 命中缓存的评测项直接写入结果，其余进入评测队列；批量评测时查询批量提示词下的缓存
+            pending: asyncio.Queue = asyncio.Queue()
+            cache_stats = None
+            if settings["use_cache"] and items:
+                lookup_template = (
+                    batch_prompt_template(test.prompt_template) if judge_batch_size > 1 else test.prompt_template
+                )
+                keys = [self._cache_key(test, judge_config, lookup_template, item) for item in items]
+                cached = await asyncio.to_thread(self._lookup_cache, keys)
+                for item, key in zip(items, keys):
+                    if key in cached:
+                        results.append(self._completed_row(item[0], cached[key], {"cached": True, "cache_key": key}))
+                    else:
+                        pending.put_nowait(item)
+                cache_stats = {
+                    "lookups": len(items),
+                    "hits": len(results),
+                    "misses": len(items) - len(results),
+                    "hit_rate": round(len(results) / len(items), 4),
+                }
+                await flush(force=True)
+            else:
+                for item in items:
+                    pending.put_nowait(item)
+            logger.info(
+                f"服务端精度评测开始: {test_id}, 待评测 {len(items)} 项, 需调用评测模型 {pending.qsize()} 项, "
+                f"并发 {settings['concurrency']}"
+            )
+
+            batch_stats = {"batch_requests": 0, "batched_items": 0, "fallback_items": 0}
+
+            async def worker(client):
+                while True:
+                    batch = []
+                    while len(batch) < judge_batch_size:
+                        try:
+                            batch.append(pending.get_nowait())
+                        except asyncio.QueueEmpty:
+                            break
+                    if not batch:
+                        return
+                    if len(batch) == 1:
+                        outcomes = [await self._judge_item(client, test, judge_config, settings, batch[0])]
+                    else:
+                        outcomes = await self._judge_batch(client, test, judge_config, settings, batch, batch_stats)
+                    for item, (row, evaluation, prompt_template) in zip(batch, outcomes):
+                        results.append(row)
+                        if settings["use_cache"] and evaluation:
+                            cache_entries[self._cache_key(test, judge_config, prompt_template, item)] = evaluation
+                    await flush()
+
+            async with http_client_registry.lease(judge_config.base_url, settings["concurrency"]) as client:
+                await asyncio.gather(*(worker(client) for _ in range(settings["concurrency"])))
+            await flush(force=True)
+
+            run_stats: Dict[str, Any] = {}
+            if cache_stats is not None:
+                run_stats["judge_cache"] = cache_stats
+            if judge_batch_size > 1:
+                run_stats["judge_batching"] = {
+                    "judge_batch_size": judge_batch_size,
+                    **batch_stats,
+                    "prompt": BATCH_PROMPT_NOTE,
+                }
+            await asyncio.to_thread(self._finish, test_id, run_stats)
+            logger.info(f"服务端精度评测完成: {test_id}, 执行情况: {run_stats}")
+
+        except asyncio.CancelledError:
+            # 中断接口已负责更新测试状态，未写入的结果对应的评测项保持pending
+            logger.info(f"服务端精度评测已取消: {test_id}")
+            raise
+        except Exception as e:
+            logger.exception(f"服务端精度评测执行失败: {test_id}")
+            await asyncio.to_thread(self._fail, test_id, str(e))
+
+
+accuracy_runner = AccuracyRunner()
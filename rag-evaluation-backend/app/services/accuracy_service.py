@@ -2,11 +2,13 @@ from typing import List, Dict, Any, Optional, Union, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_, desc, asc, case
 import uuid
+import hashlib
 import json
 import random
 import string
 from datetime import datetime, timedelta
 import logging
+import numpy as np
 from fastapi import HTTPException
 
 from app.models.accuracy import AccuracyTest, AccuracyTestItem, AccuracyHumanAssignment
@@ -17,17 +19,42 @@ from app.schemas.accuracy import (
     AccuracyTestDetail,
     AccuracyTestProgress,
     AccuracyTestItemCreate,
-    HumanAssignmentCreate
+    HumanAssignmentCreate,
+    JudgeModelConfig
 )
+from app.services.lexical_metrics import METRIC_NAMES, lexical_metric_rows
 
 logger = logging.getLogger(__name__)
 
+# 已完成评测的评测项状态
+COMPLETED_ITEM_STATUSES = ["ai_completed", "human_completed", "both_completed"]
+# 增量评测时从基准测试复制的评分字段
+COPIED_ITEM_FIELDS = [
+    "final_score", "final_dimension_scores", "final_evaluation_reason", "final_evaluation_type",
+    "ai_score", "ai_dimension_scores", "ai_evaluation_reason", "ai_evaluation_time", "ai_raw_response",
+    "human_score", "human_dimension_scores", "human_evaluation_reason", "human_evaluator_id", "human_evaluation_time",
+]
+
+
+def item_content_hash(question_text: Optional[str], standard_answer: Optional[str], answer: Optional[str]) -> str:
+    """评测项输入内容（问题、参考答案、RAG回答）的SHA-256"""
+    payload = json.dumps([question_text or "", standard_answer or "", answer or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class AccuracyService:
     def __init__(self, db: Session):
         self.db = db
     
     def create_test(self, data: AccuracyTestCreate, user_id: Optional[uuid.UUID] = None) -> AccuracyTest:
-        """创建新的精度评测任务"""
+        """
+        创建新的精度评测任务
+
+        指定 base_test_id 时为增量评测：问题、参考答案和RAG回答都与基准测试相同且已完成评测的评测项直接复制评分，
+        只有内容变化或新增的评测项为pending；全部评测项都复制时测试直接完成
+        """
+        base_test = self._get_base_test(data) if data.base_test_id else None
+
         # 创建评测对象
         test = AccuracyTest(
             project_id=data.project_id,
@@ -40,7 +67,7 @@ class AccuracyService:
             weights=data.weights or {dim: 1.0 for dim in data.dimensions},
             prompt_template=data.prompt_template,
             version=data.version,
-            model_config_test=data.model_config_test,
+            model_config_test=self._model_config(data, base_test),
             batch_settings=data.batch_settings or {"batch_size": 10, "timeout_seconds": 300},
             status="created",
             created_by=user_id
@@ -58,6 +85,8 @@ class AccuracyService:
         # 创建评测项目
         test_items = []
         processed_question_ids = set()
+        standard_answers = []
+        answers = []
         
         for idx, question in enumerate(questions):
             if str(question.id) in processed_question_ids:
@@ -78,29 +107,135 @@ class AccuracyService:
             if not rag_answer:
                 continue
             
-            # 创建评测项
+            # 创建评测项，记录评测时的输入内容摘要，供以后的增量评测比较
             test_item = AccuracyTestItem(
                 evaluation_id=test.id,
                 question_id=question.id,
                 rag_answer_id=rag_answer.id,
                 sequence_number=len(test_items) + 1,
-                status="pending"
+                status="pending",
+                item_metadata={
+                    "content_hash": item_content_hash(
+                        question.question_text, question.standard_answer, rag_answer.answer
+                    )
+                }
             )
             test_items.append(test_item)
             processed_question_ids.add(str(question.id))
+            standard_answers.append(question.standard_answer)
+            answers.append(rag_answer.answer)
         
         # 更新测试的问题总数
         test.total_questions = len(test_items)
         
+        # 对整个测试批量计算词汇重合指标，不需要调用大模型
+        for test_item, metrics in zip(test_items, lexical_metric_rows(standard_answers, answers)):
+            test_item.lexical_metrics = metrics
+        
+        copied = self._copy_base_results(base_test, test_items) if base_test else 0
+        
         # 批量添加评测项目
         if test_items:
             self.db.bulk_save_objects(test_items)
         
+        if copied:
+            test.processed_questions = copied
+            test.success_questions = copied
+            if copied == len(test_items):
+                test.status = "completed"
+                test.started_at = test.completed_at = datetime.utcnow()
+                self.db.flush()
+                test.results_summary = self._calculate_test_results(test.id)
+        
         self.db.commit()
         self.db.refresh(test)
         
+        if base_test:
+            logger.info(
+                f"增量精度评测: test_id={test.id}, base_test_id={base_test.id}, "
+                f"复制评分 {copied} 项, 待评测 {len(test_items) - copied} 项"
+            )
         return test
     
+    def _get_base_test(self, data: AccuracyTestCreate) -> AccuracyTest:
+        """查找增量评测的基准测试并检查评分设置是否一致，不一致时复制的评分与重新评测结果不可比"""
+        base_test = self.db.query(AccuracyTest).filter(
+            AccuracyTest.id == data.base_test_id
+        ).first()
+        if not base_test:
+            raise ValueError("基准测试不存在")
+        if uuid.UUID(str(base_test.project_id)) != uuid.UUID(str(data.project_id)):
+            raise ValueError("基准测试不属于该项目")
+        
+        mismatched = [
+            name for name, base_value, value in (
+                ("evaluation_type", base_test.evaluation_type, data.evaluation_type),
+                ("scoring_method", base_test.scoring_method, data.scoring_method),
+                ("dimensions", list(base_test.dimensions or []), list(data.dimensions)),
+                ("prompt_template", base_test.prompt_template or "", data.prompt_template or ""),
+            )
+            if base_value != value
+        ]
+        if data.evaluation_type != "manual":
+            # 任一方未记录评测模型时无法确认两次评分出自同一模型，按不一致处理
+            base_model = (base_test.model_config_test or {}).get("model_name")
+            model = (data.model_config_test or {}).get("model_name")
+            if not base_model or not model or base_model != model:
+                mismatched.append("model_name")
+        if mismatched:
+            raise ValueError(f"评测设置与基准测试不一致，无法增量评测: {', '.join(mismatched)}")
+        return base_test
+    
+    @staticmethod
+    def _model_config(data: AccuracyTestCreate, base_test: Optional[AccuracyTest]) -> Optional[Dict[str, Any]]:
+        """增量评测在模型配置中记录基准测试ID，开始评测时据此限制执行方式和评测模型"""
+        if not base_test:
+            return data.model_config_test
+        return {**(data.model_config_test or {}), "base_test_id": str(base_test.id)}
+    
+    def check_incremental_start(self, test: AccuracyTest, judge_config: Optional[JudgeModelConfig]) -> None:
+        """
+        增量评测只能由服务端执行：浏览器端执行器会重新评测全部问题，覆盖复制的评分；
+        服务端评测模型必须与创建时声明的模型一致，否则复制的评分与新评分不可比
+        """
+        config = test.model_config_test or {}
+        if not config.get("base_test_id") or test.evaluation_type == "manual":
+            return
+        if judge_config is None:
+            raise ValueError("增量评测只能由服务端执行，请提供评测模型配置")
+        if judge_config.model_name != config.get("model_name"):
+            raise ValueError(
+                f"评测模型 {judge_config.model_name} 与基准测试的评测模型 {config.get('model_name')} 不一致"
+            )
+    
+    def _copy_base_results(self, base_test: AccuracyTest, test_items: List[AccuracyTestItem]) -> int:
+        """
+        把基准测试中内容未变化且已完成的评测项评分复制到新评测项，返回复制的数量
+        
+        较早的测试没有记录评测时的内容摘要，无法确认评分对应的内容，这些评测项重新评测
+        """
+        base_items = {}
+        for base_item in self.db.query(AccuracyTestItem).filter(
+            AccuracyTestItem.evaluation_id == base_test.id,
+            AccuracyTestItem.status.in_(COMPLETED_ITEM_STATUSES)
+        ):
+            content_hash = (base_item.item_metadata or {}).get("content_hash")
+            if content_hash:
+                base_items[str(base_item.question_id)] = (content_hash, base_item)
+        
+        copied = 0
+        for item in test_items:
+            match = base_items.get(str(item.question_id))
+            if not match or match[0] != item.item_metadata["content_hash"]:
+                continue
+            base_item = match[1]
+            for field in COPIED_ITEM_FIELDS:
+                setattr(item, field, getattr(base_item, field))
+            item.status = base_item.status
+            item.item_metadata = {**item.item_metadata, "copied_from": str(base_item.id)}
+            copied += 1
+        return copied
+    
     def get_tests_by_project(self, project_id: uuid.UUID) -> List[AccuracyTest]:
         """获取项目的所有精度评测"""
         return self.db.query(AccuracyTest).filter(
@@ -172,6 +307,7 @@ class AccuracyService:
                 "human_evaluation_reason": item.human_evaluation_reason,
                 "human_evaluator_id": item.human_evaluator_id,
                 "human_evaluation_time": item.human_evaluation_time,
+                "lexical_metrics": item.lexical_metrics,
                 "sequence_number": item.sequence_number,
                 "question_content": question_content,
                 "reference_answer": reference_answer,
@@ -337,7 +473,11 @@ class AccuracyService:
                     item.status = "ai_completed" if test.evaluation_type == "ai" else "human_completed"
                 elif item.status in ["ai_completed", "human_completed"]:
                     item.status = "both_completed"
-        
+
+            # 评测失败的原因记录在评测项元数据中
+            if item_data.get("error_message"):
+                item.item_metadata = {**(item.item_metadata or {}), "error_message": item_data["error_message"]}
+
         self.db.commit()
         
         # 更新测试进度和结果
@@ -475,6 +615,9 @@ class AccuracyService:
             "evaluation_type": test.evaluation_type,
             "scoring_method": test.scoring_method
         }
+        lexical_summary = self._calculate_lexical_summary(items)
+        if lexical_summary:
+            results_summary["lexical_metrics"] = lexical_summary
         
         return results_summary
     
@@ -600,6 +743,50 @@ class AccuracyService:
         db.refresh(test)
         return test
 
+    def _calculate_lexical_summary(self, items: List[AccuracyTestItem]) -> Dict[str, Any]:
+        """计算评测项词汇重合指标的平均值，没有指标的评测项（早于该功能创建）不参与计算"""
+        rows = [item.lexical_metrics for item in items if item.lexical_metrics]
+        if not rows:
+            return {}
+        values = np.array([[row.get(name, np.nan) for name in METRIC_NAMES] for row in rows], dtype=float)
+        means = np.nanmean(values, axis=0)
+        return {
+            "count": len(rows),
+            **{name: round(float(mean), 4) for name, mean in zip(METRIC_NAMES, means)}
+        }
+    
+    def update_lexical_metrics(self, test_id: uuid.UUID) -> int:
+        """重新计算测试全部评测项的词汇重合指标（用于该功能之前创建的测试），返回评测项数量"""
+        rows = self.db.query(
+            AccuracyTestItem.id,
+            Question.standard_answer,
+            RagAnswer.answer
+        ).join(
+            Question, AccuracyTestItem.question_id == Question.id
+        ).join(
+            RagAnswer, AccuracyTestItem.rag_answer_id == RagAnswer.id
+        ).filter(
+            AccuracyTestItem.evaluation_id == test_id
+        ).all()
+        if not rows:
+            return 0
+        
+        metrics = lexical_metric_rows([row[1] for row in rows], [row[2] for row in rows])
+        self.db.bulk_update_mappings(AccuracyTestItem, [
+            {"id": row[0], "lexical_metrics": item_metrics} for row, item_metrics in zip(rows, metrics)
+        ])
+        
+        # 已完成的测试同时更新结果汇总
+        test = self.db.query(AccuracyTest).filter(AccuracyTest.id == test_id).first()
+        if test and test.status == "completed" and test.results_summary:
+            completed = self.db.query(AccuracyTestItem).filter(
+                AccuracyTestItem.evaluation_id == test_id,
+                AccuracyTestItem.status.in_(COMPLETED_ITEM_STATUSES)
+            ).all()
+            test.results_summary = {**test.results_summary, "lexical_metrics": self._calculate_lexical_summary(completed)}
+        self.db.commit()
+        return len(rows)
+    
     def _calculate_score_distribution(self, items: List[AccuracyTestItem]) -> Dict[str, int]:
         """计算分数分布"""
         distribution = {
@@ -0,0 +1,398 @@
+import asyncio
+import base64
+import json
+import logging
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.http_client import http_client_registry
+from app.schemas.rag_answer import ApiRequestConfig
+from app.services.live_metrics import LatencyHistogram, LiveTestMetrics
+from app.services.rag_service import request_rag_answer_with_retry
+from app.services.result_writer import ResultWriter, build_answer_row
+
+logger = logging.getLogger(__name__)
+
+# 正在执行的分布式测试ID集合，工作节点从这里发现任务
+ACTIVE_TESTS_KEY = "perf:active_tests"
+DEFAULT_BATCH_SIZE = 20
+# 工作节点领取批次后的租约时长（秒），节点宕机时批次在租约过期后重新入队
+DEFAULT_LEASE_SECONDS = 60
+# 取消测试后等待工作节点交回已测量结果的最长时间（秒）
+STOP_DRAIN_SECONDS = 30
+# 工作节点检查测试是否已取消并续租的间隔（秒）
+HEARTBEAT_INTERVAL = 1.0
+# 协调端已结束后才交回的结果保留时长（秒），避免残留键
+RESULT_TTL_SECONDS = 3600
+
+
+def test_keys(test_id: str) -> Dict[str, str]:
+    """单个测试在Redis中使用的键"""
+    prefix = f"perf:{test_id}"
+    return {
+        "meta": f"{prefix}:meta",
+        "pending": f"{prefix}:pending",
+        "processing": f"{prefix}:processing",
+        "results": f"{prefix}:results",
+    }
+
+
+def lease_key(test_id: str, batch_id: int) -> str:
+    return f"perf:{test_id}:lease:{batch_id}"
+
+
+def encode_answer_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """把build_answer_row生成的行转换为可JSON序列化的结构"""
+    encoded = dict(row)
+    encoded["created_at"] = row["created_at"].isoformat()
+    if row["chunk_offsets"] is not None:
+        encoded["chunk_offsets"] = base64.b64encode(row["chunk_offsets"]).decode("ascii")
+    return encoded
+
+
+def decode_answer_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    row = dict(data)
+    row["created_at"] = datetime.fromisoformat(data["created_at"])
+    if data["chunk_offsets"] is not None:
+        row["chunk_offsets"] = base64.b64decode(data["chunk_offsets"])
+    return row
+
+
+class DistributedCoordinator:
+    """
+    分布式性能测试的协调端，运行在后端进程中
+
+    把问题切分为批次放入Redis队列，工作节点按批次领取并交回回答和延迟直方图，
+    协调端负责写库、更新实时指标并合并各节点的统计结果。
+    """
+
+    def __init__(self, client: redis.Redis, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.redis = client
+        self.lease_seconds = lease_seconds
+
+    async def run(
+        self,
+        test_id: str,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        *,
+        concurrency: int,
+        max_attempts: int,
+        version: Optional[str],
+        batch_size: int,
+        writer: ResultWriter,
+        live: LiveTestMetrics
+    ) -> Optional[Dict[str, Any]]:
+        """发布批次并等待全部批次完成，返回合并后的分布式执行统计"""
+        if not questions:
+            return None
+        keys = test_keys(test_id)
+        batches = [
+            json.dumps({"id": index, "questions": questions[start:start + batch_size]}, ensure_ascii=False)
+            for index, start in enumerate(range(0, len(questions), batch_size))
+        ]
+
+        await self.redis.delete(*keys.values())
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(keys["meta"], mapping={
+                "api_config": api_config.model_dump_json(),
+                "concurrency": concurrency,
+                "max_attempts": max_attempts,
+                "version": version or "",
+                "lease_seconds": self.lease_seconds,
+            })
+            pipe.rpush(keys["pending"], *batches)
+            pipe.sadd(ACTIVE_TESTS_KEY, test_id)
+            await pipe.execute()
+        logger.info(f"分布式性能测试 {test_id} 已发布 {len(batches)} 个批次")
+
+        state = {
+            "completed": set(),
+            "requeued": 0,
+            "workers": {},
+            "first_token": LatencyHistogram(),
+            "total_time": LatencyHistogram(),
+        }
+        try:
+            await self._collect(test_id, len(batches), state, writer, live)
+        except asyncio.CancelledError:
+            # 通知工作节点停止，并尽量收回已测量的结果
+            await self.redis.srem(ACTIVE_TESTS_KEY, test_id)
+            await self._drain(test_id, state, writer, live)
+            await self._cleanup(test_id)
+            raise
+        except BaseException:
+            await self._cleanup(test_id)
+            raise
+        await self._cleanup(test_id)
+
+        return {
+            "distributed": {
+                "batches": len(batches),
+                "batch_size": batch_size,
+                "requeued_batches": state["requeued"],
+                "workers": [
+                    {"worker_id": worker_id, **stats}
+                    for worker_id, stats in sorted(state["workers"].items())
+                ],
+                "response_time": {
+                    "first_token_time": state["first_token"].summary(),
+                    "total_time": state["total_time"].summary()
+                }
+            }
+        }
+
+    async def _collect(
+        self,
+        test_id: str,
+        batch_count: int,
+        state: Dict[str, Any],
+        writer: ResultWriter,
+        live: LiveTestMetrics
+    ) -> None:
+        keys = test_keys(test_id)
+        missing_since: Dict[str, float] = {}
+        last_check = time.monotonic()
+        while len(state["completed"]) < batch_count:
+            item = await self.redis.blpop(keys["results"], timeout=1)
+            if item is not None:
+                self._apply_result(json.loads(item[1]), state, writer, live)
+            if time.monotonic() - last_check >= 1:
+                last_check = time.monotonic()
+                state["requeued"] += await self._requeue_expired(test_id, missing_since)
+
+    async def _drain(self, test_id: str, state: Dict[str, Any], writer: ResultWriter, live: LiveTestMetrics) -> None:
+        """等待工作节点交回进行中的批次，超时后放弃"""
+        keys = test_keys(test_id)
+        deadline = time.monotonic() + STOP_DRAIN_SECONDS
+        while time.monotonic() < deadline:
+            item = await self.redis.blpop(keys["results"], timeout=1)
+            if item is not None:
+                self._apply_result(json.loads(item[1]), state, writer, live)
+            elif not await self.redis.llen(keys["processing"]):
+                return
+
+    def _apply_result(
+        self,
+        message: Dict[str, Any],
+        state: Dict[str, Any],
+        writer: ResultWriter,
+        live: LiveTestMetrics
+    ) -> None:
+        """处理工作节点交回的批次结果，重新入队后被重复执行的批次只采用第一份结果"""
+        if message["batch_id"] in state["completed"]:
+            return
+        if not message["partial"]:
+            state["completed"].add(message["batch_id"])
+
+        for data in message["rows"]:
+            row = decode_answer_row(data)
+            writer.put(row)
+            if row["total_response_time"] is not None and row["attempts"] > 1:
+                live.record(True)
+            else:
+                live.record(
+                    row["total_response_time"] is not None,
+                    row["first_response_time"],
+                    row["total_response_time"]
+                )
+        state["first_token"].merge(LatencyHistogram.from_dict(message["first_token"]))
+        state["total_time"].merge(LatencyHistogram.from_dict(message["total_time"]))
+
+        stats = state["workers"].setdefault(
+            message["worker_id"], {"batches": 0, "processed_questions": 0, "failed_questions": 0}
+        )
+        stats["batches"] += 1
+        stats["processed_questions"] += message["processed"]
+        stats["failed_questions"] += message["failed"]
+
+    async def _requeue_expired(self, test_id: str, missing_since: Dict[str, float]) -> int:
+        """
+        把租约已过期的批次放回待领取队列
+        领取与设置租约之间有短暂间隔，租约缺失持续超过租约时长才视为节点失联
+        """
+        keys = test_keys(test_id)
+        now = time.monotonic()
+        requeued = 0
+        processing = await self.redis.lrange(keys["processing"], 0, -1)
+        for raw in processing:
+            batch_id = json.loads(raw)["id"]
+            if await self.redis.exists(lease_key(test_id, batch_id)):
+                missing_since.pop(raw, None)
+                continue
+            if now - missing_since.setdefault(raw, now) < self.lease_seconds:
+                continue
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.lrem(keys["processing"], 1, raw)
+                pipe.lpush(keys["pending"], raw)
+                await pipe.execute()
+            missing_since.pop(raw, None)
+            requeued += 1
+            logger.warning(f"分布式性能测试 {test_id} 的批次 {batch_id} 租约过期，已重新入队")
+        for raw in set(missing_since) - set(processing):
+            del missing_since[raw]
+        return requeued
+
+    async def _cleanup(self, test_id: str) -> None:
+        keys = test_keys(test_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.srem(ACTIVE_TESTS_KEY, test_id)
+            pipe.delete(*keys.values())
+            await pipe.execute()
+
+
+class _LeasedBatch:
+    """工作节点已领取的批次及其测量结果"""
+
+    def __init__(self, raw: str):
+        data = json.loads(raw)
+        self.raw = raw
+        self.id = data["id"]
+        self.questions = data["questions"]
+        self.remaining = len(self.questions)
+        self.rows: List[Dict[str, Any]] = []
+        self.failed = 0
+        self.first_token = LatencyHistogram()
+        self.total_time = LatencyHistogram()
+
+    def add(self, row: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self.rows.append(encode_answer_row(row))
+        self.remaining -= 1
+        if not result["success"]:
+            self.failed += 1
+            return
+        # 重试后才成功的请求不计入延迟分布
+        if result["attempts"] > 1:
+            return
+        if result["first_response_time"] is not None:
+            self.first_token.record(result["first_response_time"])
+        self.total_time.record(result["total_response_time"])
+
+
+class DistributedWorker:
+    """
+    分布式性能测试的工作节点
+
+    只需要能访问Redis和被测RAG系统，不连接数据库。每个节点以测试的并发数
+    运行工作协程，本地问题用完时再领取下一个批次，批次完成后交回回答和延迟直方图。
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        worker_id: Optional[str] = None,
+        poll_interval: float = 1.0
+    ):
+        self.redis = client
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self._stopping = False
+
+    def stop(self) -> None:
+        """当前测试的批次交回后退出"""
+        self._stopping = True
+
+    async def run(self) -> None:
+        """轮询正在执行的测试，有待领取的批次时参与执行"""
+        logger.info(f"性能测试工作节点 {self.worker_id} 已启动")
+        try:
+            while not self._stopping:
+                if not await self.run_once():
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            await http_client_registry.aclose()
+
+    async def run_once(self) -> bool:
+        """参与一个有待领取批次的测试直到批次领完，没有可执行的测试时返回False"""
+        for test_id in sorted(await self.redis.smembers(ACTIVE_TESTS_KEY)):
+            keys = test_keys(test_id)
+            meta = await self.redis.hgetall(keys["meta"])
+            if meta and await self.redis.llen(keys["pending"]):
+                await self._run_test(test_id, meta)
+                return True
+        return False
+
+    async def _run_test(self, test_id: str, meta: Dict[str, str]) -> None:
+        keys = test_keys(test_id)
+        api_config = ApiRequestConfig.model_validate_json(meta["api_config"])
+        concurrency = max(1, int(meta["concurrency"]))
+        max_attempts = int(meta["max_attempts"])
+        version = meta["version"] or None
+        lease_seconds = int(meta["lease_seconds"])
+
+        local: Deque[Tuple[_LeasedBatch, List[Any]]] = deque()
+        active: Dict[int, _LeasedBatch] = {}
+        lease_lock = asyncio.Lock()
+        state = {"stopped": False}
+
+        async def next_question() -> Optional[Tuple[_LeasedBatch, List[Any]]]:
+            async with lease_lock:
+                if not local and not state["stopped"] and not self._stopping:
+                    raw = await self.redis.lmove(keys["pending"], keys["processing"], "LEFT", "RIGHT")
+                    if raw is not None:
+                        batch = _LeasedBatch(raw)
+                        await self.redis.set(lease_key(test_id, batch.id), self.worker_id, ex=lease_seconds)
+                        active[batch.id] = batch
+                        local.extend((batch, question) for question in batch.questions)
+                return local.popleft() if local and not state["stopped"] else None
+
+        async def heartbeat():
+            # 续租进行中的批次，测试被取消时停止领取和发送
+            while True:
+                await asyncio.sleep(min(HEARTBEAT_INTERVAL, lease_seconds / 3))
+                if not await self.redis.sismember(ACTIVE_TESTS_KEY, test_id):
+                    state["stopped"] = True
+                for batch_id in list(active):
+                    await self.redis.set(lease_key(test_id, batch_id), self.worker_id, ex=lease_seconds)
+
+        async def worker(client):
+            while True:
+                item = await next_question()
+                if item is None:
+                    return
+                batch, (sequence_number, question_id, question_text) = item
+                result = await request_rag_answer_with_retry(client, question_text, api_config, max_attempts)
+                batch.add(build_answer_row(
+                    question_id,
+                    result,
+                    version=version,
+                    performance_test_id=test_id,
+                    sequence_number=sequence_number
+                ), result)
+                if batch.remaining == 0:
+                    await self._submit(test_id, active.pop(batch.id))
+
+        heartbeat_task = asyncio.create_task(heartbeat())
+        try:
+            async with http_client_registry.lease(api_config.endpoint_url, concurrency) as client:
+                await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        finally:
+            heartbeat_task.cancel()
+        # 测试被取消时交回已测量的部分结果；节点自身出错时不交回，批次在租约过期后由其他节点重做
+        for batch in list(active.values()):
+            await self._submit(test_id, batch, partial=True)
+
+    async def _submit(self, test_id: str, batch: _LeasedBatch, partial: bool = False) -> None:
+        keys = test_keys(test_id)
+        message = json.dumps({
+            "batch_id": batch.id,
+            "worker_id": self.worker_id,
+            "partial": partial,
+            "rows": batch.rows,
+            "processed": len(batch.rows),
+            "failed": batch.failed,
+            "first_token": batch.first_token.to_dict(),
+            "total_time": batch.total_time.to_dict(),
+        }, ensure_ascii=False)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(keys["results"], message)
+            pipe.expire(keys["results"], RESULT_TTL_SECONDS)
+            pipe.lrem(keys["processing"], 1, batch.raw)
+            pipe.delete(lease_key(test_id, batch.id))
+            await pipe.execute()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.base import dialect_insert
+from app.models.judge_cache import JudgeCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# 按主键批量查询时每条IN语句的键数
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def judge_cache_key(
+    model_name: str,
+    prompt_template: Optional[str],
+    scoring_method: str,
+    dimensions: List[str],
+    question_text: Optional[str],
+    standard_answer: Optional[str],
+    answer: Optional[str]
+) -> str:
+    """评测输入内容的SHA-256，输入完全相同的评测项共用同一条缓存"""
+    payload = json.dumps(
+        [
+            model_name,
+            prompt_template or "",
+            scoring_method,
+            list(dimensions),
+            question_text or "",
+            standard_answer or "",
+            answer or "",
+        ],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """大模型评测结果缓存
+
+    llm_judge_cache 表持久保存评测结果，前面加一层进程内LRU；
+    缓存的评估结果与 llm_judge.parse_judge_output 的返回值结构相同。
+    查询和写入在写库线程与事件循环线程中都会调用，LRU由锁保护
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, evaluation: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = evaluation
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_many(self, db: Session, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """批量查询缓存，返回命中的 {缓存键: 评估结果}"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for key in set(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                else:
+                    missing.append(key)
+
+        for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+            rows = db.query(JudgeCacheEntry).filter(
+                JudgeCacheEntry.cache_key.in_(missing[start:start + LOOKUP_CHUNK_SIZE])
+            ).all()
+            for row in rows:
+                evaluation = {
+                    "overall_score": float(row.overall_score),
+                    "dimension_scores": row.dimension_scores or {},
+                    "evaluation_reason": row.evaluation_reason or "",
+                }
+                found[row.cache_key] = evaluation
+                self._remember(row.cache_key, evaluation)
+        return found
+
+    def put_many(self, db: Session, model_name: str, entries: Dict[str, Dict[str, Any]]) -> None:
+        """写入评测结果，由调用方提交事务；已存在的缓存键保持不变"""
+        if not entries:
+            return
+        db.execute(dialect_insert(db, JudgeCacheEntry).values([
+            {
+                "cache_key": key,
+                "model_name": model_name,
+                "overall_score": evaluation["overall_score"],
+                "dimension_scores": evaluation["dimension_scores"],
+                "evaluation_reason": evaluation["evaluation_reason"],
+                "usage": evaluation.get("usage"),
+            }
+            for key, evaluation in entries.items()
+        ]).on_conflict_do_nothing())
+        for key, evaluation in entries.items():
+            self._remember(key, {
+                "overall_score": evaluation["overall_score"],
+                "dimension_scores": evaluation["dimension_scores"],
+                "evaluation_reason": evaluation["evaluation_reason"],
+            })
+
+    def clear(self) -> None:
+        """清空进程内LRU，数据库中的缓存不受影响"""
+        with self._lock:
+            self._entries.clear()
+
+
+judge_cache = JudgeCache(settings.JUDGE_CACHE_SIZE)
@@ -0,0 +1,300 @@
+import re
+import unicodedata
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 中日韩文字按单字切分，其他文字按连续的字母数字切分，标点和空白丢弃
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN = re.compile(rf"[{_CJK}]|[^\W_{_CJK}]+")
+
+# chrF 的字符n-gram最大阶数和召回率权重
+CHRF_ORDER = 6
+CHRF_BETA = 2.0
+# 按评测项分块计算ROUGE-L，每块的位掩码等数组按估算大小不超过 LCS_MEMORY_BUDGET 字节
+LCS_MEMORY_BUDGET = 128 * 1024 * 1024
+LCS_MAX_CHUNK_ROWS = 2048
+METRIC_NAMES = ["exact_match", "token_f1", "char_f1", "rouge_l", "chrf"]
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+# n-gram键的高位保存评测项编号，低位保存n-gram哈希
+_HASH_BITS = np.uint64(40)
+_HASH_MASK = np.uint64((1 << 40) - 1)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """NFKC规范化并转小写后切词：中日韩文字每字一个词，其他文字按连续字母数字成词"""
+    if not text:
+        return []
+    return _TOKEN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 混合函数，用于逐词滚动计算n-gram哈希"""
+    values = values.astype(np.uint64, copy=True)
+    values ^= values >> np.uint64(30)
+    values *= np.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94D049BB133111EB)
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class _Sequences:
+    """一组文本的词序列，所有文本首尾相接保存在一个数组中"""
+
+    def __init__(self, ids: np.ndarray, lengths: np.ndarray):
+        self.ids = ids
+        self.lengths = lengths
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        self.items = np.repeat(np.arange(len(lengths)), lengths)
+
+    def ngrams(self, max_n: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        依次生成1到max_n阶不跨文本的n-gram键
+
+        键的高24位是评测项编号、低40位是n-gram哈希，同一评测项内哈希冲突的概率可以忽略
+        """
+        ends = (self.starts + self.lengths)[self.items]
+        hashes = np.empty(0, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for n in range(1, max_n + 1):
+                count = len(self.ids) - n + 1
+                if count <= 0:
+                    yield n, np.empty(0, dtype=np.uint64)
+                    continue
+                tail = self.ids[n - 1:].astype(np.uint64)
+                hashes = tail if n == 1 else _mix(hashes[:count]) + tail
+                valid = np.arange(count) + n <= ends[:count]
+                yield n, (self.items[:count][valid].astype(np.uint64) << _HASH_BITS) | (_mix(hashes[valid]) & _HASH_MASK)
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """把多个 [start, start+length) 区间展开成一个下标数组"""
+    total = int(lengths.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+def _encode(texts: Sequence[List[str]], vocabulary: Dict[str, int]) -> _Sequences:
+    tokens = list(chain.from_iterable(texts))
+    ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokens), dtype=np.int64, count=len(tokens))
+    return _Sequences(ids, np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts)))
+
+
+def _encode_chars(texts: Sequence[List[str]]) -> _Sequences:
+    joined = ["".join(tokens) for tokens in texts]
+    codes = np.frombuffer("".join(joined).encode("utf-32-le"), dtype="<u4").astype(np.int64)
+    return _Sequences(codes, np.fromiter((len(text) for text in joined), dtype=np.int64, count=len(joined)))
+
+
+def _count(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """排序后按游程统计，返回 (不重复的键, 出现次数)"""
+    keys = np.sort(keys)
+    if not len(keys):
+        return keys, np.empty(0, dtype=np.int64)
+    boundaries = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[boundaries], np.diff(np.append(boundaries, len(keys)))
+
+
+def _overlap(reference_keys: np.ndarray, candidate_keys: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    按评测项统计n-gram的截断重合数（同一n-gram取两边出现次数的较小值）
+
+    相当于 (评测项, n-gram) 稀疏计数矩阵的逐元素min后按行求和，返回 (重合数, 参考答案n-gram数, 回答n-gram数)
+    """
+    ref_total = np.bincount((reference_keys >> _HASH_BITS).astype(np.int64), minlength=size)
+    cand_total = np.bincount((candidate_keys >> _HASH_BITS).astype(np.int64), minlength=size)
+    ref_keys, ref_counts = _count(reference_keys)
+    cand_keys, cand_counts = _count(candidate_keys)
+    if not len(ref_keys) or not len(cand_keys):
+        return np.zeros(size), ref_total, cand_total
+
+    positions = np.minimum(np.searchsorted(ref_keys, cand_keys), len(ref_keys) - 1)
+    matched = ref_keys[positions] == cand_keys
+    overlap = np.bincount(
+        (cand_keys[matched] >> _HASH_BITS).astype(np.int64),
+        weights=np.minimum(ref_counts[positions[matched]], cand_counts[matched]),
+        minlength=size
+    )
+    return overlap, ref_total, cand_total
+
+
+def _f_score(precision: np.ndarray, recall: np.ndarray, beta: float = 1.0) -> np.ndarray:
+    denominator = beta * beta * precision + recall
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = (1 + beta * beta) * precision * recall / denominator
+    return np.where(denominator > 0, score, 0.0)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), 0.0)
+
+
+def _unigram_f1(overlap: np.ndarray, ref_total: np.ndarray, cand_total: np.ndarray) -> np.ndarray:
+    score = _f_score(_ratio(overlap, cand_total), _ratio(overlap, ref_total))
+    # 两边都为空时视为完全一致
+    return np.where((ref_total == 0) & (cand_total == 0), 1.0, score)
+
+
+def _add(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """按行的多字长无符号加法，每行是低位在前的uint64数组"""
+    result = np.empty_like(x)
+    carry = np.zeros(len(x), dtype=bool)
+    for word in range(x.shape[1]):
+        total = x[:, word] + y[:, word] + carry
+        carry = (total < x[:, word]) | (carry & (total == x[:, word]))
+        result[:, word] = total
+    return result
+
+
+def _subtract(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """按行的多字长无符号减法"""
+    result = np.empty_like(x)
+    borrow = np.zeros(len(x), dtype=bool)
+    for word in range(x.shape[1]):
+        result[:, word] = x[:, word] - y[:, word] - borrow
+        borrow = (x[:, word] < y[:, word]) | (borrow & (x[:, word] == y[:, word]))
+    return result
+
+
+def _lcs_chunk(reference: _Sequences, candidate: _Sequences, rows: np.ndarray) -> np.ndarray:
+    """
+    位并行算法（Hyyrö）同时计算一批评测项的最长公共子序列长度
+
+    回答的每个位置用一位表示，对参考答案逐词迭代，每步对整批评测项做一次多字长位运算
+    """
+    ref_lengths = reference.lengths[rows]
+    cand_lengths = candidate.lengths[rows]
+    words = max(1, int((cand_lengths.max() + 63) // 64))
+    local = np.arange(len(rows))
+
+    # 每个 (评测项, 词) 在回答中出现位置的位掩码
+    cand_index = _ranges(candidate.starts[rows], cand_lengths)
+    cand_local = np.repeat(local, cand_lengths)
+    positions = cand_index - np.repeat(candidate.starts[rows], cand_lengths)
+    vocabulary = int(max(reference.ids.max(initial=0), candidate.ids.max(initial=0))) + 1
+    mask_keys, mask_rows = np.unique(cand_local * vocabulary + candidate.ids[cand_index], return_inverse=True)
+    masks = np.zeros((len(mask_keys) + 1, words), dtype=np.uint64)
+    np.bitwise_or.at(
+        masks,
+        (mask_rows, positions // 64),
+        np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64))
+    )
+
+    # 参考答案每个位置对应的掩码行，找不到（回答中没有该词或超出长度）时取最后一行全零掩码
+    steps = int(ref_lengths.max(initial=0))
+    offsets = np.arange(steps)
+    ref_positions = reference.starts[rows][:, None] + offsets[None, :]
+    in_range = offsets[None, :] < ref_lengths[:, None]
+    ref_tokens = np.where(in_range, reference.ids[np.minimum(ref_positions, max(len(reference.ids) - 1, 0))], -1)
+    lookup = local[:, None] * vocabulary + ref_tokens
+    if len(mask_keys):
+        found = np.minimum(np.searchsorted(mask_keys, lookup), len(mask_keys) - 1)
+        mask_index = np.where(in_range & (mask_keys[found] == lookup), found, len(mask_keys))
+    else:
+        mask_index = np.zeros(lookup.shape, dtype=np.int64)
+
+    state = np.full((len(rows), words), _MASK64, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for step in range(steps):
+            matched = state & masks[mask_index[:, step]]
+            state = _add(state, matched) | _subtract(state, matched)
+
+    # 回答长度范围内为0的位数即LCS长度
+    bit_positions = np.arange(words * 64)
+    in_candidate = bit_positions[None, :] < cand_lengths[:, None]
+    bits = np.unpackbits(state.view(np.uint8), axis=1, bitorder="little").astype(bool)
+    return ((~bits) & in_candidate).sum(axis=1)
+
+
+def _lcs_chunks(reference: _Sequences, candidate: _Sequences, size: int) -> Iterator[np.ndarray]:
+    """
+    按回答长度排序后分块，同一块内的位掩码宽度相近
+
+    块内每个评测项的位掩码表最多有 回答长度+1 行、每行为块内最宽的掩码字数，
+    参考答案各位置的下标数组约占4个int64；按块内的最大长度估算，使每块不超过内存预算
+    """
+    order = np.argsort(candidate.lengths, kind="stable")
+    start = 0
+    while start < size:
+        window = order[start:start + LCS_MAX_CHUNK_ROWS]
+        # 回答长度在窗口内递增，参考答案长度取前缀最大值，估算大小随行数单调增加
+        cand_lengths = candidate.lengths[window]
+        ref_lengths = np.maximum.accumulate(reference.lengths[window])
+        words = np.maximum(1, (cand_lengths + 63) // 64)
+        estimate = np.arange(1, len(window) + 1) * 8 * (words * (cand_lengths + 1) + 4 * ref_lengths)
+        count = max(1, int(np.searchsorted(estimate, LCS_MEMORY_BUDGET, side="right")))
+        yield window[:count]
+        start += count
+
+
+def _lcs(reference: _Sequences, candidate: _Sequences, size: int) -> np.ndarray:
+    lengths = np.zeros(size, dtype=np.int64)
+    for rows in _lcs_chunks(reference, candidate, size):
+        lengths[rows] = _lcs_chunk(reference, candidate, rows)
+    return lengths
+
+
+def compute_lexical_metrics(references: Sequence[Optional[str]], candidates: Sequence[Optional[str]]) -> Dict[str, np.ndarray]:
+    """
+    批量计算参考答案与RAG回答之间的词汇重合指标，返回 {指标名: 与输入等长的数组}，取值均为0-1
+
+    - exact_match: 规范化后的词序列完全相同
+    - token_f1: 词（中文按字）的重合F1
+    - char_f1: 去掉空白和标点后字符的重合F1
+    - rouge_l: 词序列最长公共子序列的F1
+    - chrf: 1-6阶字符n-gram的chrF（beta=2）
+    """
+    if len(references) != len(candidates):
+        raise ValueError("参考答案和回答的数量不一致")
+    size = len(references)
+    if not size:
+        return {name: np.zeros(0) for name in METRIC_NAMES}
+
+    reference_tokens = [tokenize(text) for text in references]
+    candidate_tokens = [tokenize(text) for text in candidates]
+    vocabulary: Dict[str, int] = {}
+    reference = _encode(reference_tokens, vocabulary)
+    candidate = _encode(candidate_tokens, vocabulary)
+    reference_chars = _encode_chars(reference_tokens)
+    candidate_chars = _encode_chars(candidate_tokens)
+    both_empty = (reference.lengths == 0) & (candidate.lengths == 0)
+
+    lcs = _lcs(reference, candidate, size)
+    rouge_l = _f_score(_ratio(lcs, candidate.lengths), _ratio(lcs, reference.lengths))
+
+    token_keys = next(reference.ngrams(1))[1], next(candidate.ngrams(1))[1]
+    token_f1 = _unigram_f1(*_overlap(*token_keys, size))
+
+    precisions = np.zeros(size)
+    recalls = np.zeros(size)
+    precision_orders = np.zeros(size)
+    recall_orders = np.zeros(size)
+    char_f1 = None
+    for (n, ref_keys), (_, cand_keys) in zip(reference_chars.ngrams(CHRF_ORDER), candidate_chars.ngrams(CHRF_ORDER)):
+        overlap, ref_total, cand_total = _overlap(ref_keys, cand_keys, size)
+        if n == 1:
+            char_f1 = _unigram_f1(overlap, ref_total, cand_total)
+        precisions += _ratio(overlap, cand_total)
+        recalls += _ratio(overlap, ref_total)
+        precision_orders += cand_total > 0
+        recall_orders += ref_total > 0
+    chrf = _f_score(_ratio(precisions, precision_orders), _ratio(recalls, recall_orders), CHRF_BETA)
+
+    return {
+        "exact_match": ((reference.lengths == candidate.lengths) & (lcs == reference.lengths)).astype(float),
+        "token_f1": token_f1,
+        "char_f1": char_f1,
+        "rouge_l": np.where(both_empty, 1.0, rouge_l),
+        "chrf": np.where(both_empty, 1.0, chrf),
+    }
+
+
+def lexical_metric_rows(references: Sequence[Optional[str]], candidates: Sequence[Optional[str]]) -> List[Dict[str, float]]:
+    """按评测项返回 {指标名: 分数} 字典，保留4位小数，用于写入 accuracy_test_items.lexical_metrics"""
+    metrics = compute_lexical_metrics(references, candidates)
+    columns = [np.round(metrics[name], 4).tolist() for name in METRIC_NAMES]
+    return [dict(zip(METRIC_NAMES, values)) for values in zip(*columns)]
@@ -0,0 +1,260 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+# 实时指标统计的滚动窗口（秒）
+LIVE_WINDOWS = (10, 60)
+# 测试结束后实时指标在内存中保留的时长（秒）
+FINISHED_RETENTION_SECONDS = 300
+
+
+class LatencyHistogram:
+    """
+    对数分桶的延迟直方图
+
+    桶边界按固定比例增长，分位数相对误差约1.5%；桶布局固定，
+    多个直方图（不同时间片、不同进程）可以直接按桶相加合并。
+    """
+
+    MIN_VALUE = 0.001
+    MAX_VALUE = 3600.0
+    GROWTH = 1.03
+    BUCKETS = int(math.ceil(math.log(MAX_VALUE / MIN_VALUE) / math.log(GROWTH))) + 2
+
+    def __init__(self):
+        self.counts = np.zeros(self.BUCKETS, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value: float) -> None:
+        if value < self.MIN_VALUE:
+            index = 0
+        else:
+            index = min(self.BUCKETS - 1, int(math.log(value / self.MIN_VALUE) / math.log(self.GROWTH)) + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q: float) -> Optional[float]:
+        """返回第q百分位数，取所在桶的几何中点并限制在实际最小/最大值之间"""
+        if self.count == 0:
+            return None
+        rank = max(1, int(math.ceil(q / 100 * self.count)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        if index == 0:
+            value = self.MIN_VALUE / 2
+        else:
+            value = self.MIN_VALUE * self.GROWTH ** (index - 0.5)
+        return float(min(max(value, self.min), self.max))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为只包含非空桶的JSON结构，用于跨节点传输"""
+        buckets = np.nonzero(self.counts)[0]
+        return {
+            "buckets": buckets.tolist(),
+            "counts": self.counts[buckets].tolist(),
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.counts[data["buckets"]] = data["counts"]
+        histogram.count = int(histogram.counts.sum())
+        histogram.sum = data["sum"]
+        if histogram.count:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """与calculate_percentiles相同结构的统计结果"""
+        if self.count == 0:
+            return None
+        return {
+            "avg": self.sum / self.count,
+            "max": float(self.max),
+            "min": float(self.min),
+            **{f"p{level}": self.percentile(level) for level in (50, 75, 90, 95, 99)},
+            "samples": self.count
+        }
+
+
+class _TimeSlot:
+    """一秒内的请求统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.first_token = LatencyHistogram()
+        self.total_time = LatencyHistogram()
+
+
+class LiveTestMetrics:
+    """单个测试的实时指标，按秒分片保存最近60秒的数据"""
+
+    def __init__(self, test_id: str):
+        self.test_id = test_id
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self._slots: Deque[Tuple[int, _TimeSlot]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def adjust_in_flight(self, delta: int) -> None:
+        """按差值调整在途请求数，用于汇总其他进程上报的在途数"""
+        with self._lock:
+            if self.finished_at is None:
+                self.in_flight = max(0, self.in_flight + delta)
+
+    def record(
+        self,
+        success: bool,
+        first_response_time: Optional[float] = None,
+        total_response_time: Optional[float] = None
+    ) -> None:
+        """记录一条完成的请求结果"""
+        second = int(time.monotonic())
+        with self._lock:
+            if not self._slots or self._slots[-1][0] != second:
+                self._slots.append((second, _TimeSlot()))
+                while self._slots and self._slots[0][0] <= second - max(LIVE_WINDOWS):
+                    self._slots.popleft()
+            slot = self._slots[-1][1]
+            slot.requests += 1
+            self.total_requests += 1
+            if not success:
+                slot.errors += 1
+                self.total_errors += 1
+                return
+            if first_response_time is not None:
+                slot.first_token.record(first_response_time)
+            if total_response_time is not None:
+                slot.total_time.record(total_response_time)
+
+    def finish(self) -> None:
+        with self._lock:
+            if self.finished_at is None:
+                self.finished_at = time.monotonic()
+                self.in_flight = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """计算各滚动窗口内的RPS、错误率和首token/总耗时分位数"""
+        now = time.monotonic()
+        elapsed = (self.finished_at or now) - self.started_at
+        windows = {}
+        with self._lock:
+            for window in LIVE_WINDOWS:
+                since = int(now) - window
+                requests = errors = 0
+                first_token = LatencyHistogram()
+                total_time = LatencyHistogram()
+                for second, slot in self._slots:
+                    if second <= since:
+                        continue
+                    requests += slot.requests
+                    errors += slot.errors
+                    first_token.merge(slot.first_token)
+                    total_time.merge(slot.total_time)
+                # 测试刚开始时按实际经过的时间计算，避免低估RPS
+                span = min(window, max(elapsed, 1.0))
+                windows[f"{window}s"] = {
+                    "requests": requests,
+                    "rps": requests / span,
+                    "error_rate": errors / requests if requests else 0,
+                    "first_token_time": {"p50": first_token.percentile(50), "p95": first_token.percentile(95)},
+                    "total_time": {"p50": total_time.percentile(50), "p95": total_time.percentile(95)},
+                }
+            return {
+                "test_id": self.test_id,
+                "finished": self.finished,
+                "elapsed_seconds": elapsed,
+                "in_flight": self.in_flight,
+                "total_requests": self.total_requests,
+                "total_errors": self.total_errors,
+                "windows": windows,
+            }
+
+
+class LiveMetricsRegistry:
+    """
+    进程内的实时指标注册表
+
+    服务端执行引擎和批量写入接口在产生结果时写入，/performance/{id}/live 只读内存数据，
+    观看者不需要轮询数据库。
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, LiveTestMetrics] = {}
+        self._lock = threading.Lock()
+
+    def get(self, test_id: str) -> Optional[LiveTestMetrics]:
+        return self._metrics.get(str(test_id))
+
+    def start(self, test_id: str) -> LiveTestMetrics:
+        """测试开始时新建实时指标，丢弃同一测试之前残留的数据"""
+        test_id = str(test_id)
+        with self._lock:
+            self._evict_finished()
+            metrics = LiveTestMetrics(test_id)
+            self._metrics[test_id] = metrics
+            return metrics
+
+    def get_or_create(self, test_id: str) -> LiveTestMetrics:
+        test_id = str(test_id)
+        with self._lock:
+            self._evict_finished()
+            metrics = self._metrics.get(test_id)
+            if metrics is None or metrics.finished:
+                metrics = LiveTestMetrics(test_id)
+                self._metrics[test_id] = metrics
+            return metrics
+
+    def finish(self, test_id: str) -> None:
+        metrics = self.get(test_id)
+        if metrics is not None:
+            metrics.finish()
+
+    def _evict_finished(self) -> None:
+        now = time.monotonic()
+        expired = [
+            test_id for test_id, metrics in self._metrics.items()
+            if metrics.finished and now - metrics.finished_at > FINISHED_RETENTION_SECONDS
+        ]
+        for test_id in expired:
+            del self._metrics[test_id]
+
+
+live_metrics = LiveMetricsRegistry()
@@ -0,0 +1,438 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import yaml
+
+from app.core.rate_limiter import llm_rate_limiter
+from app.schemas.accuracy import JudgeModelConfig
+from app.services.rag_service import (
+    ERROR_CLIENT,
+    ERROR_CONNECT,
+    ERROR_OTHER,
+    ERROR_PARSE,
+    ERROR_RATE_LIMITED,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    RETRYABLE_ERROR_CLASSES,
+    retry_delay,
+)
+
+logger = logging.getLogger(__name__)
+
+# 各评分方法的分数范围，与前端提示词模板一致
+SCORE_RANGES = {
+    "binary": (0, 1),
+    "three_scale": (0, 2),
+    "five_scale": (0, 4),
+}
+JUDGE_SYSTEM_MESSAGE = (
+    "你是一个专业的RAG回答评估专家，你的任务是评估生成式AI的回答质量。"
+    "请根据提供的标准答案评价RAG系统的回答质量，分析其准确性、相关性和完整性。"
+)
+# 各评分方法的分数含义，与前端提示词模板一致
+SCORE_DESCRIPTIONS = {
+    "binary": "0 = 不一致, 1 = 一致",
+    "three_scale": "0 = 不匹配, 1 = 部分匹配, 2 = 完全匹配",
+    "five_scale": "0 = 完全不匹配, 1 = 大部分错误, 2 = 一般, 3 = 基本正确, 4 = 完全正确",
+}
+DEFAULT_JUDGE_PARAMS = {"temperature": 0.2, "max_tokens": 1000}
+# 批量评测时每个评测项预留的输出token数
+BATCH_MAX_TOKENS_PER_ITEM = 300
+# 模型输出格式不稳定，解析失败也按可重试错误处理
+JUDGE_RETRYABLE_ERROR_CLASSES = RETRYABLE_ERROR_CLASSES | {ERROR_PARSE}
+
+# 测试未设置提示词模板时使用，输出格式与前端生成的模板相同
+DEFAULT_PROMPT_TEMPLATE = """你是一位专业的答案准确性审核专家，精通文本比对、事实验证和内容匹配。
+你的任务是评估学生回答是否与正确答案保持一致，并根据指定维度进行判断。
+
+问题: {{question}}
+正确答案: {{reference_answer}}
+学生回答: {{rag_answer}}
+
+评分范围: {{score_range}}
+评估维度: {{dimensions}}
+
+任务要求
+- 逐个维度判断回答与正确答案的匹配程度并打分。
+- 生成总体评分，并提供评估理由。
+- 使用分隔符"####"来区分思考过程与最终答案。
+
+思考1:（不超过10个字）
+...
+####
+
+```yaml
+overall_score: [总体评分]
+dimension_scores:
+  - 维度名: [分数]
+evaluation_reason: |
+  - 针对各维度的评分理由。
+```
+"""
+
+# 批量评测的提示词：测试的提示词模板作为评分规则只出现一次，评测项依次列在后面，要求按id返回JSON数组
+BATCH_PROMPT_TEMPLATE = """下面有{{count}}个评测项，请按以下评分规则分别评估每个学生回答与正确答案的一致程度，各评测项互不影响。
+
+## 评分规则
+（与逐项评测使用同一提示词模板，其中的问题、正确答案和学生回答见后面的各评测项）
+{{rubric}}
+
+## 批量评测的输出要求
+评分方法: {{scoring_method}}  # {{score_description}}
+评分范围: {{score_range}}
+评估维度: {{dimensions}}
+
+- 逐个评测项、逐个维度打分，并给出总体评分和简短的评估理由（不超过20个字）。
+- 忽略评分规则中对输出格式的要求，只输出一个JSON代码块，数组中每个评测项一个对象，id与评测项编号一致，不要遗漏评测项。
+
+```json
+[
+  {"id": 1, "overall_score": 总体评分, "dimension_scores": {"维度名": 分数}, "evaluation_reason": "评估理由"}
+]
+```
+"""
+# 评分规则中问题、正确答案和学生回答的占位文本
+BATCH_ITEM_PLACEHOLDER = "（见各评测项）"
+
+_YAML_BLOCK = re.compile(r"```(?:yaml|yml)?\s*([\s\S]*?)\s*```", re.IGNORECASE)
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*(\[[\s\S]*?\])\s*```", re.IGNORECASE)
+
+
+def build_judge_prompt(
+    template: Optional[str],
+    question: str,
+    reference_answer: str,
+    rag_answer: str,
+    scoring_method: str,
+    dimensions: List[str]
+) -> str:
+    """把问题、参考答案和RAG回答填入提示词模板"""
+    low, high = SCORE_RANGES.get(scoring_method, SCORE_RANGES["five_scale"])
+    return (template or DEFAULT_PROMPT_TEMPLATE) \
+        .replace("{{question}}", question or "") \
+        .replace("{{reference_answer}}", reference_answer or "") \
+        .replace("{{rag_answer}}", rag_answer or "") \
+        .replace("{{dimensions}}", ", ".join(dimensions)) \
+        .replace("{{score_range}}", f"{low}-{high}")
+
+
+def batch_prompt_template(template: Optional[str]) -> str:
+    """批量评测实际使用的提示词模板（嵌入测试的提示词模板），用于区分批量评测与逐项评测的缓存"""
+    return BATCH_PROMPT_TEMPLATE.replace("{{rubric}}", template or DEFAULT_PROMPT_TEMPLATE)
+
+
+def build_batch_judge_prompt(
+    items: List[Tuple[str, str, str]],
+    scoring_method: str,
+    dimensions: List[str],
+    template: Optional[str] = None
+) -> str:
+    """
+    把多个 (问题, 参考答案, RAG回答) 组合成一个批量评测提示词，评测项编号从1开始
+
+    template为测试的提示词模板，填入评分范围和维度后作为评分规则，保证与逐项评测按同一规则打分
+    """
+    low, high = SCORE_RANGES.get(scoring_method, SCORE_RANGES["five_scale"])
+    rubric = build_judge_prompt(
+        template, BATCH_ITEM_PLACEHOLDER, BATCH_ITEM_PLACEHOLDER, BATCH_ITEM_PLACEHOLDER, scoring_method, dimensions
+    )
+    # 评分规则和评测项内容最后填入，避免其中的占位符文本被替换
+    header = BATCH_PROMPT_TEMPLATE \
+        .replace("{{count}}", str(len(items))) \
+        .replace("{{scoring_method}}", scoring_method) \
+        .replace("{{score_description}}", SCORE_DESCRIPTIONS.get(scoring_method, "")) \
+        .replace("{{score_range}}", f"{low}-{high}") \
+        .replace("{{dimensions}}", ", ".join(dimensions)) \
+        .replace("{{rubric}}", rubric.strip())
+    sections = [
+        f"### 评测项 {index}\n问题: {question or ''}\n正确答案: {reference_answer or ''}\n学生回答: {rag_answer or ''}"
+        for index, (question, reference_answer, rag_answer) in enumerate(items, start=1)
+    ]
+    return header + "\n" + "\n\n".join(sections) + "\n"
+
+
+def _score(value: Any, scoring_method: str, name: str) -> float:
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} 不是数字: {value}")
+    low, high = SCORE_RANGES.get(scoring_method, SCORE_RANGES["five_scale"])
+    if not low <= score <= high:
+        raise ValueError(f"{name} 超出评分范围 {low}-{high}: {score}")
+    return score
+
+
+def parse_judge_output(parsed: Any, scoring_method: str, dimensions: List[str]) -> Dict[str, Any]:
+    """
+    校验已解析的单条评估结果，返回 overall_score、dimension_scores、evaluation_reason
+
+    dimension_scores 可以是对象或 [{维度: 分数}] 列表；缺少总体评分时取各维度平均分。
+    格式不符时抛出ValueError
+    """
+    if not isinstance(parsed, dict):
+        raise ValueError("评估结果不是对象")
+
+    raw_dimensions = parsed.get("dimension_scores") or {}
+    if isinstance(raw_dimensions, list):
+        merged = {}
+        for entry in raw_dimensions:
+            if isinstance(entry, dict):
+                merged.update(entry)
+        raw_dimensions = merged
+    if not isinstance(raw_dimensions, dict):
+        raise ValueError("dimension_scores 格式不正确")
+    dimension_scores = {
+        str(dimension): _score(score, scoring_method, f"维度 {dimension}")
+        for dimension, score in raw_dimensions.items()
+    }
+    missing = [dimension for dimension in dimensions if dimension not in dimension_scores]
+    if missing:
+        raise ValueError(f"缺少维度评分: {', '.join(missing)}")
+
+    if parsed.get("overall_score") is not None:
+        overall_score = _score(parsed["overall_score"], scoring_method, "overall_score")
+    elif dimension_scores:
+        overall_score = round(sum(dimension_scores.values()) / len(dimension_scores), 2)
+    else:
+        raise ValueError("缺少 overall_score")
+
+    reason = parsed.get("evaluation_reason") or ""
+    if isinstance(reason, list):
+        reason = "\n".join(str(line) for line in reason)
+    return {
+        "overall_score": overall_score,
+        "dimension_scores": dimension_scores,
+        "evaluation_reason": str(reason).strip(),
+    }
+
+
+def parse_judge_response(content: str, scoring_method: str, dimensions: List[str]) -> Dict[str, Any]:
+    """
+    从评测模型的回复中提取评估结果
+
+    回复以 "####" 分隔思考过程和结果，结果为YAML代码块（与前端解析规则一致）；
+    没有分隔符或代码块时把整段文本当作YAML解析
+    """
+    text = content.split("####", 1)[1] if "####" in content else content
+    match = _YAML_BLOCK.search(text)
+    try:
+        parsed = yaml.safe_load(match.group(1) if match else text)
+    except yaml.YAMLError as e:
+        raise ValueError(f"YAML解析失败: {e}")
+    return parse_judge_output(parsed, scoring_method, dimensions)
+
+
+def parse_batch_judge_response(
+    content: str,
+    count: int,
+    scoring_method: str,
+    dimensions: List[str]
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    解析批量评测的回复，按评测项编号返回各项的评估结果
+
+    缺失、重复或格式不正确的评测项对应位置为None，由调用方改为逐项评测；整个回复无法解析时全部为None
+    """
+    evaluations: List[Optional[Dict[str, Any]]] = [None] * count
+    match = _JSON_BLOCK.search(content)
+    text = match.group(1) if match else content[content.find("["):content.rfind("]") + 1]
+    try:
+        entries = json.loads(text)
+    except ValueError:
+        return evaluations
+    if not isinstance(entries, list):
+        return evaluations
+
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("id")) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count or index in seen:
+            # 重复的编号无法确定对应哪个评测项，都不采用
+            if 0 <= index < count:
+                evaluations[index] = None
+            continue
+        seen.add(index)
+        try:
+            evaluations[index] = parse_judge_output(entry, scoring_method, dimensions)
+        except ValueError:
+            continue
+    return evaluations
+
+
+async def request_judge(
+    client: httpx.AsyncClient,
+    judge_config: JudgeModelConfig,
+    prompt: str,
+    timeout: float,
+    max_tokens: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    向OpenAI兼容的 /chat/completions 接口发送一次评测请求，max_tokens为空时使用默认值；
+    请求经llm_rate_limiter按评测模型的RPM/TPM限额排队，排队时间不计入elapsed和超时
+
+    返回字典: success, content, usage(接口返回的token用量), error, error_class(见rag_service.ERROR_*),
+    status_code, retry_after, elapsed(秒)
+    """
+    result = {
+        "success": False,
+        "content": None,
+        "usage": None,
+        "error": None,
+        "error_class": None,
+        "status_code": None,
+        "retry_after": None,
+        "elapsed": None,
+    }
+    headers = {"Content-Type": "application/json"}
+    if judge_config.api_key:
+        headers["Authorization"] = f"Bearer {judge_config.api_key}"
+    payload = {
+        "model": judge_config.model_name,
+        "messages": [
+            {"role": "system", "content": JUDGE_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt},
+        ],
+        **DEFAULT_JUDGE_PARAMS,
+        **(judge_config.additional_params or {}),
+    }
+    if max_tokens is not None:
+        payload["max_tokens"] = max(max_tokens, payload.get("max_tokens") or 0)
+
+    async with llm_rate_limiter.limit(
+        judge_config.base_url, judge_config.model_name, judge_config.api_key, payload["messages"],
+        judge_config.rpm, judge_config.tpm
+    ) as permit:
+        start_time = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{judge_config.base_url.rstrip('/')}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            )
+            result["elapsed"] = time.perf_counter() - start_time
+            result["status_code"] = response.status_code
+            if response.status_code != 200:
+                result["error"] = f"评测模型请求失败: {response.status_code} - {response.text[:500]}"
+                if response.status_code == 429:
+                    result["error_class"] = ERROR_RATE_LIMITED
+                elif response.status_code >= 500:
+                    result["error_class"] = ERROR_SERVER
+                else:
+                    result["error_class"] = ERROR_CLIENT
+                try:
+                    result["retry_after"] = float(response.headers["retry-after"])
+                except (KeyError, ValueError):
+                    pass
+                if response.status_code == 429:
+                    permit.throttle(result["retry_after"])
+                return result
+
+            try:
+                data = response.json()
+                content = data["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                result["error"] = "无法解析评测模型响应"
+                result["error_class"] = ERROR_PARSE
+                return result
+            permit.record_usage(data.get("usage"), content)
+            result.update({"success": True, "content": content or "", "usage": data.get("usage")})
+            return result
+
+        except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+            result["error"] = f"无法连接评测模型: {str(e)}"
+            result["error_class"] = ERROR_CONNECT
+        except httpx.TimeoutException:
+            result["error"] = "评测模型请求超时"
+            result["error_class"] = ERROR_TIMEOUT
+        except httpx.TransportError as e:
+            result["error"] = f"评测模型连接中断: {str(e)}"
+            result["error_class"] = ERROR_CONNECT
+        except Exception as e:
+            result["error"] = f"评测请求出错: {str(e)}"
+            result["error_class"] = ERROR_OTHER
+        result["elapsed"] = time.perf_counter() - start_time
+        return result
+
+
+async def judge_with_retry(
+    client: httpx.AsyncClient,
+    judge_config: JudgeModelConfig,
+    prompt: str,
+    scoring_method: str,
+    dimensions: List[str],
+    timeout: float,
+    max_attempts: int = 1
+) -> Dict[str, Any]:
+    """
+    发送评测请求并解析结果，可重试的错误（含输出格式不正确）按退避重试，最多尝试max_attempts次
+
+    在request_judge的返回值基础上增加 evaluation(解析后的评估结果)、attempts 和 attempt_errors
+    """
+    attempt_errors: List[str] = []
+    attempt = 0
+    while True:
+        attempt += 1
+        result = await request_judge(client, judge_config, prompt, timeout)
+        result["evaluation"] = None
+        if result["success"]:
+            try:
+                result["evaluation"] = parse_judge_response(result["content"], scoring_method, dimensions)
+                break
+            except ValueError as e:
+                result.update({"success": False, "error": f"评估结果格式不正确: {e}", "error_class": ERROR_PARSE})
+        attempt_errors.append(result["error_class"])
+        if attempt >= max_attempts or result["error_class"] not in JUDGE_RETRYABLE_ERROR_CLASSES:
+            break
+        await asyncio.sleep(retry_delay(attempt, result["retry_after"]))
+    result["attempts"] = attempt
+    result["attempt_errors"] = attempt_errors
+    return result
+
+
+async def judge_batch_with_retry(
+    client: httpx.AsyncClient,
+    judge_config: JudgeModelConfig,
+    items: List[Tuple[str, str, str]],
+    scoring_method: str,
+    dimensions: List[str],
+    timeout: float,
+    max_attempts: int = 1,
+    template: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    在一个请求中评测多个评测项，请求失败时按退避重试，最多尝试max_attempts次，template为测试的提示词模板
+
+    回复内容不重试：缺失或格式不正确的评测项在 evaluations 中为None，由调用方逐项评测。
+    在request_judge的返回值基础上增加 evaluations(与items一一对应)、attempts 和 attempt_errors
+    """
+    prompt = build_batch_judge_prompt(items, scoring_method, dimensions, template)
+    max_tokens = BATCH_MAX_TOKENS_PER_ITEM * len(items)
+    attempt_errors: List[str] = []
+    attempt = 0
+    while True:
+        attempt += 1
+        result = await request_judge(client, judge_config, prompt, timeout, max_tokens)
+        if result["success"]:
+            break
+        attempt_errors.append(result["error_class"])
+        if attempt >= max_attempts or result["error_class"] not in RETRYABLE_ERROR_CLASSES:
+            break
+        await asyncio.sleep(retry_delay(attempt, result["retry_after"]))
+    result["evaluations"] = (
+        parse_batch_judge_response(result["content"], len(items), scoring_method, dimensions)
+        if result["success"] else [None] * len(items)
+    )
+    result["attempts"] = attempt
+    result["attempt_errors"] = attempt_errors
+    return result
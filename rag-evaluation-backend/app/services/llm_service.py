@@ -4,6 +4,9 @@ import json
 import time
 import re
 
+from app.core.http_client import http_client_registry
+from app.core.rate_limiter import llm_rate_limiter
+
 class QuestionGenerator:
     """使用大模型生成问答对"""
     
@@ -27,31 +30,42 @@ class QuestionGenerator:
         
         prompt = self._create_qa_generation_prompt(content, count, difficulty, types)
         
+        messages = [
+            {"role": "system", "content": "你是一个精通知识库问答对生成的AI助手。你的任务是根据给定文本生成高质量的问答对，确保问题多样化且有价值，答案完全基于给定内容。"},
+            {"role": "user", "content": prompt}
+        ]
+        
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
+            # 与精度评测的评测模型调用共用同一服务商、模型和密钥的限额
+            async with llm_rate_limiter.limit(self.base_url, self.model, self.api_key, messages) as permit:
+                client = http_client_registry.get_client(self.base_url)
                 response = await client.post(
                     f"{self.base_url}/chat/completions",
                     headers=self.headers,
                     json={
                         "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": "你是一个精通知识库问答对生成的AI助手。你的任务是根据给定文本生成高质量的问答对，确保问题多样化且有价值，答案完全基于给定内容。"},
-                            {"role": "user", "content": prompt}
-                        ],
+                        "messages": messages,
                         "temperature": 0.7,
-                    }
+                    },
+                    timeout=120.0
                 )
                 
                 if response.status_code != 200:
+                    if response.status_code == 429:
+                        try:
+                            permit.throttle(float(response.headers["retry-after"]))
+                        except (KeyError, ValueError):
+                            permit.throttle(None)
                     return []
                 
                 result = response.json()
                 qa_text = result["choices"][0]["message"]["content"]
-                
-                # 解析生成的问答对
-                qa_pairs = self._parse_qa_pairs(qa_text)
-                return qa_pairs
-                
+                permit.record_usage(result.get("usage"), qa_text)
+            
+            # 解析生成的问答对
+            qa_pairs = self._parse_qa_pairs(qa_text)
+            return qa_pairs
+            
         except Exception as e:
             print(f"生成问答对时发生错误: {str(e)}")
             return []
@@ -117,11 +131,12 @@ class QuestionGenerator:
     async def test_connection(self) -> bool:
         """测试API连接是否正常"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    "https://api.openai.com/v1/models",
-                    headers=self.headers
-                )
-                return response.status_code == 200
+            client = http_client_registry.get_client(self.base_url)
+            response = await client.get(
+                f"{self.base_url}/models",
+                headers=self.headers,
+                timeout=10.0
+            )
+            return response.status_code == 200
         except Exception:
             return False
\ No newline at end of file
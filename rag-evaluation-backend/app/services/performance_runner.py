@@ -0,0 +1,1224 @@
+import asyncio
+import functools
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+import httpx
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.http_client import http_client_registry
+from app.core.redis_client import get_redis
+from app.db.base import SessionLocal
+from app.models.performance import PerformanceTest
+from app.models.question import Question
+from app.schemas.rag_answer import ApiRequestConfig
+from app.services.performance_service import performance_service, calculate_percentiles
+from app.services.distributed_runner import DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS, DistributedCoordinator
+from app.services.live_metrics import LatencyHistogram, LiveTestMetrics, live_metrics
+from app.services.rag_service import request_rag_answer_with_retry
+from app.services.result_writer import ResultWriter, build_answer_row
+from app.services.slo import evaluate_slo, parse_slo
+
+logger = logging.getLogger(__name__)
+
+LOAD_MODES = ("closed", "open", "staged", "adaptive")
+ARRIVAL_DISTRIBUTIONS = ("constant", "poisson")
+EXECUTION_MODES = ("async", "process", "distributed")
+# 阶梯测试中吞吐量增幅低于该比例且延迟仍在上升时，视为到达饱和拐点
+DEFAULT_KNEE_THROUGHPUT_GAIN = 0.1
+ADAPTIVE_SEARCHES = ("binary", "aimd")
+DEFAULT_PROBE_SECONDS = 15.0
+DEFAULT_MAX_PROBES = 20
+
+
+def parse_load_config(config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    解析PerformanceTest.config中的负载模型配置
+
+    - load_mode: closed(默认，N个工作协程串行发送) 或 open(按到达率发送，不等待在途请求)
+    - arrival_rate: open模式下的目标每秒请求数
+    - arrival_distribution: constant(固定间隔) 或 poisson(指数分布间隔)
+    - seed: poisson模式的随机种子，可选
+    - stages: staged模式的阶段列表，如 [{"concurrency": 5, "duration_seconds": 60}, ...]
+    - knee_throughput_gain: staged模式判定饱和拐点的吞吐量增幅阈值，默认0.1
+    - slo: adaptive模式的SLO阈值，如 {"first_token_time_p95": 2, "max_error_rate": 0.01}，见 slo.parse_slo
+    - search: adaptive模式的搜索方式，binary(倍增后二分，默认) 或 aimd(加性增、乘性减)
+    - probe_seconds: adaptive模式每个探测窗口的时长，默认15秒
+    - initial_concurrency / max_concurrency: adaptive模式的起始并发数和并发数上限，默认1和测试的concurrency
+    - max_probes: adaptive模式的最大探测次数，默认20
+    - aimd_step / aimd_backoff: aimd搜索每次增加的并发数和不满足SLO时的缩减比例，默认1和0.5
+    - max_attempts: 每个问题的最大尝试次数，超时、连接失败、429和5xx错误会按退避重试，默认1（不重试）
+    - execution_mode: async(默认，单个事件循环) 或 process(多进程，每个进程以独立事件循环执行一部分问题)
+    - workers: process模式的工作进程数，默认为CPU核数
+      distributed 模式由多个工作节点通过Redis领取问题批次执行，concurrency为每个节点的并发数
+    - batch_size: distributed模式每个批次的问题数，默认20
+    - lease_seconds: distributed模式的批次租约时长，节点失联超过该时长后批次重新入队，默认60
+    """
+    config = config or {}
+    load_mode = config.get("load_mode", "staged" if config.get("stages") else "closed")
+    if load_mode not in LOAD_MODES:
+        raise ValueError(f"不支持的负载模式: {load_mode}")
+
+    execution_mode = config.get("execution_mode", "async")
+    if execution_mode not in EXECUTION_MODES:
+        raise ValueError(f"不支持的执行模式: {execution_mode}")
+
+    try:
+        max_attempts = int(config.get("max_attempts", 1))
+    except (TypeError, ValueError):
+        raise ValueError("max_attempts 必须是整数")
+    if max_attempts <= 0:
+        raise ValueError("max_attempts 必须大于0")
+
+    parsed = {"load_mode": load_mode, "execution_mode": execution_mode, "max_attempts": max_attempts}
+    if execution_mode == "process":
+        if load_mode in ("staged", "adaptive"):
+            raise ValueError(f"{load_mode}模式不支持多进程执行")
+        try:
+            workers = int(config.get("workers") or os.cpu_count() or 1)
+        except (TypeError, ValueError):
+            raise ValueError("workers 必须是整数")
+        if workers <= 0:
+            raise ValueError("workers 必须大于0")
+        parsed["workers"] = workers
+
+    if execution_mode == "distributed":
+        if load_mode != "closed":
+            raise ValueError("distributed模式只支持closed负载模式")
+        try:
+            batch_size = int(config.get("batch_size", DEFAULT_BATCH_SIZE))
+            lease_seconds = int(config.get("lease_seconds", DEFAULT_LEASE_SECONDS))
+        except (TypeError, ValueError):
+            raise ValueError("batch_size 和 lease_seconds 必须是整数")
+        if batch_size <= 0 or lease_seconds <= 0:
+            raise ValueError("batch_size 和 lease_seconds 必须大于0")
+        parsed.update({"batch_size": batch_size, "lease_seconds": lease_seconds})
+    if load_mode == "staged":
+        stages = config.get("stages")
+        if not stages or not isinstance(stages, list):
+            raise ValueError("staged模式需要设置 stages 列表")
+        parsed_stages = []
+        for index, stage in enumerate(stages):
+            try:
+                concurrency = int(stage["concurrency"])
+                duration_seconds = float(stage["duration_seconds"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"第{index + 1}个阶段需要设置数字类型的 concurrency 和 duration_seconds")
+            if concurrency <= 0 or duration_seconds <= 0:
+                raise ValueError(f"第{index + 1}个阶段的 concurrency 和 duration_seconds 必须大于0")
+            parsed_stages.append({"concurrency": concurrency, "duration_seconds": duration_seconds})
+        parsed.update({
+            "stages": parsed_stages,
+            "knee_throughput_gain": float(config.get("knee_throughput_gain", DEFAULT_KNEE_THROUGHPUT_GAIN)),
+        })
+
+    if load_mode == "adaptive":
+        search = config.get("search", "binary")
+        if search not in ADAPTIVE_SEARCHES:
+            raise ValueError(f"不支持的搜索方式: {search}")
+        try:
+            initial_concurrency = int(config.get("initial_concurrency", 1))
+            max_concurrency = config.get("max_concurrency")
+            max_concurrency = int(max_concurrency) if max_concurrency is not None else None
+            max_probes = int(config.get("max_probes", DEFAULT_MAX_PROBES))
+            aimd_step = int(config.get("aimd_step", 1))
+            probe_seconds = float(config.get("probe_seconds", DEFAULT_PROBE_SECONDS))
+            aimd_backoff = float(config.get("aimd_backoff", 0.5))
+        except (TypeError, ValueError):
+            raise ValueError("adaptive模式的并发数、探测次数和探测时长必须是数字")
+        if min(initial_concurrency, max_probes, aimd_step) <= 0 or probe_seconds <= 0:
+            raise ValueError("adaptive模式的并发数、探测次数和探测时长必须大于0")
+        if max_concurrency is not None and initial_concurrency > max_concurrency:
+            raise ValueError("initial_concurrency 不能大于 max_concurrency")
+        if not 0 < aimd_backoff < 1:
+            raise ValueError("aimd_backoff 必须在0到1之间")
+        parsed.update({
+            "slo": parse_slo(config.get("slo")),
+            "search": search,
+            "probe_seconds": probe_seconds,
+            "initial_concurrency": initial_concurrency,
+            "max_concurrency": max_concurrency,
+            "max_probes": max_probes,
+            "aimd_step": aimd_step,
+            "aimd_backoff": aimd_backoff,
+        })
+
+    if load_mode == "open":
+        try:
+            arrival_rate = float(config.get("arrival_rate", 0))
+        except (TypeError, ValueError):
+            raise ValueError("arrival_rate 必须是数字")
+        if arrival_rate <= 0:
+            raise ValueError("open模式需要设置大于0的 arrival_rate")
+
+        distribution = config.get("arrival_distribution", "constant")
+        if distribution not in ARRIVAL_DISTRIBUTIONS:
+            raise ValueError(f"不支持的到达分布: {distribution}")
+
+        parsed.update({
+            "arrival_rate": arrival_rate,
+            "arrival_distribution": distribution,
+            "seed": config.get("seed"),
+        })
+    return parsed
+
+
+def build_arrival_schedule(count: int, arrival_rate: float, distribution: str, seed: Optional[int] = None) -> np.ndarray:
+    """生成相对测试开始时间的计划发送时刻(秒)"""
+    if count <= 0:
+        return np.zeros(0)
+    if distribution == "poisson":
+        intervals = np.random.default_rng(seed).exponential(1.0 / arrival_rate, count)
+        return np.concatenate(([0.0], np.cumsum(intervals[:-1])))
+    return np.arange(count) / arrival_rate
+
+
+def split_shards(questions: List[Tuple[int, str, str]], workers: int) -> List[List[Tuple[int, str, str]]]:
+    """按轮询方式把带序号的问题分成workers份，合并后的发送顺序与原顺序一致"""
+    return [questions[index::workers] for index in range(workers)]
+
+
+def split_concurrency(concurrency: int, workers: int) -> List[int]:
+    """把总并发数尽量平均地分配给各工作进程"""
+    base, extra = divmod(concurrency, workers)
+    return [base + (1 if index < extra else 0) for index in range(workers)]
+
+
+def summarize_open_loop(load_config: Dict[str, Any], samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    汇总开环模式的发送统计，samples为各事件循环的原始样本
+    多进程时峰值在途数为各进程峰值之和（上界）
+    """
+    send_duration = max(sample["send_duration"] for sample in samples)
+    sent = sum(sample["sent"] for sample in samples)
+
+    def merged(key: str) -> List[float]:
+        return [value for sample in samples for value in sample[key]]
+
+    return {
+        "open_loop": {
+            "arrival_distribution": load_config["arrival_distribution"],
+            "target_rps": load_config["arrival_rate"],
+            "scheduled_requests": sum(sample["scheduled"] for sample in samples),
+            "actual_send_rps": sent / send_duration if send_duration > 0 else 0,
+            "peak_in_flight": sum(sample["peak_in_flight"] for sample in samples),
+            "send_lag": calculate_percentiles(merged("send_lags")),
+            "corrected_response_time": {
+                "first_token_time": calculate_percentiles(merged("corrected_first")),
+                "total_time": calculate_percentiles(merged("corrected_total"))
+            }
+        }
+    }
+
+
+def merge_shard_results(shard_results: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """合并各工作进程上报的计数和延迟直方图"""
+    first_token = LatencyHistogram()
+    total_time = LatencyHistogram()
+    shards = []
+    for index in sorted(shard_results):
+        result = shard_results[index]
+        first_token.merge(result["first_token"])
+        total_time.merge(result["total_time"])
+        shards.append({
+            "shard": index + 1,
+            "questions": result["questions"],
+            "concurrency": result["concurrency"],
+            "processed_questions": result["processed"],
+            "success_questions": result["processed"] - result["failed"],
+            "failed_questions": result["failed"],
+            "duration_seconds": result["duration_seconds"],
+            "total_time": result["total_time"].summary()
+        })
+    return {
+        "workers": len(shards),
+        "shards": shards,
+        "response_time": {
+            "first_token_time": first_token.summary(),
+            "total_time": total_time.summary()
+        }
+    }
+
+
+def run_shard_process(
+    test_id: str,
+    api_config_data: Dict[str, Any],
+    shard_index: int,
+    questions: List[Tuple[int, str, str]],
+    load_config: Dict[str, Any],
+    concurrency: int,
+    events,
+    start_event,
+    stop_event
+) -> None:
+    """多进程模式下工作进程的入口，在独立事件循环中执行一个问题分片"""
+    try:
+        asyncio.run(performance_runner._run_shard(
+            test_id,
+            ApiRequestConfig(**api_config_data),
+            shard_index,
+            questions,
+            load_config,
+            concurrency,
+            events,
+            start_event,
+            stop_event
+        ))
+    except asyncio.CancelledError:
+        # 主进程要求停止，已测量的结果已写入数据库
+        pass
+    except Exception as e:
+        logger.exception(f"性能测试 {test_id} 的第{shard_index + 1}个工作进程执行失败")
+        events.put(("error", shard_index, str(e)))
+
+
+def summarize_stage(
+    first_response_times: List[float],
+    total_response_times: List[float],
+    processed: int,
+    failed: int,
+    elapsed: float
+) -> Dict[str, Any]:
+    """计算单个阶段的汇总指标"""
+    success = processed - failed
+    return {
+        "response_time": {
+            "first_token_time": calculate_percentiles(first_response_times),
+            "total_time": calculate_percentiles(total_response_times)
+        },
+        "throughput": {
+            "requests_per_second": success / elapsed if elapsed > 0 else 0
+        },
+        "processed_questions": processed,
+        "success_questions": success,
+        "failed_questions": failed,
+        "error_rate": failed / processed if processed else 0,
+        "duration_seconds": elapsed
+    }
+
+
+def find_saturation_knee(stages: List[Dict[str, Any]], throughput_gain_threshold: float) -> Optional[int]:
+    """
+    返回首个饱和阶段的下标：相比上一阶段吞吐量增幅低于阈值，而p95总耗时仍在上升
+    """
+    for index in range(1, len(stages)):
+        previous, current = stages[index - 1], stages[index]
+        previous_rps = previous["throughput"]["requests_per_second"]
+        current_rps = current["throughput"]["requests_per_second"]
+        previous_latency = previous["response_time"]["total_time"]
+        current_latency = current["response_time"]["total_time"]
+        if not previous_rps or not previous_latency or not current_latency:
+            continue
+
+        throughput_gain = (current_rps - previous_rps) / previous_rps
+        latency_gain = (current_latency["p95"] - previous_latency["p95"]) / previous_latency["p95"]
+        current["throughput_gain"] = throughput_gain
+        current["latency_gain"] = latency_gain
+        if throughput_gain < throughput_gain_threshold and latency_gain > 0:
+            return index
+    return None
+
+
+class AdaptiveSearch:
+    """
+    自适应并发搜索的状态机，根据上一次探测是否满足SLO给出下一次探测的并发数
+
+    - binary: 从起始并发数倍增直到不满足SLO或到达上限，再在最高满足值和最低不满足值之间二分
+    - aimd: 满足SLO时加性增加并发数，不满足时按比例缩减；在刚超过已知最优值处再次不满足时视为收敛
+    """
+
+    def __init__(
+        self,
+        strategy: str,
+        initial_concurrency: int,
+        max_concurrency: int,
+        max_probes: int,
+        step: int = 1,
+        backoff: float = 0.5
+    ):
+        self.strategy = strategy
+        self.max_concurrency = max_concurrency
+        self.max_probes = max_probes
+        self.step = step
+        self.backoff = backoff
+        self.current = initial_concurrency
+        self.probes = 0
+        # 满足SLO的最大并发数 / 不满足SLO的最小并发数
+        self.best_passed: Optional[int] = None
+        self.lowest_failed: Optional[int] = None
+
+    def next_concurrency(self, passed: Optional[bool]) -> Optional[int]:
+        """passed为上一次探测结果，首次调用传None；返回None表示搜索结束"""
+        if passed is not None:
+            self._observe(passed)
+            if self.probes >= self.max_probes:
+                return None
+            self.current = self._binary() if self.strategy == "binary" else self._aimd(passed)
+            if self.current is None:
+                return None
+        self.probes += 1
+        return self.current
+
+    def _observe(self, passed: bool) -> None:
+        if passed:
+            self.best_passed = max(self.best_passed or 0, self.current)
+        else:
+            self.lowest_failed = min(self.lowest_failed or self.current, self.current)
+
+    def _binary(self) -> Optional[int]:
+        if self.lowest_failed is None:
+            if self.current >= self.max_concurrency:
+                return None
+            return min(self.current * 2, self.max_concurrency)
+        low = self.best_passed or 0
+        if self.lowest_failed - low <= 1:
+            return None
+        return (low + self.lowest_failed) // 2
+
+    def _aimd(self, passed: bool) -> Optional[int]:
+        if passed:
+            if self.current >= self.max_concurrency:
+                return None
+            return min(self.current + self.step, self.max_concurrency)
+        if self.current <= 1:
+            return None
+        if self.best_passed is not None and self.current <= self.best_passed + self.step:
+            return None
+        return max(1, int(self.current * self.backoff))
+
+
+class _ShardMetrics:
+    """
+    工作进程内与LiveTestMetrics接口一致的指标收集器
+
+    在本进程内累计计数和延迟直方图，并定期把在途数和新完成的请求发给主进程更新实时指标
+    """
+
+    REPORT_INTERVAL = 0.5
+
+    def __init__(self, shard_index: int, events):
+        self.shard_index = shard_index
+        self.events = events
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.first_token = LatencyHistogram()
+        self.total_time = LatencyHistogram()
+        self._pending: List[Tuple[bool, Optional[float], Optional[float]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "_ShardMetrics":
+        self._task = asyncio.create_task(self._report_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._task.cancel()
+        self._report()
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+
+    def record(
+        self,
+        success: bool,
+        first_response_time: Optional[float] = None,
+        total_response_time: Optional[float] = None
+    ) -> None:
+        self.processed += 1
+        self._pending.append((success, first_response_time, total_response_time))
+        if not success:
+            self.failed += 1
+            return
+        if first_response_time is not None:
+            self.first_token.record(first_response_time)
+        if total_response_time is not None:
+            self.total_time.record(total_response_time)
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "first_token": self.first_token,
+            "total_time": self.total_time
+        }
+
+    async def _report_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.REPORT_INTERVAL)
+            self._report()
+
+    def _report(self) -> None:
+        records, self._pending = self._pending, []
+        self.events.put(("live", self.shard_index, self.in_flight, records))
+
+
+class PerformanceRunner:
+    """服务端性能测试执行引擎
+
+    以 PerformanceTest.concurrency 个asyncio工作协程并发请求RAG系统，
+    测试结果直接写入数据库，浏览器关闭后测试仍会继续执行。
+    config.load_mode 为 open 时改为按固定到达率发送请求，为 staged 时按阶段逐级提升并发数。
+    config.execution_mode 为 process 时把问题分片给多个工作进程，避免单核成为客户端瓶颈；
+    为 distributed 时经Redis把问题批次分发给多台工作节点（app/workers/perf_worker.py）。
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def is_running(self, test_id: str) -> bool:
+        """检查测试是否正在服务端执行"""
+        task = self._tasks.get(str(test_id))
+        return task is not None and not task.done()
+
+    def start(
+        self,
+        test_id: str,
+        api_config: ApiRequestConfig,
+        question_ids: Optional[List[str]] = None
+    ) -> asyncio.Task:
+        """在当前事件循环中启动测试任务"""
+        test_id = str(test_id)
+        if self.is_running(test_id):
+            raise ValueError("测试已在服务端执行中")
+
+        task = asyncio.create_task(self._run(test_id, api_config, question_ids))
+        self._tasks[test_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(test_id, None))
+        return task
+
+    def cancel(self, test_id: str) -> bool:
+        """取消正在执行的测试，返回是否存在对应任务"""
+        task = self._tasks.get(str(test_id))
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def _load_questions(
+        self, db: Session, test: PerformanceTest, question_ids: Optional[List[str]]
+    ) -> List[Tuple[str, str]]:
+        """只加载问题ID和文本，避免读取整行数据"""
+        query = db.query(Question.id, Question.question_text)
+        if question_ids:
+            query = query.filter(Question.id.in_(question_ids))
+        else:
+            query = query.filter(Question.dataset_id == test.dataset_id)
+        return [(str(row.id), row.question_text) for row in query.order_by(Question.created_at).all()]
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        question_text: str,
+        api_config: ApiRequestConfig,
+        max_attempts: int = 1
+    ) -> Dict:
+        """发送单个问题并同步更新实时指标，重试后才成功的请求不计入延迟分布"""
+        live.request_started()
+        try:
+            result = await request_rag_answer_with_retry(client, question_text, api_config, max_attempts)
+        finally:
+            live.request_finished()
+        if result["success"] and result["attempts"] > 1:
+            live.record(True)
+        else:
+            live.record(result["success"], result["first_response_time"], result["total_response_time"])
+        return result
+
+    def _record_result(
+        self,
+        writer: ResultWriter,
+        test: PerformanceTest,
+        question_id: str,
+        sequence_number: int,
+        result: Dict
+    ) -> None:
+        """把单条测试结果交给后写缓冲区，失败的请求也会记录（total_response_time为空）"""
+        writer.put(build_answer_row(
+            question_id,
+            result,
+            version=test.version,
+            performance_test_id=test.id,
+            sequence_number=sequence_number
+        ))
+
+    def _flush_progress(
+        self, test_id: str, db: Session, rows: List[Dict[str, Any]], inserted_ids: Set[str]
+    ) -> None:
+        """
+        在写入线程中与本批结果同一事务累加测试进度
+        只计入实际写入的记录：租约过期重新入队的批次会再次交回已写入过的问题，
+        这些记录被忽略，进度不会超过问题总数
+        """
+        inserted = [row for row in rows if row["id"] in inserted_ids]
+        success = sum(1 for row in inserted if row["total_response_time"] is not None)
+        if len(inserted) < len(rows):
+            logger.warning(f"性能测试 {test_id} 有 {len(rows) - len(inserted)} 条结果因同版本回答已存在未保存")
+        if not inserted:
+            return
+        db.query(PerformanceTest).filter(PerformanceTest.id == test_id).update({
+            PerformanceTest.processed_questions: PerformanceTest.processed_questions + len(inserted),
+            PerformanceTest.success_questions: PerformanceTest.success_questions + success,
+            PerformanceTest.failed_questions: PerformanceTest.failed_questions + len(inserted) - success,
+        }, synchronize_session=False)
+
+    async def _run_closed_loop(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        concurrency: int,
+        max_attempts: int = 1
+    ) -> Optional[Dict[str, Any]]:
+        """闭环模式：每个工作协程完成上一个请求后才发送下一个"""
+        pending: asyncio.Queue = asyncio.Queue()
+        for item in questions:
+            pending.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    sequence_number, question_id, question_text = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                result = await self._send(client, live, question_text, api_config, max_attempts)
+                self._record_result(writer, test, question_id, sequence_number, result)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        return None
+
+    async def _run_staged(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        阶梯模式：按阶段依次提升并发数，每个阶段持续指定时长并单独统计指标
+
+        问题按顺序循环使用，使每个阶段都持续完整的时长；只有首次发送的结果写入数据库。
+        """
+        next_question, position = self._question_cycle(questions)
+
+        stage_results = []
+        for index, stage in enumerate(load_config["stages"]):
+            stage_summary = await self._run_window(
+                client, writer, live, test, api_config, next_question,
+                stage["concurrency"], stage["duration_seconds"], load_config["max_attempts"]
+            )
+            stage_summary.update({
+                "stage": index + 1,
+                "concurrency": stage["concurrency"],
+                "planned_duration_seconds": stage["duration_seconds"],
+                "is_knee": False
+            })
+            stage_results.append(stage_summary)
+
+        knee_index = find_saturation_knee(stage_results, load_config["knee_throughput_gain"])
+        saturation_knee = None
+        if knee_index is not None:
+            knee_stage = stage_results[knee_index]
+            knee_stage["is_knee"] = True
+            saturation_knee = {
+                "stage": knee_stage["stage"],
+                "concurrency": knee_stage["concurrency"],
+                "previous_concurrency": stage_results[knee_index - 1]["concurrency"],
+                "throughput_gain": knee_stage["throughput_gain"],
+                "latency_gain": knee_stage["latency_gain"]
+            }
+
+        return {
+            "stages": stage_results,
+            "saturation_knee": saturation_knee,
+            "questions_recycled": position["next"] > len(questions)
+        }
+
+    @staticmethod
+    def _question_cycle(questions: List[Tuple[int, str, str]]):
+        """
+        按顺序循环取问题，返回 (next_question, position)
+
+        next_question返回 (序号, 问题ID, 问题文本, 是否写库)，只有首次发送的问题写库；
+        position["next"] 为已取出的次数。
+        """
+        position = {"next": 0}
+
+        def next_question() -> Optional[Tuple[int, str, str, bool]]:
+            if not questions:
+                return None
+            index = position["next"]
+            position["next"] += 1
+            return questions[index % len(questions)] + (index < len(questions),)
+
+        return next_question, position
+
+    async def _run_window(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        api_config: ApiRequestConfig,
+        next_question,
+        concurrency: int,
+        duration_seconds: float,
+        max_attempts: int
+    ) -> Dict[str, Any]:
+        """
+        以固定并发数执行一个时间窗口并返回窗口的汇总指标
+
+        next_question返回 (序号, 问题ID, 问题文本, 是否写库)，没有问题时返回None；
+        截止时间后不再发出新请求，已发出的请求会等待完成。
+        """
+        first_response_times: List[float] = []
+        total_response_times: List[float] = []
+        counters = {"processed": 0, "failed": 0}
+        window_start = time.perf_counter()
+        deadline = window_start + duration_seconds
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                item = next_question()
+                if item is None:
+                    return
+
+                sequence_number, question_id, question_text, persist = item
+                result = await self._send(client, live, question_text, api_config, max_attempts)
+                counters["processed"] += 1
+                if not result["success"]:
+                    counters["failed"] += 1
+                elif result["attempts"] == 1:
+                    # 重试后才成功的请求不计入延迟分布
+                    total_response_times.append(result["total_response_time"])
+                    if result["first_response_time"] is not None:
+                        first_response_times.append(result["first_response_time"])
+                if persist:
+                    self._record_result(writer, test, question_id, sequence_number, result)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        return summarize_stage(
+            first_response_times,
+            total_response_times,
+            counters["processed"],
+            counters["failed"],
+            time.perf_counter() - window_start
+        )
+
+    async def _run_adaptive(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        自适应模式：以短时探测窗口调整并发数，搜索满足SLO的最大并发数和吞吐量
+
+        问题按顺序循环使用，只有首次发送的结果写入数据库，之后的发送仅用于探测统计。
+        """
+        next_question, position = self._question_cycle(questions)
+
+        slo = load_config["slo"]
+        search = AdaptiveSearch(
+            load_config["search"],
+            load_config["initial_concurrency"],
+            load_config["max_concurrency"],
+            load_config["max_probes"],
+            load_config["aimd_step"],
+            load_config["aimd_backoff"]
+        )
+        probes = []
+        concurrency = search.next_concurrency(None)
+        while concurrency is not None:
+            probe = await self._run_window(
+                client, writer, live, test, api_config, next_question,
+                concurrency, load_config["probe_seconds"], load_config["max_attempts"]
+            )
+            verdict = evaluate_slo(probe, slo)
+            probe.update({
+                "probe": len(probes) + 1,
+                "concurrency": concurrency,
+                "passed": verdict["passed"],
+                "violations": verdict["violations"]
+            })
+            probes.append(probe)
+            logger.info(
+                f"性能测试 {test.id} 探测并发数 {concurrency}: "
+                f"{'满足' if verdict['passed'] else '不满足'}SLO, "
+                f"{probe['throughput']['requests_per_second']:.2f} rps"
+            )
+            concurrency = search.next_concurrency(verdict["passed"])
+
+        passed = [probe for probe in probes if probe["passed"]]
+        best = max(passed, key=lambda probe: probe["concurrency"]) if passed else None
+        return {
+            "adaptive": {
+                "slo": slo,
+                "search": load_config["search"],
+                "probe_seconds": load_config["probe_seconds"],
+                "best_concurrency": best["concurrency"] if best else None,
+                "best_rps": best["throughput"]["requests_per_second"] if best else None,
+                "max_rps_within_slo": max(
+                    probe["throughput"]["requests_per_second"] for probe in passed
+                ) if passed else None,
+                "questions_recycled": position["next"] > len(questions),
+                "probes": probes
+            }
+        }
+
+    async def _run_open_loop(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        开环模式：按计划时刻发送请求，不受在途请求数限制
+
+        记录每个请求的计划发送时刻与实际发送时刻，校正后的延迟从计划时刻开始计算，
+        避免协调遗漏(coordinated omission)导致延迟被低估。
+        """
+        samples = await self._send_open_loop(client, writer, live, test, questions, api_config, load_config)
+        return summarize_open_loop(load_config, [samples])
+
+    async def _send_open_loop(
+        self,
+        client: httpx.AsyncClient,
+        writer: ResultWriter,
+        live: Union[LiveTestMetrics, _ShardMetrics],
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """按计划时刻发送全部请求，返回发送延迟和校正后延迟的原始样本"""
+        schedule = build_arrival_schedule(
+            len(questions),
+            load_config["arrival_rate"],
+            load_config["arrival_distribution"],
+            load_config["seed"]
+        ) + load_config.get("start_offset", 0.0)
+        send_lags: List[float] = []
+        corrected_first: List[float] = []
+        corrected_total: List[float] = []
+        in_flight = 0
+        peak_in_flight = 0
+
+        async def fire(sequence_number: int, question_id: str, question_text: str, scheduled_at: float):
+            nonlocal in_flight, peak_in_flight
+            send_lag = time.perf_counter() - scheduled_at
+            in_flight += 1
+            peak_in_flight = max(peak_in_flight, in_flight)
+            try:
+                result = await self._send(client, live, question_text, api_config, load_config["max_attempts"])
+            finally:
+                in_flight -= 1
+
+            send_lags.append(send_lag)
+            if result["success"] and result["attempts"] == 1:
+                corrected_total.append(result["total_response_time"] + send_lag)
+                if result["first_response_time"] is not None:
+                    corrected_first.append(result["first_response_time"] + send_lag)
+            self._record_result(writer, test, question_id, sequence_number, result)
+
+        tasks = []
+        start = time.perf_counter()
+        for (sequence_number, question_id, question_text), offset in zip(questions, schedule):
+            scheduled_at = start + float(offset)
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(sequence_number, question_id, question_text, scheduled_at)))
+        send_duration = time.perf_counter() - start
+
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return {
+            "scheduled": len(questions),
+            "sent": len(tasks),
+            "send_duration": send_duration,
+            "peak_in_flight": peak_in_flight,
+            "send_lags": send_lags,
+            "corrected_first": corrected_first,
+            "corrected_total": corrected_total
+        }
+
+    @staticmethod
+    def _pool_size(load_config: Dict[str, Any], concurrency: int, api_config: ApiRequestConfig, count: int) -> int:
+        """开环模式下在途请求数不受并发数限制，按到达率×超时估算在途请求上限"""
+        if load_config["load_mode"] != "open":
+            return concurrency
+        in_flight_bound = math.ceil(load_config["arrival_rate"] * api_config.timeout)
+        return max(concurrency, min(in_flight_bound, count))
+
+    async def _run_processes(
+        self,
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any],
+        live: LiveTestMetrics
+    ) -> Optional[Dict[str, Any]]:
+        """
+        多进程模式：按轮询把问题分片给各工作进程，每个进程运行独立的事件循环
+
+        工作进程直接写库并累加测试进度，实时指标通过队列汇总到主进程；
+        全部进程就绪后才同时开始发送，结束后合并各进程的计数和延迟直方图。
+        """
+        if not questions:
+            return None
+        is_open = load_config["load_mode"] == "open"
+        concurrency = max(1, test.concurrency)
+        workers = min(load_config["workers"], len(questions))
+        if not is_open:
+            workers = min(workers, concurrency)
+
+        context = multiprocessing.get_context("spawn")
+        events = context.Queue()
+        start_event = context.Event()
+        stop_event = context.Event()
+        processes = []
+        for index, (shard, shard_concurrency) in enumerate(
+            zip(split_shards(questions, workers), split_concurrency(concurrency, workers))
+        ):
+            shard_config = dict(load_config)
+            if is_open:
+                # 各进程按总到达率的1/workers发送，固定间隔时错开起始时刻使合并后的请求均匀分布
+                shard_config["arrival_rate"] = load_config["arrival_rate"] / workers
+                if load_config["arrival_distribution"] == "constant":
+                    shard_config["start_offset"] = index / load_config["arrival_rate"]
+                if load_config["seed"] is not None:
+                    shard_config["seed"] = load_config["seed"] + index
+            process = context.Process(
+                target=run_shard_process,
+                args=(
+                    str(test.id), api_config.model_dump(), index, shard, shard_config,
+                    shard_concurrency, events, start_event, stop_event
+                ),
+                daemon=True
+            )
+            process.start()
+            processes.append(process)
+
+        try:
+            shard_results = await self._collect_shard_events(processes, events, start_event, live)
+        except BaseException:
+            stop_event.set()
+            await asyncio.to_thread(self._join_processes, processes, events)
+            raise
+        await asyncio.to_thread(self._join_processes, processes, events)
+
+        extra_metrics = {"process_pool": merge_shard_results(shard_results)}
+        if is_open:
+            extra_metrics.update(summarize_open_loop(
+                load_config, [shard_results[index]["open_loop"] for index in sorted(shard_results)]
+            ))
+        return extra_metrics
+
+    async def _collect_shard_events(
+        self,
+        processes: List[multiprocessing.Process],
+        events,
+        start_event,
+        live: LiveTestMetrics
+    ) -> Dict[int, Dict[str, Any]]:
+        """读取工作进程的消息：就绪、实时指标、分片结果或错误"""
+        shard_results: Dict[int, Dict[str, Any]] = {}
+        shard_in_flight: Dict[int, int] = {}
+        ready: Set[int] = set()
+        pending = set(range(len(processes)))
+        while pending:
+            try:
+                message = await asyncio.to_thread(events.get, True, 0.5)
+            except queue.Empty:
+                for index in pending:
+                    if not processes[index].is_alive():
+                        raise RuntimeError(
+                            f"第{index + 1}个工作进程异常退出(exitcode={processes[index].exitcode})"
+                        )
+                continue
+
+            kind, index = message[0], message[1]
+            if kind == "ready":
+                ready.add(index)
+                if len(ready) == len(processes):
+                    start_event.set()
+            elif kind == "live":
+                in_flight, records = message[2], message[3]
+                live.adjust_in_flight(in_flight - shard_in_flight.get(index, 0))
+                shard_in_flight[index] = in_flight
+                for record in records:
+                    live.record(*record)
+            elif kind == "done":
+                shard_results[index] = message[2]
+                pending.discard(index)
+            elif kind == "error":
+                raise RuntimeError(f"第{index + 1}个工作进程执行失败: {message[2]}")
+        return shard_results
+
+    @staticmethod
+    def _join_processes(processes: List[multiprocessing.Process], events, timeout: float = 30.0) -> None:
+        """
+        等待工作进程写完剩余结果后退出，超时则强制结束
+        等待期间继续读取并丢弃队列消息，避免子进程退出时阻塞在未读完的队列上
+        """
+        deadline = time.monotonic() + timeout
+        while any(process.is_alive() for process in processes) and time.monotonic() < deadline:
+            try:
+                events.get(True, 0.1)
+            except queue.Empty:
+                pass
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    async def _run_shard(
+        self,
+        test_id: str,
+        api_config: ApiRequestConfig,
+        shard_index: int,
+        questions: List[Tuple[int, str, str]],
+        load_config: Dict[str, Any],
+        concurrency: int,
+        events,
+        start_event,
+        stop_event
+    ) -> None:
+        """在工作进程中执行一个问题分片，完成后把计数和直方图发回主进程"""
+        db = SessionLocal()
+        try:
+            test = performance_service.get(db, id=test_id)
+            pool_size = self._pool_size(load_config, concurrency, api_config, len(questions))
+            metrics = _ShardMetrics(shard_index, events)
+
+            events.put(("ready", shard_index))
+            if not await asyncio.to_thread(self._wait_for_start, start_event, stop_event):
+                return
+            watcher = asyncio.create_task(self._watch_stop(stop_event, asyncio.current_task()))
+
+            open_loop = None
+            start = time.perf_counter()
+            writer = ResultWriter(on_flush=functools.partial(self._flush_progress, test_id))
+            try:
+                async with http_client_registry.lease(api_config.endpoint_url, pool_size) as client, writer, metrics:
+                    if load_config["load_mode"] == "open":
+                        open_loop = await self._send_open_loop(
+                            client, writer, metrics, test, questions, api_config, load_config
+                        )
+                    else:
+                        await self._run_closed_loop(
+                            client, writer, metrics, test, questions, api_config, concurrency,
+                            load_config["max_attempts"]
+                        )
+            finally:
+                watcher.cancel()
+
+            events.put(("done", shard_index, {
+                **metrics.result(),
+                "questions": len(questions),
+                "concurrency": concurrency,
+                "duration_seconds": time.perf_counter() - start,
+                "open_loop": open_loop
+            }))
+        finally:
+            await http_client_registry.aclose()
+            db.close()
+
+    @staticmethod
+    def _wait_for_start(start_event, stop_event) -> bool:
+        """等待主进程发出开始信号，收到停止信号时返回False"""
+        while not start_event.wait(0.2):
+            if stop_event.is_set():
+                return False
+        return not stop_event.is_set()
+
+    @staticmethod
+    async def _watch_stop(stop_event, task: asyncio.Task) -> None:
+        """主进程要求停止时取消分片任务，后写缓冲区仍会写完已测量的结果"""
+        while not stop_event.is_set():
+            await asyncio.sleep(0.2)
+        task.cancel()
+
+    async def _run_distributed(
+        self,
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any],
+        live: LiveTestMetrics
+    ) -> Optional[Dict[str, Any]]:
+        """分布式模式：问题批次经Redis分发给工作节点，本进程只负责写库和汇总"""
+        coordinator = DistributedCoordinator(get_redis(), lease_seconds=load_config["lease_seconds"])
+        writer = ResultWriter(on_flush=functools.partial(self._flush_progress, str(test.id)))
+        async with writer:
+            return await coordinator.run(
+                str(test.id),
+                questions,
+                api_config,
+                concurrency=max(1, test.concurrency),
+                max_attempts=load_config["max_attempts"],
+                version=test.version,
+                batch_size=load_config["batch_size"],
+                writer=writer,
+                live=live
+            )
+
+    async def _run_in_loop(
+        self,
+        test: PerformanceTest,
+        questions: List[Tuple[int, str, str]],
+        api_config: ApiRequestConfig,
+        load_config: Dict[str, Any],
+        live: LiveTestMetrics
+    ) -> Optional[Dict[str, Any]]:
+        """在当前事件循环中执行测试"""
+        concurrency = max(1, test.concurrency)
+        if load_config["load_mode"] == "staged":
+            concurrency = max(stage["concurrency"] for stage in load_config["stages"])
+        elif load_config["load_mode"] == "adaptive":
+            # 未设置上限时以测试的并发数为上限
+            if load_config["max_concurrency"] is None:
+                load_config["max_concurrency"] = max(concurrency, load_config["initial_concurrency"])
+            concurrency = load_config["max_concurrency"]
+        pool_size = self._pool_size(load_config, concurrency, api_config, len(questions))
+
+        # 结果由后写缓冲区在线程池中批量落库，测量协程不等待数据库
+        writer = ResultWriter(on_flush=functools.partial(self._flush_progress, str(test.id)))
+        async with http_client_registry.lease(api_config.endpoint_url, pool_size) as client, writer:
+            if load_config["load_mode"] == "open":
+                return await self._run_open_loop(
+                    client, writer, live, test, questions, api_config, load_config
+                )
+            if load_config["load_mode"] == "staged":
+                return await self._run_staged(
+                    client, writer, live, test, questions, api_config, load_config
+                )
+            if load_config["load_mode"] == "adaptive":
+                return await self._run_adaptive(
+                    client, writer, live, test, questions, api_config, load_config
+                )
+            return await self._run_closed_loop(
+                client, writer, live, test, questions, api_config, concurrency, load_config["max_attempts"]
+            )
+
+    def _prepare(
+        self, test_id: str, question_ids: Optional[List[str]]
+    ) -> Optional[Tuple[PerformanceTest, Dict[str, Any], List[Tuple[int, str, str]]]]:
+        """
+        加载测试、解析负载配置和问题列表并重置进度（同步数据库操作，在线程池中执行）
+
+        返回的测试对象已脱离会话，执行期间只读取其列值。
+        """
+        db = SessionLocal()
+        try:
+            test = performance_service.get(db, id=test_id)
+            if not test:
+                return None
+
+            load_config = parse_load_config(test.config)
+            questions = [
+                (sequence_number, question_id, question_text)
+                for sequence_number, (question_id, question_text)
+                in enumerate(self._load_questions(db, test, question_ids), start=1)
+            ]
+            test.total_questions = len(questions)
+            test.processed_questions = 0
+            test.success_questions = 0
+            test.failed_questions = 0
+            db.commit()
+            db.refresh(test)
+            db.expunge(test)
+            return test, load_config, questions
+        finally:
+            db.close()
+
+    @staticmethod
+    def _complete(test_id: str, extra_metrics: Optional[Dict[str, Any]]) -> None:
+        """汇总测试结果并标记完成（同步数据库操作，在线程池中执行）"""
+        db = SessionLocal()
+        try:
+            performance_service.complete_performance_test(
+                db, performance_test_id=test_id, extra_metrics=extra_metrics
+            )
+        finally:
+            db.close()
+
+    @staticmethod
+    def _fail(test_id: str, message: str) -> None:
+        """标记测试失败（同步数据库操作，在线程池中执行）"""
+        db = SessionLocal()
+        try:
+            performance_service.fail_performance_test(
+                db, performance_test_id=test_id, error_details={"message": message}
+            )
+        finally:
+            db.close()
+
+    async def _run(
+        self,
+        test_id: str,
+        api_config: ApiRequestConfig,
+        question_ids: Optional[List[str]]
+    ) -> None:
+        # 数据库操作都在线程池中以独立会话执行，不阻塞同一事件循环中的其他测试、结果写入和实时指标推送
+        try:
+            prepared = await asyncio.to_thread(self._prepare, test_id, question_ids)
+            if prepared is None:
+                logger.error(f"性能测试不存在: {test_id}")
+                return
+            test, load_config, questions = prepared
+
+            live = live_metrics.get_or_create(test_id)
+            if load_config["execution_mode"] == "process":
+                extra_metrics = await self._run_processes(test, questions, api_config, load_config, live)
+            elif load_config["execution_mode"] == "distributed":
+                extra_metrics = await self._run_distributed(test, questions, api_config, load_config, live)
+            else:
+                extra_metrics = await self._run_in_loop(test, questions, api_config, load_config, live)
+
+            await asyncio.to_thread(self._complete, test_id, extra_metrics)
+            logger.info(f"服务端性能测试完成: {test_id}")
+
+        except asyncio.CancelledError:
+            # 中断接口已负责更新测试状态
+            logger.info(f"服务端性能测试已取消: {test_id}")
+            raise
+        except Exception as e:
+            logger.exception(f"服务端性能测试执行失败: {test_id}")
+            await asyncio.to_thread(self._fail, test_id, str(e))
+        finally:
+            live_metrics.finish(test_id)
+
+
+performance_runner = PerformanceRunner()
@@ -1,6 +1,7 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
 import numpy as np
+from sqlalchemy import Float, cast, func, or_, select
 from sqlalchemy.orm import Session
 
 from app.models.performance import PerformanceTest
@@ -8,6 +9,217 @@ from app.models.question import Question
 from app.models.rag_answer import RagAnswer
 from app.schemas.performance import PerformanceTestCreate, PerformanceTestUpdate
 from app.services import question_service
+from app.services.live_metrics import live_metrics
+from app.services.performance_stats import compare_latency_samples
+from app.services.slo import evaluate_slo, parse_slo
+
+def calculate_percentiles(data) -> Optional[Dict[str, Any]]:
+    """计算分位数统计"""
+    if data is None or len(data) == 0:
+        return None
+    return {
+        "avg": float(np.mean(data)),
+        "max": float(np.max(data)),
+        "min": float(np.min(data)),
+        "p50": float(np.percentile(data, 50)),
+        "p75": float(np.percentile(data, 75)),
+        "p90": float(np.percentile(data, 90)),
+        "p95": float(np.percentile(data, 95)),
+        "p99": float(np.percentile(data, 99)),
+        "samples": len(data)
+    }
+
+PERCENTILE_LEVELS = (50, 75, 90, 95, 99)
+# 时间线默认按秒分桶，可通过config.timeline_bucket_seconds调整
+DEFAULT_TIMELINE_BUCKET_SECONDS = 1.0
+# 非PostgreSQL数据库逐块读取数值列时每块的行数
+METRICS_CHUNK_SIZE = 10000
+
+
+def _sql_percentile_stats(db: Session, column, *filters) -> Optional[Dict[str, Any]]:
+    """
+    在PostgreSQL中用percentile_cont聚合单个数值列，结果与calculate_percentiles一致
+
+    percentile_cont与np.percentile默认的线性插值算法相同
+    """
+    value = cast(column, Float)
+    row = db.query(
+        func.count(value),
+        func.avg(value),
+        func.max(value),
+        func.min(value),
+        *(func.percentile_cont(level / 100).within_group(value) for level in PERCENTILE_LEVELS)
+    ).filter(column.isnot(None), *filters).one()
+
+    if not row[0]:
+        return None
+    stats = {
+        "avg": float(row[1]),
+        "max": float(row[2]),
+        "min": float(row[3]),
+    }
+    for level, percentile in zip(PERCENTILE_LEVELS, row[4:]):
+        stats[f"p{level}"] = float(percentile)
+    stats["samples"] = int(row[0])
+    return stats
+
+
+def _epoch_seconds(value: datetime) -> float:
+    """数据库中无时区的时间按UTC处理"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _stream_numeric_columns(db: Session, columns: List[Any], *filters) -> List[np.ndarray]:
+    """只读取指定数值列并按块拼接为float数组，空值保留为nan"""
+    chunks: List[List[np.ndarray]] = [[] for _ in columns]
+    result = db.execute(
+        select(*columns).where(*filters).execution_options(yield_per=METRICS_CHUNK_SIZE)
+    )
+    for partition in result.partitions():
+        block = np.array(
+            [[np.nan if value is None else float(value) for value in row] for row in partition],
+            dtype=float
+        ).reshape(-1, len(columns))
+        for index in range(len(columns)):
+            chunks[index].append(block[:, index])
+    return [np.concatenate(parts) if parts else np.empty(0) for parts in chunks]
+
+
+def percentiles_from_counts(counts: np.ndarray) -> Optional[Dict[str, Any]]:
+    """
+    由整数值的计数直方图（下标即取值）计算分位数统计
+
+    结果与对展开后的原始数据调用calculate_percentiles完全一致，但内存只与取值范围相关
+    """
+    total = int(counts.sum())
+    if total == 0:
+        return None
+    cumulative = np.cumsum(counts)
+    nonzero = np.flatnonzero(counts)
+
+    def value_at(rank: int) -> int:
+        return int(np.searchsorted(cumulative, rank, side="right"))
+
+    stats = {
+        "avg": float(np.dot(counts, np.arange(len(counts))) / total),
+        "max": float(nonzero[-1]),
+        "min": float(nonzero[0]),
+    }
+    for level in PERCENTILE_LEVELS:
+        # 与np.percentile默认的线性插值保持一致
+        position = (total - 1) * level / 100
+        lower = int(np.floor(position))
+        lower_value = value_at(lower)
+        upper_value = value_at(min(lower + 1, total - 1))
+        stats[f"p{level}"] = float(lower_value + (position - lower) * (upper_value - lower_value))
+    stats["samples"] = total
+    return stats
+
+
+def build_timeline(
+    completed_at: np.ndarray,
+    latencies: np.ndarray,
+    origin: float,
+    bucket_seconds: float
+) -> Dict[str, Any]:
+    """
+    按完成时间分桶统计完成数、失败数、平均/p95总耗时和在途请求数
+
+    completed_at为完成时刻(epoch秒)，latencies为总耗时(秒)，失败请求为nan；
+    在途请求数取每个桶结束时刻仍在执行的请求数，失败请求视为瞬时完成
+    """
+    bucket_index = np.floor((completed_at - origin) / bucket_seconds).astype(np.int64)
+    bucket_index = np.maximum(bucket_index, 0)
+    bucket_count = int(bucket_index.max()) + 1 if bucket_index.size else 0
+    succeeded = ~np.isnan(latencies)
+
+    completions = np.bincount(bucket_index, minlength=bucket_count)
+    errors = np.bincount(bucket_index[~succeeded], minlength=bucket_count)
+
+    # 每桶内按耗时排序后用线性插值取p95，与np.percentile一致
+    success_index = bucket_index[succeeded]
+    success_latency = latencies[succeeded]
+    order = np.lexsort((success_latency, success_index))
+    success_index = success_index[order]
+    success_latency = success_latency[order]
+    success_counts = np.bincount(success_index, minlength=bucket_count)
+    latency_sums = np.bincount(success_index, weights=success_latency, minlength=bucket_count)
+    group_starts = np.concatenate(([0], np.cumsum(success_counts)[:-1]))
+    has_success = success_counts > 0
+
+    mean_latency = np.full(bucket_count, np.nan)
+    mean_latency[has_success] = latency_sums[has_success] / success_counts[has_success]
+    p95_latency = np.full(bucket_count, np.nan)
+    position = group_starts[has_success] + (success_counts[has_success] - 1) * 0.95
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, group_starts[has_success] + success_counts[has_success] - 1)
+    p95_latency[has_success] = success_latency[lower] + (position - lower) * (
+        success_latency[upper] - success_latency[lower]
+    )
+
+    started_at = np.sort(completed_at - np.nan_to_num(latencies, nan=0.0))
+    ended_at = np.sort(completed_at)
+    bucket_ends = origin + (np.arange(bucket_count) + 1) * bucket_seconds
+    in_flight = np.searchsorted(started_at, bucket_ends, side="right") - np.searchsorted(ended_at, bucket_ends, side="right")
+
+    def compact(values: np.ndarray) -> List[Optional[float]]:
+        # 耗时保留到毫秒，空桶记为null
+        return [None if np.isnan(value) else round(float(value), 3) for value in values]
+
+    return {
+        "bucket_seconds": bucket_seconds,
+        "origin": datetime.fromtimestamp(origin, tz=timezone.utc).isoformat(),
+        "completions": completions.tolist(),
+        "errors": errors.tolist(),
+        "mean_latency": compact(mean_latency),
+        "p95_latency": compact(p95_latency),
+        "in_flight": in_flight.tolist(),
+    }
+
+
+def downsample_timeline(timeline: Dict[str, Any], factor: int) -> Dict[str, Any]:
+    """
+    把相邻factor个桶合并为一个桶
+
+    完成数和失败数求和，平均耗时按成功数加权，在途请求数取平均；
+    p95无法由各桶p95精确合并，取各桶p95的最大值作为上界
+    """
+    bucket_count = len(timeline["completions"])
+    if factor <= 1 or bucket_count == 0:
+        return timeline
+    padded = int(np.ceil(bucket_count / factor)) * factor
+
+    def grouped(key: str, fill: float) -> np.ndarray:
+        values = np.array([fill if v is None else v for v in timeline[key]], dtype=float)
+        return np.pad(values, (0, padded - bucket_count), constant_values=fill).reshape(-1, factor)
+
+    completions = grouped("completions", 0).sum(axis=1)
+    errors = grouped("errors", 0).sum(axis=1)
+    successes = grouped("completions", 0) - grouped("errors", 0)
+    weighted = np.nansum(grouped("mean_latency", np.nan) * successes, axis=1)
+    success_totals = successes.sum(axis=1)
+    mean_latency = np.full(len(completions), np.nan)
+    mean_latency[success_totals > 0] = weighted[success_totals > 0] / success_totals[success_totals > 0]
+    p95_groups = grouped("p95_latency", np.nan)
+    p95_latency = np.full(len(completions), np.nan)
+    has_p95 = ~np.all(np.isnan(p95_groups), axis=1)
+    p95_latency[has_p95] = np.nanmax(p95_groups[has_p95], axis=1)
+    # 末尾补齐的空桶不参与在途请求数的平均
+    in_flight_groups = grouped("in_flight", np.nan)
+    in_flight = np.nanmean(in_flight_groups, axis=1)
+
+    return {
+        "bucket_seconds": timeline["bucket_seconds"] * factor,
+        "origin": timeline["origin"],
+        "completions": completions.astype(int).tolist(),
+        "errors": errors.astype(int).tolist(),
+        "mean_latency": [None if np.isnan(v) else round(float(v), 3) for v in mean_latency],
+        "p95_latency": [None if np.isnan(v) else round(float(v), 3) for v in p95_latency],
+        "in_flight": [round(float(v), 2) for v in in_flight],
+    }
+
 
 class PerformanceService:
     def get(self, db: Session, *, id: str) -> Optional[PerformanceTest]:
@@ -74,12 +286,18 @@ class PerformanceService:
         db_obj.started_at = datetime.utcnow()
         db.commit()
         db.refresh(db_obj)
+        live_metrics.start(performance_test_id)
         return db_obj
     
     def complete_performance_test(
-        self, db: Session, *, performance_test_id: str, calculate_metrics: bool = True
+        self,
+        db: Session,
+        *,
+        performance_test_id: str,
+        calculate_metrics: bool = True,
+        extra_metrics: Optional[Dict[str, Any]] = None
     ) -> PerformanceTest:
-        """完成性能测试并计算汇总指标"""
+        """完成性能测试并计算汇总指标，extra_metrics会合并到summary_metrics中"""
         db_obj = db.query(PerformanceTest).filter(PerformanceTest.id == performance_test_id).first()
         if not db_obj:
             return None
@@ -88,22 +306,27 @@ class PerformanceService:
         db_obj.completed_at = datetime.utcnow()
         
         if calculate_metrics:
-            # 获取该测试的所有RAG答案
-            rag_answers = db.query(RagAnswer).filter(
-                RagAnswer.performance_test_id == performance_test_id
-            ).all()
-            
-            # 计算汇总指标
-            metrics = self._calculate_summary_metrics(rag_answers, db_obj)
+            # 只聚合数值列，不加载回答内容
+            total_count, success_count, metrics = self._calculate_summary_metrics(db, db_obj)
             db_obj.summary_metrics = metrics
             
+            db_obj.timeline = self._calculate_timeline(db, db_obj)
+            
             # 更新成功和失败的问题数
-            db_obj.success_questions = len([a for a in rag_answers if a.total_response_time is not None])
-            db_obj.failed_questions = len(rag_answers) - db_obj.success_questions
-            db_obj.processed_questions = len(rag_answers)
+            db_obj.success_questions = success_count
+            db_obj.failed_questions = total_count - success_count
+            db_obj.processed_questions = total_count
+        
+        if extra_metrics:
+            db_obj.summary_metrics = {**(db_obj.summary_metrics or {}), **extra_metrics}
+        
+        verdict = self._evaluate_verdict(db_obj)
+        if verdict is not None:
+            db_obj.summary_metrics = {**(db_obj.summary_metrics or {}), "verdict": verdict}
         
         db.commit()
         db.refresh(db_obj)
+        live_metrics.finish(performance_test_id)
         return db_obj
     
     def fail_performance_test(
@@ -121,17 +344,33 @@ class PerformanceService:
         
         db.commit()
         db.refresh(db_obj)
+        live_metrics.finish(performance_test_id)
         return db_obj
     
-    def _calculate_summary_metrics(self, rag_answers: List[RagAnswer], test: PerformanceTest) -> Dict[str, Any]:
-        """计算性能指标汇总"""
-        if not rag_answers:
-            return {}
-        
-        # 过滤出成功的回答
-        successful_answers = [a for a in rag_answers if a.total_response_time is not None]
-        if not successful_answers:
-            return {"success_rate": 0, "test_duration_seconds": 0}
+    def _calculate_summary_metrics(self, db: Session, test: PerformanceTest) -> Tuple[int, int, Dict[str, Any]]:
+        """
+        计算性能指标汇总
+        返回: (回答总数, 成功回答数, 汇总指标)
+        PostgreSQL上直接在数据库中计算分位数，其他数据库逐块读取数值列后用NumPy计算；
+        延迟分布只统计首次尝试即成功的请求，重试后才成功的请求不计入
+        """
+        in_test = RagAnswer.performance_test_id == test.id
+        succeeded = RagAnswer.total_response_time.isnot(None)
+        first_attempt = or_(RagAnswer.attempts.is_(None), RagAnswer.attempts <= 1)
+        total_count, success_count, total_chars = db.query(
+            func.count(RagAnswer.id),
+            func.count(RagAnswer.total_response_time),
+            func.sum(RagAnswer.character_count).filter(succeeded)
+        ).filter(in_test).one()
+
+        if not total_count:
+            return 0, 0, {}
+        if not success_count:
+            return total_count, 0, {
+                "success_rate": 0,
+                "test_duration_seconds": 0,
+                "errors": self._calculate_error_breakdown(db, in_test)
+            }
         
         # 计算测试持续时间
         if test.completed_at and test.started_at:
@@ -143,44 +382,284 @@ class PerformanceService:
             test_duration = 0
         
         # 提取性能数据
-        first_response_times = [a.first_response_time for a in successful_answers if a.first_response_time is not None]
-        total_response_times = [a.total_response_time for a in successful_answers if a.total_response_time is not None]
-        character_counts = [a.character_count for a in successful_answers if a.character_count is not None]
-        
-        # 计算分位数函数
-        def calculate_percentiles(data):
-            if not data:
-                return None
-            return {
-                "avg": float(np.mean(data)),
-                "max": float(np.max(data)),
-                "min": float(np.min(data)),
-                "p50": float(np.percentile(data, 50)),
-                "p75": float(np.percentile(data, 75)),
-                "p90": float(np.percentile(data, 90)),
-                "p95": float(np.percentile(data, 95)),
-                "p99": float(np.percentile(data, 99)),
-                "samples": len(data)
-            }
+        if db.get_bind().dialect.name == "postgresql":
+            first_token_stats = _sql_percentile_stats(
+                db, RagAnswer.first_response_time, in_test, succeeded, first_attempt
+            )
+            total_time_stats = _sql_percentile_stats(
+                db, RagAnswer.total_response_time, in_test, succeeded, first_attempt
+            )
+            output_chars_stats = _sql_percentile_stats(db, RagAnswer.character_count, in_test, succeeded)
+        else:
+            first_response_times, total_response_times, character_counts, attempts = _stream_numeric_columns(
+                db,
+                [
+                    RagAnswer.first_response_time,
+                    RagAnswer.total_response_time,
+                    RagAnswer.character_count,
+                    RagAnswer.attempts
+                ],
+                in_test,
+                succeeded
+            )
+            is_first_attempt = ~(attempts > 1)
+            first_token_stats = calculate_percentiles(
+                first_response_times[is_first_attempt & ~np.isnan(first_response_times)]
+            )
+            total_time_stats = calculate_percentiles(total_response_times[is_first_attempt])
+            output_chars_stats = calculate_percentiles(character_counts[~np.isnan(character_counts)])
+        total_chars = float(total_chars or 0)
         
         # 构建汇总指标
         metrics = {
             "response_time": {
-                "first_token_time": calculate_percentiles(first_response_times),
-                "total_time": calculate_percentiles(total_response_times)
+                "first_token_time": first_token_stats,
+                "total_time": total_time_stats
             },
             "throughput": {
-                "requests_per_second": len(successful_answers) / test_duration if test_duration > 0 else 0,
-                "chars_per_second": sum(character_counts) / test_duration if test_duration > 0 else 0
+                "requests_per_second": success_count / test_duration if test_duration > 0 else 0,
+                "chars_per_second": total_chars / test_duration if test_duration > 0 else 0
             },
             "character_stats": {
-                "output_chars": calculate_percentiles(character_counts)
+                "output_chars": output_chars_stats
             },
-            "success_rate": len(successful_answers) / len(rag_answers) if rag_answers else 0,
-            "test_duration_seconds": test_duration
+            "success_rate": success_count / total_count,
+            "test_duration_seconds": test_duration,
+            "inter_token_latency": self._calculate_inter_token_latency(db, in_test, first_attempt),
+            "errors": self._calculate_error_breakdown(db, in_test)
         }
         
-        return metrics
+        return total_count, success_count, metrics
+
+    def _calculate_error_breakdown(self, db: Session, *filters) -> Dict[str, Any]:
+        """
+        按错误分类统计最终失败的请求，以及重试后恢复的失败尝试
+        没有记录分类的失败（如前端执行上报的结果）计为unclassified
+        """
+        failed = RagAnswer.total_response_time.is_(None)
+        error_class = func.coalesce(RagAnswer.raw_response["error_class"].astext, "unclassified").label("error_class")
+        by_class = {
+            row.error_class: row.count
+            for row in db.query(error_class, func.count(RagAnswer.id).label("count"))
+            .filter(*filters, failed)
+            .group_by(error_class)
+        }
+
+        total_attempts, retried_count = db.query(
+            func.sum(func.coalesce(RagAnswer.attempts, 1)),
+            func.count(RagAnswer.id).filter(RagAnswer.attempts > 1)
+        ).filter(*filters).one()
+
+        # 只有重试过的成功记录需要展开，数量通常很少
+        recovered_by_class: Dict[str, int] = {}
+        for (attempt_errors,) in db.query(RagAnswer.attempt_errors).filter(*filters, ~failed, RagAnswer.attempts > 1):
+            for retried_class in attempt_errors or []:
+                recovered_by_class[retried_class] = recovered_by_class.get(retried_class, 0) + 1
+
+        return {
+            "by_class": by_class,
+            "recovered_by_class": recovered_by_class,
+            "retried_questions": retried_count,
+            "total_attempts": int(total_attempts or 0)
+        }
+
+    def _calculate_timeline(self, db: Session, test: PerformanceTest) -> Optional[Dict[str, Any]]:
+        """根据回答的完成时间和总耗时生成时间线，只读取这两列"""
+        try:
+            bucket_seconds = float((test.config or {}).get("timeline_bucket_seconds", DEFAULT_TIMELINE_BUCKET_SECONDS))
+        except (TypeError, ValueError):
+            bucket_seconds = DEFAULT_TIMELINE_BUCKET_SECONDS
+        if bucket_seconds <= 0:
+            bucket_seconds = DEFAULT_TIMELINE_BUCKET_SECONDS
+
+        completed_parts = []
+        latency_parts = []
+        result = db.execute(
+            select(RagAnswer.created_at, RagAnswer.total_response_time)
+            .where(RagAnswer.performance_test_id == test.id, RagAnswer.created_at.isnot(None))
+            .execution_options(yield_per=METRICS_CHUNK_SIZE)
+        )
+        for partition in result.partitions():
+            completed_parts.append(np.array([_epoch_seconds(row[0]) for row in partition], dtype=float))
+            latency_parts.append(np.array(
+                [np.nan if row[1] is None else float(row[1]) for row in partition], dtype=float
+            ))
+        if not completed_parts:
+            return None
+
+        completed_at = np.concatenate(completed_parts)
+        latencies = np.concatenate(latency_parts)
+        # 以测试开始时间和最早的请求发出时间中较早者为起点
+        origin = float(np.nanmin(completed_at - np.nan_to_num(latencies, nan=0.0)))
+        if test.started_at:
+            origin = min(origin, _epoch_seconds(test.started_at))
+        return build_timeline(completed_at, latencies, origin, bucket_seconds)
+
+    def _evaluate_verdict(self, test: PerformanceTest) -> Optional[Dict[str, Any]]:
+        """
+        按config.slo检查汇总指标，未配置SLO时返回None
+        adaptive模式的汇总指标混合了各探测窗口，改为检查满足SLO的最高并发探测窗口
+        """
+        spec = (test.config or {}).get("slo")
+        if not spec:
+            return None
+        try:
+            slo = parse_slo(spec)
+        except ValueError as e:
+            # 配置有误时按不通过处理，避免流水线误放行
+            return {"passed": False, "error": str(e), "checks": [], "violations": []}
+
+        metrics = test.summary_metrics or {}
+        adaptive = metrics.get("adaptive")
+        if adaptive and adaptive.get("probes"):
+            probes = adaptive["probes"]
+            best = [probe for probe in probes if probe["concurrency"] == adaptive.get("best_concurrency")]
+            probe = best[0] if best else min(probes, key=lambda item: item["concurrency"])
+            verdict = evaluate_slo(probe, slo)
+            verdict["evaluated_on"] = {"probe": probe["probe"], "concurrency": probe["concurrency"]}
+        else:
+            verdict = evaluate_slo(metrics, slo)
+            verdict["evaluated_on"] = "summary"
+        verdict["evaluated_at"] = datetime.utcnow().isoformat()
+        return verdict
+
+    def get_verdict(self, test: PerformanceTest) -> Optional[Dict[str, Any]]:
+        """
+        获取测试的SLO判定结果，未配置SLO时返回None
+        未完成的测试passed为None；完成时未保存判定（如后来才配置SLO）则按当前汇总指标即时计算
+        """
+        if not (test.config or {}).get("slo"):
+            return None
+
+        verdict = None
+        if test.status == "completed":
+            verdict = (test.summary_metrics or {}).get("verdict") or self._evaluate_verdict(test)
+        return {
+            "performance_test_id": str(test.id),
+            "status": test.status,
+            "passed": verdict["passed"] if verdict else None,
+            "slo": test.config["slo"],
+            **({k: v for k, v in verdict.items() if k != "passed"} if verdict else {})
+        }
+
+    def get_timeline(
+        self,
+        test: PerformanceTest,
+        resolution: Optional[float] = None,
+        max_points: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """按请求的分辨率(秒)或最大点数降采样时间线"""
+        if not test.timeline:
+            return None
+        timeline = test.timeline
+        bucket_count = len(timeline["completions"])
+        factor = 1
+        if resolution:
+            factor = max(factor, int(round(resolution / timeline["bucket_seconds"])))
+        if max_points:
+            factor = max(factor, int(np.ceil(bucket_count / max_points)))
+        return downsample_timeline(timeline, factor)
+
+    def compare_tests(
+        self,
+        db: Session,
+        test_a: PerformanceTest,
+        test_b: PerformanceTest,
+        *,
+        n_resamples: int = 10000,
+        confidence: float = 0.95,
+        regression_threshold: float = 0.0,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        对比两次性能测试，a为基线，b为待比较版本
+        只读取首次尝试即成功的回答的首token耗时和总耗时两列，逐分位数计算差值及置信区间
+        """
+        samples = {}
+        for key, test in (("a", test_a), ("b", test_b)):
+            first_response_times, total_response_times = _stream_numeric_columns(
+                db,
+                [RagAnswer.first_response_time, RagAnswer.total_response_time],
+                RagAnswer.performance_test_id == test.id,
+                RagAnswer.total_response_time.isnot(None),
+                or_(RagAnswer.attempts.is_(None), RagAnswer.attempts <= 1)
+            )
+            samples[key] = {
+                "first_token_time": first_response_times[~np.isnan(first_response_times)],
+                "total_time": total_response_times
+            }
+
+        options = {
+            "n_resamples": n_resamples,
+            "confidence": confidence,
+            "regression_threshold": regression_threshold,
+            "seed": seed
+        }
+        metrics = {
+            metric: compare_latency_samples(samples["a"][metric], samples["b"][metric], **options)
+            for metric in ("first_token_time", "total_time")
+        }
+
+        def requests_per_second(test: PerformanceTest) -> Optional[float]:
+            throughput = (test.summary_metrics or {}).get("throughput") or {}
+            return throughput.get("requests_per_second")
+
+        rps_a = requests_per_second(test_a)
+        rps_b = requests_per_second(test_b)
+        return {
+            "a": {"id": str(test_a.id), "name": test_a.name, "version": test_a.version, "status": test_a.status},
+            "b": {"id": str(test_b.id), "name": test_b.name, "version": test_b.version, "status": test_b.status},
+            "confidence": confidence,
+            "resamples": n_resamples,
+            "regression_threshold": regression_threshold,
+            "response_time": metrics,
+            "throughput": {
+                "a_requests_per_second": rps_a,
+                "b_requests_per_second": rps_b,
+                "ratio": rps_b / rps_a if rps_a and rps_b is not None else None
+            }
+        }
+
+    def _calculate_inter_token_latency(self, db: Session, *filters) -> Optional[Dict[str, Any]]:
+        """
+        汇总流式回答的分片间隔(ITL)分布和最长停顿，单位为秒
+        分片间隔为整数毫秒，逐块读取chunk_offsets累加计数直方图，不保留原始数据
+        """
+        counts = np.zeros(1, dtype=np.int64)
+        max_stall_ms = -1
+        max_stall_answer_id = None
+        result = db.execute(
+            select(RagAnswer.id, RagAnswer.chunk_offsets)
+            .where(RagAnswer.chunk_offsets.isnot(None), *filters)
+            .execution_options(yield_per=METRICS_CHUNK_SIZE)
+        )
+        for partition in result.partitions():
+            gaps_list = []
+            for answer_id, data in partition:
+                # 第一个值是首个分片的到达时间，其后才是分片间隔
+                gaps = np.frombuffer(data, dtype="<i4")[1:]
+                if gaps.size == 0:
+                    continue
+                gaps_list.append(gaps)
+                if gaps.max() > max_stall_ms:
+                    max_stall_ms = int(gaps.max())
+                    max_stall_answer_id = str(answer_id)
+            if not gaps_list:
+                continue
+            gaps = np.concatenate(gaps_list)
+            # 提交接口会拒绝乱序的到达时间，这里再跳过历史数据中可能存在的负间隔
+            partition_counts = np.bincount(gaps[gaps >= 0])
+            if len(partition_counts) > len(counts):
+                counts = np.pad(counts, (0, len(partition_counts) - len(counts)))
+            counts[:len(partition_counts)] += partition_counts
+
+        stats = percentiles_from_counts(counts)
+        if stats is None:
+            return None
+        for key in ("avg", "max", "min", *(f"p{level}" for level in PERCENTILE_LEVELS)):
+            stats[key] /= 1000
+        stats["max_stall_answer_id"] = max_stall_answer_id
+        return stats
     
     def get_performance_test_detail(
         self, db: Session, *, performance_test_id: str
@@ -274,6 +753,7 @@ class PerformanceService:
             test.completed_at = datetime.utcnow()
             db.commit()
             db.refresh(test)
+            live_metrics.finish(test_id)
         
         return test
 
@@ -289,6 +769,7 @@ class PerformanceService:
             test.success_questions = 0
             test.failed_questions = 0
             test.summary_metrics = {}
+            test.timeline = None
             test.started_at = None
             test.completed_at = None
             
@@ -0,0 +1,128 @@
+import math
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+# 对比两次测试时计算差值的分位数
+COMPARE_PERCENTILES = (50, 75, 90, 95, 99)
+
+
+def bootstrap_percentiles(
+    sorted_data: np.ndarray,
+    levels: Sequence[float],
+    n_resamples: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    分位数的自助法(bootstrap)抽样分布，返回形状为(len(levels), n_resamples)的数组
+
+    不真正生成n_resamples组重采样：从经验分布有放回抽取n个样本时，第r个顺序统计量
+    等价于F_n^{-1}(U_(r))，U_(r)~Beta(r, n-r+1)；给定U_(r)=u时，
+    U_(r+1)=u+(1-u)·Beta(1, n-r)。按np.percentile的线性插值取相邻两个顺序统计量，
+    结果与逐组重采样同分布，计算量只与重采样次数有关。
+    """
+    n = len(sorted_data)
+    result = np.empty((len(levels), n_resamples))
+    for row, level in enumerate(levels):
+        position = (n - 1) * level / 100
+        lower = int(math.floor(position))
+        fraction = position - lower
+        r = lower + 1
+        u_lower = rng.beta(r, n - r + 1, n_resamples)
+        lower_values = sorted_data[np.minimum((u_lower * n).astype(np.int64), n - 1)]
+        if fraction == 0 or r >= n:
+            result[row] = lower_values
+            continue
+        u_upper = u_lower + (1 - u_lower) * rng.beta(1, n - r, n_resamples)
+        upper_values = sorted_data[np.minimum((u_upper * n).astype(np.int64), n - 1)]
+        result[row] = lower_values + fraction * (upper_values - lower_values)
+    return result
+
+
+def mann_whitney_u(a: np.ndarray, b: np.ndarray) -> Dict[str, Any]:
+    """
+    双侧Mann-Whitney U检验（正态近似，含并列秩校正和连续性校正）
+
+    probability_b_greater为从b中随机取一个值大于从a中随机取一个值的概率（并列计一半）
+    """
+    n1, n2 = len(a), len(b)
+    combined = np.concatenate([a, b])
+    _, inverse, counts = np.unique(combined, return_inverse=True, return_counts=True)
+    # 并列值取平均秩
+    average_ranks = np.cumsum(counts) - (counts - 1) / 2
+    ranks = average_ranks[inverse]
+    u_a = float(ranks[:n1].sum() - n1 * (n1 + 1) / 2)
+    u_b = n1 * n2 - u_a
+
+    n = n1 + n2
+    tie_term = float(np.sum(counts.astype(float) ** 3 - counts)) / (n * (n - 1)) if n > 1 else 0.0
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        z, p_value = 0.0, 1.0
+    else:
+        diff = u_b - n1 * n2 / 2
+        z = (diff - math.copysign(0.5, diff)) / sigma if diff != 0 else 0.0
+        p_value = min(1.0, math.erfc(abs(z) / math.sqrt(2)))
+
+    return {
+        "u_statistic": u_b,
+        "z_score": z,
+        "p_value": p_value,
+        "probability_b_greater": u_b / (n1 * n2)
+    }
+
+
+def compare_latency_samples(
+    a: np.ndarray,
+    b: np.ndarray,
+    *,
+    n_resamples: int = 10000,
+    confidence: float = 0.95,
+    regression_threshold: float = 0.0,
+    seed: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    对比两组延迟样本(a为基线，b为新版本)
+
+    返回各分位数的差值、相对变化及其自助法置信区间和Mann-Whitney U检验结果；
+    相对变化的置信下限高于regression_threshold时判定为退化，上限低于-regression_threshold时判定为改善
+    """
+    if len(a) == 0 or len(b) == 0:
+        return None
+    rng = np.random.default_rng(seed)
+    sorted_a = np.sort(a)
+    sorted_b = np.sort(b)
+    boot_a = bootstrap_percentiles(sorted_a, COMPARE_PERCENTILES, n_resamples, rng)
+    boot_b = bootstrap_percentiles(sorted_b, COMPARE_PERCENTILES, n_resamples, rng)
+    alpha = (1 - confidence) / 2
+
+    percentiles = {}
+    for row, level in enumerate(COMPARE_PERCENTILES):
+        value_a = float(np.percentile(sorted_a, level))
+        value_b = float(np.percentile(sorted_b, level))
+        deltas = boot_b[row] - boot_a[row]
+        delta_low, delta_high = np.quantile(deltas, [alpha, 1 - alpha])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relative = boot_b[row] / boot_a[row] - 1
+        relative = relative[np.isfinite(relative)]
+        relative_ci = None
+        if relative.size:
+            relative_low, relative_high = np.quantile(relative, [alpha, 1 - alpha])
+            relative_ci = [float(relative_low), float(relative_high)]
+
+        percentiles[f"p{level}"] = {
+            "a": value_a,
+            "b": value_b,
+            "delta": value_b - value_a,
+            "delta_ci": [float(delta_low), float(delta_high)],
+            "relative_delta": value_b / value_a - 1 if value_a > 0 else None,
+            "relative_delta_ci": relative_ci,
+            "regressed": relative_ci is not None and relative_ci[0] > regression_threshold,
+            "improved": relative_ci is not None and relative_ci[1] < -regression_threshold
+        }
+
+    return {
+        "samples": {"a": int(len(a)), "b": int(len(b))},
+        "percentiles": percentiles,
+        "mann_whitney": mann_whitney_u(sorted_a, sorted_b)
+    }
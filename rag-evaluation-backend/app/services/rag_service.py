@@ -1,16 +1,334 @@
 import asyncio
+import codecs
+import copy
 import httpx
+import random
 import time
 import json
 import uuid
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
+
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from app.core.http_client import http_client_registry
 from app.models.rag_answer import RagAnswer, ApiConfig
+from app.models.performance import PerformanceTest
 from app.models.question import Question
-from app.schemas.rag_answer import RagAnswerCreate, ApiRequestConfig
+from app.schemas.rag_answer import RagAnswerCreate, ApiRequestConfig, PerformanceAnswerItem
+from app.services.live_metrics import live_metrics
+from app.services.result_writer import ResultWriter, build_answer_row, insert_rag_answer_rows
+
+# 请求失败的错误分类
+ERROR_TIMEOUT = "timeout"            # 请求超时
+ERROR_CONNECT = "connect"            # 连接失败或连接中断
+ERROR_RATE_LIMITED = "rate_limited"  # HTTP 429
+ERROR_CLIENT = "http_4xx"            # 其他非200且非5xx的状态码
+ERROR_SERVER = "http_5xx"            # 服务端错误
+ERROR_PARSE = "parse"                # 响应无法解析
+ERROR_EMPTY_ANSWER = "empty_answer"  # 响应中未提取到回答
+ERROR_OTHER = "other"
+# 可能是暂时性故障、值得重试的错误分类
+RETRYABLE_ERROR_CLASSES = frozenset({ERROR_TIMEOUT, ERROR_CONNECT, ERROR_RATE_LIMITED, ERROR_SERVER})
+# 重试退避的基础时长和上限（秒）
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+def build_rag_request(question_text: str, api_config: ApiRequestConfig) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    根据API配置构建RAG请求
+    返回: (headers, request_data)
+    """
+    # 深拷贝模板，避免并发请求之间互相修改同一份模板
+    request_data = copy.deepcopy(api_config.request_template)
+
+    # 递归查找并替换所有{{question}}占位符
+    def replace_question_placeholder(obj):
+        if isinstance(obj, dict):
+            return {key: replace_question_placeholder(value) for key, value in obj.items()}
+        elif isinstance(obj, list):
+            return [replace_question_placeholder(item) for item in obj]
+        elif isinstance(obj, str) and "{{question}}" in obj:
+            return obj.replace("{{question}}", question_text)
+        return obj
+
+    request_data = replace_question_placeholder(request_data)
+
+    # 准备请求头
+    headers = {
+        "Content-Type": "application/json"
+    }
+    if api_config.api_key:
+        headers["Authorization"] = f"Bearer {api_config.api_key}"
+
+    if api_config.headers:
+        headers.update(api_config.headers)
+
+    return headers, request_data
+
+
+def extract_answer_from_response(response_json: Dict[str, Any], path: str) -> Optional[str]:
+    """从响应JSON中提取回答文本"""
+    try:
+        parts = path.split('.')
+        current = response_json
+
+        for part in parts:
+            if part in current:
+                current = current[part]
+            else:
+                return None
+
+        # 确保结果是字符串
+        if isinstance(current, str):
+            return current
+        else:
+            return str(current)
+    except Exception:
+        return None
+
+
+def _extract_stream_chunk(event_data: Any, api_config: ApiRequestConfig) -> Optional[str]:
+    """从单个SSE事件中提取内容片段，按stream_event_field/stream_event_value筛选事件"""
+    if not isinstance(event_data, dict):
+        return None
+    if api_config.stream_event_field and api_config.stream_event_value:
+        if event_data.get(api_config.stream_event_field) != api_config.stream_event_value:
+            return None
+    return extract_answer_from_response(event_data, api_config.response_path)
+
+
+def encode_chunk_offsets(chunk_times: List[float]) -> Optional[bytes]:
+    """
+    把各内容分片相对请求开始的到达时间(秒)编码为紧凑的二进制
+
+    先取整到毫秒，再做差分：第一个值为首个分片的到达时间，其余为相邻分片的间隔，
+    以小端int32存储，每个分片4字节
+    """
+    if not chunk_times:
+        return None
+    offsets_ms = np.rint(np.asarray(chunk_times, dtype=float) * 1000).astype(np.int64)
+    return np.diff(offsets_ms, prepend=0).astype("<i4").tobytes()
+
+
+def valid_chunk_offsets(chunk_times: Optional[List[float]]) -> bool:
+    """存储时按相邻分片做差分，到达时间必须是有限、非负且不递减的，否则会得到负的分片间隔"""
+    if not chunk_times:
+        return True
+    offsets = np.asarray(chunk_times, dtype=float)
+    return bool(np.all(np.isfinite(offsets)) and offsets[0] >= 0 and np.all(np.diff(offsets) >= 0))
+
+
+def decode_chunk_offsets(data: Optional[bytes]) -> Optional[np.ndarray]:
+    """解码为各分片相对请求开始的到达时间(毫秒)"""
+    if not data:
+        return None
+    return np.cumsum(np.frombuffer(data, dtype="<i4"))
+
+
+async def request_rag_answer(
+    client: httpx.AsyncClient,
+    question_text: str,
+    api_config: ApiRequestConfig
+) -> Dict[str, Any]:
+    """
+    以流式方式向RAG API发送单个问题并测量耗时，不写数据库
+
+    SSE响应逐个事件解析内容片段；普通JSON响应在读完响应体后解析。
+    返回字典: success, answer, error, error_class(错误分类，见ERROR_*), status_code,
+    first_byte_time(首字节), first_response_time(首个内容token),
+    total_response_time, generation_time(首个内容token到结束), character_count,
+    characters_per_second(仅按生成耗时计算), raw_response，时间单位均为秒；
+    chunk_offsets为流式响应各内容分片到达时间的编码（见encode_chunk_offsets）；
+    retry_after为429/503响应中Retry-After头给出的秒数
+    """
+    headers, request_data = build_rag_request(question_text, api_config)
+    result = {
+        "success": False,
+        "answer": None,
+        "error": None,
+        "error_class": None,
+        "status_code": None,
+        "retry_after": None,
+        "first_byte_time": None,
+        "first_response_time": None,
+        "total_response_time": None,
+        "generation_time": None,
+        "character_count": None,
+        "characters_per_second": None,
+        "raw_response": None,
+        "chunk_offsets": None,
+    }
+
+    start_time = time.perf_counter()
+    try:
+        async with client.stream(
+            "POST",
+            api_config.endpoint_url,
+            headers=headers,
+            json=request_data,
+            timeout=api_config.timeout
+        ) as response:
+            result["status_code"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                result["error"] = f"API请求失败: {response.status_code} - {response.text}"
+                if response.status_code == 429:
+                    result["error_class"] = ERROR_RATE_LIMITED
+                elif response.status_code >= 500:
+                    result["error_class"] = ERROR_SERVER
+                else:
+                    result["error_class"] = ERROR_CLIENT
+                try:
+                    result["retry_after"] = float(response.headers["retry-after"])
+                except (KeyError, ValueError):
+                    pass
+                return result
+
+            is_stream = "text/event-stream" in response.headers.get("content-type", "")
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            buffer = ""
+            body_chunks: List[str] = []
+            answer_chunks: List[str] = []
+            chunk_times: List[float] = []
+            event_count = 0
+
+            async for raw_chunk in response.aiter_bytes():
+                if not raw_chunk:
+                    continue
+                if result["first_byte_time"] is None:
+                    result["first_byte_time"] = time.perf_counter() - start_time
+
+                text = decoder.decode(raw_chunk)
+                if not is_stream:
+                    body_chunks.append(text)
+                    continue
+
+                buffer += text
+                lines = buffer.split("\n")
+                buffer = lines.pop()
+                for line in lines:
+                    line = line.strip()
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if not payload or payload == "[DONE]":
+                        continue
+                    try:
+                        event_data = json.loads(payload)
+                    except json.JSONDecodeError:
+                        continue
+                    event_count += 1
+                    chunk_text = _extract_stream_chunk(event_data, api_config)
+                    if chunk_text:
+                        chunk_times.append(time.perf_counter() - start_time)
+                        if result["first_response_time"] is None:
+                            result["first_response_time"] = chunk_times[0]
+                        answer_chunks.append(chunk_text)
+
+        total_response_time = time.perf_counter() - start_time
+
+        if is_stream:
+            answer_text = "".join(answer_chunks)
+            if not answer_text:
+                result["error"] = f"流式响应中未提取到回答，路径: {api_config.response_path}"
+                result["error_class"] = ERROR_EMPTY_ANSWER
+                return result
+            raw_response = {"stream": True, "event_count": event_count}
+            result["chunk_offsets"] = encode_chunk_offsets(chunk_times)
+        else:
+            try:
+                raw_response = json.loads("".join(body_chunks) + decoder.decode(b"", final=True))
+            except json.JSONDecodeError:
+                result["error"] = "无法解析API响应JSON"
+                result["error_class"] = ERROR_PARSE
+                return result
+            answer_text = extract_answer_from_response(raw_response, api_config.response_path)
+            if not answer_text:
+                result["error"] = f"无法从响应中提取回答，路径: {api_config.response_path}"
+                result["error_class"] = ERROR_EMPTY_ANSWER
+                return result
+            # 非流式响应在响应体读完时才拿到内容
+            result["first_response_time"] = total_response_time
+
+        generation_time = total_response_time - result["first_response_time"]
+        character_count = len(answer_text)
+        result.update({
+            "success": True,
+            "answer": answer_text,
+            "total_response_time": total_response_time,
+            "generation_time": generation_time,
+            "character_count": character_count,
+            "characters_per_second": character_count / generation_time if generation_time > 0 else None,
+            "raw_response": raw_response,
+        })
+        return result
+
+    except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+        result["error"] = f"无法连接API: {str(e)}"
+        result["error_class"] = ERROR_CONNECT
+        return result
+    except httpx.TimeoutException:
+        result["error"] = "API请求超时"
+        result["error_class"] = ERROR_TIMEOUT
+        return result
+    except httpx.TransportError as e:
+        result["error"] = f"API连接中断: {str(e)}"
+        result["error_class"] = ERROR_CONNECT
+        return result
+    except Exception as e:
+        result["error"] = f"收集回答时出错: {str(e)}"
+        result["error_class"] = ERROR_OTHER
+        return result
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    第attempt次失败后的等待时长：指数退避上限内均匀随机（full jitter），
+    避免大量并发请求在同一时刻重试；服务端给出Retry-After时至少等待该时长
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+async def request_rag_answer_with_retry(
+    client: httpx.AsyncClient,
+    question_text: str,
+    api_config: ApiRequestConfig,
+    max_attempts: int = 1,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict[str, Any]:
+    """
+    发送单个问题，可重试的错误分类按退避重试，最多尝试max_attempts次
+
+    返回最后一次尝试的结果，另加 attempts(尝试次数) 和 attempt_errors(各失败尝试的错误分类)；
+    时间字段只反映最后一次尝试，不包含退避等待。
+    传入semaphore时每次尝试单独占用并发名额，退避等待期间不占用
+    """
+    attempt_errors: List[str] = []
+    attempt = 0
+    while True:
+        attempt += 1
+        if semaphore is None:
+            result = await request_rag_answer(client, question_text, api_config)
+        else:
+            async with semaphore:
+                result = await request_rag_answer(client, question_text, api_config)
+        if result["success"]:
+            break
+        attempt_errors.append(result["error_class"])
+        if attempt >= max_attempts or result["error_class"] not in RETRYABLE_ERROR_CLASSES:
+            break
+        await asyncio.sleep(retry_delay(attempt, result["retry_after"]))
+    result["attempts"] = attempt
+    result["attempt_errors"] = attempt_errors
+    return result
+
 
 class RagService:
     """RAG系统回答收集服务"""
@@ -23,111 +341,45 @@ class RagService:
         question: Question,
         api_config: ApiRequestConfig,
         source_system: str = "RAG系统",
-        collect_performance: bool = True
+        collect_performance: bool = True,
+        client: Optional[httpx.AsyncClient] = None
     ) -> Tuple[Optional[RagAnswer], Optional[str]]:
         """
         从RAG API收集单个问题的回答
         返回: (rag_answer, error_message)
         """
-        # 替换模板中的问题占位符
-        request_data = api_config.request_template.copy()
-        
-        # 递归查找并替换所有{{question}}占位符
-        def replace_question_placeholder(obj, question_text):
-            if isinstance(obj, dict):
-                for key, value in obj.items():
-                    if isinstance(value, (dict, list)):
-                        obj[key] = replace_question_placeholder(value, question_text)
-                    elif isinstance(value, str) and "{{question}}" in value:
-                        obj[key] = value.replace("{{question}}", question_text)
-                return obj
-            elif isinstance(obj, list):
-                return [replace_question_placeholder(item, question_text) for item in obj]
-            return obj
-            
-        request_data = replace_question_placeholder(request_data, question.question_text)
-        
-        # 准备请求头
-        headers = {
-            "Content-Type": "application/json"
-        }
-        if api_config.api_key:
-            headers["Authorization"] = f"Bearer {api_config.api_key}"
-        
-        if api_config.headers:
-            headers.update(api_config.headers)
-        
-        # 性能测量数据
-        start_time = time.time()
-        first_response_time = None
-        
+        if client is None:
+            client = http_client_registry.get_client(api_config.endpoint_url)
+
+        result = await request_rag_answer(client, question.question_text, api_config)
+        if not result["success"]:
+            return None, result["error"]
+
+        # 保存到数据库
+        db_obj = RagAnswer(
+            question_id=question.id,
+            answer=result["answer"],
+            collection_method="api",
+            character_count=result["character_count"],
+            raw_response=result["raw_response"]
+        )
+        if collect_performance:
+            db_obj.first_byte_time = result["first_byte_time"]
+            db_obj.first_response_time = result["first_response_time"]
+            db_obj.total_response_time = result["total_response_time"]
+            db_obj.generation_time = result["generation_time"]
+            db_obj.characters_per_second = result["characters_per_second"]
+            db_obj.chunk_offsets = result["chunk_offsets"]
+
         try:
-            async with httpx.AsyncClient(timeout=api_config.timeout) as client:
-                # 发送请求
-                response = await client.post(
-                    api_config.endpoint_url,
-                    headers=headers,
-                    json=request_data
-                )
-                
-                # 记录首次响应时间
-                first_response_time = int((time.time() - start_time) * 1000)  # 毫秒
-                
-                if response.status_code != 200:
-                    return None, f"API请求失败: {response.status_code} - {response.text}"
-                
-                # 解析响应
-                try:
-                    response_json = response.json()
-                except json.JSONDecodeError:
-                    return None, "无法解析API响应JSON"
-                
-                # 从响应中提取回答
-                answer_text = self._extract_answer_from_response(response_json, api_config.response_path)
-                if not answer_text:
-                    return None, f"无法从响应中提取回答，路径: {api_config.response_path}"
-                
-                # 计算性能指标
-                total_response_time = int((time.time() - start_time) * 1000)  # 毫秒
-                character_count = len(answer_text)
-                characters_per_second = character_count / (total_response_time / 1000) if total_response_time > 0 else 0
-                
-                # 创建RagAnswer对象
-                rag_answer_data = RagAnswerCreate(
-                    question_id=str(question.id),
-                    answer_text=answer_text,
-                    collection_method="api",
-                    source_system=source_system,
-                    first_response_time=first_response_time,
-                    total_response_time=total_response_time,
-                    character_count=character_count,
-                    raw_response=response_json,
-                    api_config_id=None  # 此处可以保存ApiConfig的ID，如果有的话
-                )
-                
-                # 保存到数据库
-                db_obj = RagAnswer(
-                    question_id=question.id,
-                    answer_text=answer_text,
-                    collection_method="api",
-                    source_system=source_system,
-                    first_response_time=first_response_time,
-                    total_response_time=total_response_time,
-                    character_count=character_count,
-                    characters_per_second=characters_per_second,
-                    raw_response=response_json,
-                    answer_metadata=None  # 更改字段名
-                )
-                self.db.add(db_obj)
-                self.db.commit()
-                self.db.refresh(db_obj)
-                
-                return db_obj, None
-                
-        except httpx.TimeoutException:
-            return None, "API请求超时"
+            self.db.add(db_obj)
+            self.db.commit()
+            self.db.refresh(db_obj)
         except Exception as e:
-            return None, f"收集回答时出错: {str(e)}"
+            self.db.rollback()
+            return None, f"保存回答时出错: {str(e)}"
+
+        return db_obj, None
     
     async def collect_answers_batch(
         self,
@@ -138,7 +390,10 @@ class RagService:
         source_system: str = "RAG系统",
         collect_performance: bool = True
     ) -> Dict[str, Any]:
-        """批量收集多个问题的回答"""
+        """
+        批量收集多个问题的回答
+        超时、连接失败、429和5xx错误最多重试到max_attempts次，结果中按错误分类统计最终失败和重试后恢复的错误
+        """
         # 获取问题列表
         questions = self.db.query(Question).filter(Question.id.in_(question_ids)).all()
         if not questions:
@@ -148,42 +403,61 @@ class RagService:
                 "results": []
             }
         
-        # 创建任务列表
-        tasks = []
-        for question in questions:
-            tasks.append(self.collect_answer_api(question, api_config, source_system, collect_performance))
-        
-        # 使用信号量控制并发数
+        # 使用信号量控制并发数，共享连接池的大小按并发数确定
         semaphore = asyncio.Semaphore(concurrent_requests)
         
-        async def bounded_collect(task):
-            async with semaphore:
-                return await task
-        
-        # 执行任务
-        bounded_tasks = [bounded_collect(task) for task in tasks]
-        results = await asyncio.gather(*bounded_tasks)
+        # 结果交给后写缓冲区批量落库，数据库延迟不影响其他在途请求的计时
+        async with http_client_registry.lease(api_config.endpoint_url, concurrent_requests) as client, \
+                ResultWriter() as writer:
+            async def bounded_collect(question):
+                result = await request_rag_answer_with_retry(
+                    client, question.question_text, api_config, max_attempts, semaphore=semaphore
+                )
+                if not result["success"]:
+                    return None, result
+                row = build_answer_row(question.id, result, collect_performance=collect_performance)
+                writer.put(row)
+                return row["id"], result
+            
+            # 执行任务
+            results = await asyncio.gather(*(bounded_collect(question) for question in questions))
         
         # 处理结果
         success_count = 0
         failed_count = 0
         success_results = []
         error_results = []
+        error_classes: Dict[str, int] = {}
+        recovered_error_classes: Dict[str, int] = {}
+        total_attempts = 0
         
-        for (answer, error), question in zip(results, questions):
-            if answer:
+        for (answer_id, result), question in zip(results, questions):
+            total_attempts += result["attempts"]
+            error = result["error"]
+            error_class = result["error_class"]
+            if answer_id and answer_id not in writer.inserted_ids:
+                error = writer.errors.get(answer_id, "保存回答时出错")
+                error_class = "save"
+                answer_id = None
+            if answer_id:
                 success_count += 1
+                for retried_class in result["attempt_errors"]:
+                    recovered_error_classes[retried_class] = recovered_error_classes.get(retried_class, 0) + 1
                 success_results.append({
                     "question_id": str(question.id),
-                    "answer_id": str(answer.id),
-                    "success": True
+                    "answer_id": answer_id,
+                    "success": True,
+                    "attempts": result["attempts"]
                 })
             else:
                 failed_count += 1
+                error_classes[error_class] = error_classes.get(error_class, 0) + 1
                 error_results.append({
                     "question_id": str(question.id),
                     "success": False,
-                    "error": error
+                    "error": error,
+                    "error_class": error_class,
+                    "attempts": result["attempts"]
                 })
         
         return {
@@ -191,6 +465,10 @@ class RagService:
             "total": len(questions),
             "success_count": success_count,
             "failed_count": failed_count,
+            "total_attempts": total_attempts,
+            "retried_count": sum(1 for _, result in results if result["attempts"] > 1),
+            "error_classes": error_classes,
+            "recovered_error_classes": recovered_error_classes,
             "results": success_results + error_results
         }
     
@@ -266,25 +544,171 @@ class RagService:
             "results": results
         }
     
+    @staticmethod
+    def _answer_completed_at(
+        item: PerformanceAnswerItem,
+        performance_test: PerformanceTest,
+        now: datetime
+    ) -> datetime:
+        """
+        回答记录的创建时间取客户端上报的完成时间，使时间线和在途请求数按请求实际完成的时刻统计；
+        未上报时退回到写入时间。客户端时钟偏差导致的时间限制在测试开始时间和写入时间之间
+        """
+        completed_at = item.completed_at
+        if completed_at is None:
+            return now
+        if completed_at.tzinfo is not None:
+            completed_at = completed_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if performance_test.started_at and completed_at < performance_test.started_at:
+            completed_at = performance_test.started_at
+        return min(completed_at, now)
+
+    def bulk_create_performance_answers(
+        self,
+        performance_test: PerformanceTest,
+        items: List[PerformanceAnswerItem]
+    ) -> Dict[str, Any]:
+        """
+        批量写入性能测试结果
+        问题ID用一次集合查询校验，有效记录用一条多行INSERT写入，
+        分片到达时间不合法的记录单独标记，与已有(question_id, version)冲突的记录跳过并标记为重复
+        """
+        results: List[Dict[str, Any]] = [None] * len(items)
+
+        # 格式不合法的ID直接判为无效，避免整条查询报错
+        normalized_ids = []
+        for item in items:
+            try:
+                normalized_ids.append(str(uuid.UUID(item.question_id)))
+            except ValueError:
+                normalized_ids.append(None)
+        candidate_ids = {question_id for question_id in normalized_ids if question_id}
+
+        valid_ids = set()
+        if candidate_ids:
+            valid_ids = {
+                str(uuid.UUID(str(row[0]))) for row in self.db.query(Question.id).filter(
+                    Question.id.in_(candidate_ids),
+                    Question.dataset_id == performance_test.dataset_id
+                )
+            }
+
+        rows = []
+        row_indexes = []
+        seen_keys = set()
+        now = datetime.utcnow()
+        for index, (item, question_id) in enumerate(zip(items, normalized_ids)):
+            if question_id not in valid_ids:
+                results[index] = {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "success": False,
+                    "status": "invalid_question",
+                    "error": "问题不存在或不属于该测试的数据集"
+                }
+                continue
+
+            if item.success and not valid_chunk_offsets(item.chunk_offsets):
+                results[index] = {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "success": False,
+                    "status": "invalid_chunk_offsets",
+                    "error": "chunk_offsets必须是非负且不递减的到达时间"
+                }
+                continue
+
+            version = item.version or performance_test.version
+            key = (question_id, version)
+            if version is not None and key in seen_keys:
+                results[index] = {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "success": False,
+                    "status": "duplicate",
+                    "error": f"该问题的 {version} 版本回答已存在"
+                }
+                continue
+            seen_keys.add(key)
+
+            row = {
+                "id": str(uuid.uuid4()),
+                "question_id": question_id,
+                "performance_test_id": str(performance_test.id),
+                "collection_method": "api",
+                "version": version,
+                "sequence_number": item.sequence_number,
+                "attempts": item.attempts,
+                "attempt_errors": item.attempt_errors or None,
+                "created_at": self._answer_completed_at(item, performance_test, now),
+            }
+            if item.success:
+                row.update({
+                    "answer": item.answer or "",
+                    "first_response_time": item.first_response_time,
+                    "total_response_time": item.total_response_time,
+                    "first_byte_time": item.first_byte_time,
+                    "generation_time": item.generation_time,
+                    "character_count": item.character_count,
+                    "characters_per_second": item.characters_per_second,
+                    "raw_response": item.raw_response,
+                    "chunk_offsets": encode_chunk_offsets(item.chunk_offsets),
+                })
+            else:
+                # 失败记录与服务端执行引擎保持一致：空回答、无响应时间、错误写入raw_response
+                row.update({
+                    "answer": "",
+                    "first_response_time": None,
+                    "total_response_time": None,
+                    "first_byte_time": None,
+                    "generation_time": None,
+                    "character_count": None,
+                    "characters_per_second": None,
+                    "raw_response": {"error": item.error_details or "请求失败"},
+                    "chunk_offsets": None,
+                })
+            rows.append(row)
+            row_indexes.append(index)
+
+        inserted_ids = set()
+        if rows:
+            inserted_ids = insert_rag_answer_rows(self.db, rows)
+            self.db.commit()
+
+        live = live_metrics.get_or_create(performance_test.id) if inserted_ids else None
+        for row, index in zip(rows, row_indexes):
+            item = items[index]
+            if row["id"] in inserted_ids:
+                live.record(item.success, row["first_response_time"], row["total_response_time"])
+                results[index] = {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "answer_id": row["id"],
+                    "success": True,
+                    "status": "created"
+                }
+            else:
+                results[index] = {
+                    "index": index,
+                    "question_id": item.question_id,
+                    "success": False,
+                    "status": "duplicate",
+                    "error": f"该问题的 {row['version']} 版本回答已存在"
+                }
+
+        success_count = len(inserted_ids)
+        return {
+            "success": True,
+            "performance_test_id": str(performance_test.id),
+            "total": len(items),
+            "success_count": success_count,
+            "failed_count": len(items) - success_count,
+            "results": results
+        }
+    
     def _extract_answer_from_response(self, response_json: Dict[str, Any], path: str) -> Optional[str]:
         """从响应JSON中提取回答文本"""
-        try:
-            parts = path.split('.')
-            current = response_json
-            
-            for part in parts:
-                if part in current:
-                    current = current[part]
-                else:
-                    return None
-            
-            # 确保结果是字符串
-            if isinstance(current, str):
-                return current
-            else:
-                return str(current)
-        except Exception:
-            return None
+        return extract_answer_from_response(response_json, path)
     
     def get_rag_answer(self, answer_id: str) -> Optional[RagAnswer]:
         """获取单个RAG回答"""
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.db.base import SessionLocal, dialect_insert
+from app.models.rag_answer import RagAnswer
+
+logger = logging.getLogger(__name__)
+
+
+def build_answer_row(
+    question_id: str,
+    result: Dict[str, Any],
+    *,
+    version: Optional[str] = None,
+    performance_test_id: Optional[str] = None,
+    sequence_number: Optional[int] = None,
+    collect_performance: bool = True
+) -> Dict[str, Any]:
+    """
+    把request_rag_answer的结果转换为rag_answers表的一行数据
+
+    失败的请求也会生成记录：空回答、total_response_time为空、错误及其分类写入raw_response；
+    经过重试的结果记录尝试次数和各失败尝试的错误分类
+    """
+    row = {
+        "id": str(uuid.uuid4()),
+        "question_id": str(question_id),
+        "answer": result["answer"] or "",
+        "collection_method": "api",
+        "version": version,
+        "performance_test_id": str(performance_test_id) if performance_test_id else None,
+        "sequence_number": sequence_number,
+        "character_count": result["character_count"],
+        "raw_response": result["raw_response"] if result["success"] else {
+            "error": result["error"],
+            "error_class": result.get("error_class")
+        },
+        "first_byte_time": None,
+        "first_response_time": None,
+        "total_response_time": None,
+        "generation_time": None,
+        "characters_per_second": None,
+        "chunk_offsets": None,
+        "attempts": result.get("attempts", 1),
+        "attempt_errors": result.get("attempt_errors") or None,
+        "created_at": datetime.utcnow(),
+    }
+    if collect_performance:
+        row.update({
+            "first_byte_time": result["first_byte_time"],
+            "first_response_time": result["first_response_time"],
+            "total_response_time": result["total_response_time"],
+            "generation_time": result["generation_time"],
+            "characters_per_second": result["characters_per_second"],
+            "chunk_offsets": result.get("chunk_offsets"),
+        })
+    return row
+
+
+def insert_rag_answer_rows(db: Session, rows: List[Dict[str, Any]]) -> Set[str]:
+    """
+    用一条多行INSERT写入回答，与已有(question_id, version)冲突的行跳过
+    返回实际写入的回答ID集合，不提交事务
+    """
+    if not rows:
+        return set()
+    stmt = dialect_insert(db, RagAnswer).values(rows).on_conflict_do_nothing().returning(RagAnswer.id)
+    # SQLite返回的是不带连字符的UUID字符串，统一成与行ID相同的格式
+    return {str(uuid.UUID(str(row[0]))) for row in db.execute(stmt)}
+
+
+class ResultWriter:
+    """
+    回答结果的后写缓冲区
+
+    测量协程只把结果放入asyncio队列，由单个写入协程按批次在线程池中写库，
+    数据库延迟不会阻塞事件循环，也不会计入其他在途请求的耗时。
+    on_flush在写入线程中、与本批写入同一事务内调用，可用于同步测试进度。
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        on_flush: Optional[Callable[[Session, List[Dict[str, Any]], Set[str]], None]] = None
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.inserted_ids: Set[str] = set()
+        self.errors: Dict[str, str] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "ResultWriter":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        # 被取消时也要把已测量的结果写完
+        await self.close()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """加入待写入队列，不等待写库"""
+        self._queue.put_nowait(row)
+
+    async def close(self) -> None:
+        """写完队列中剩余的结果后停止写入协程"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await asyncio.shield(self._task)
+        self._task = None
+
+    async def _run(self) -> None:
+        closed = False
+        while not closed:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    closed = True
+                    break
+                batch.append(row)
+            await asyncio.to_thread(self._flush, batch)
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            inserted = insert_rag_answer_rows(db, rows)
+            if self.on_flush:
+                self.on_flush(db, rows, inserted)
+            db.commit()
+            self.inserted_ids.update(inserted)
+            for row in rows:
+                if row["id"] not in inserted:
+                    self.errors[row["id"]] = f"该问题的 {row['version']} 版本回答已存在"
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"批量写入 {len(rows)} 条回答失败")
+            for row in rows:
+                self.errors[row["id"]] = f"保存回答时出错: {str(e)}"
+        finally:
+            db.close()
@@ -0,0 +1,75 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# 可设置阈值的分位数
+SLO_PERCENTILES = (50, 75, 90, 95, 99)
+# 延迟阈值的键，如 first_token_time_p95、total_time_p99，单位为秒
+_LATENCY_KEY = re.compile(r"^(first_token_time|total_time)_p(\d+)$")
+
+
+def parse_slo(spec: Any) -> Dict[str, float]:
+    """
+    解析SLO阈值配置
+
+    支持的键：
+    - first_token_time_p{50,75,90,95,99} / total_time_p{...}: 对应分位数的延迟上限(秒)
+    - max_error_rate: 错误率上限(0~1)
+    - min_rps: 每秒成功请求数下限
+    """
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("SLO需要设置为非空对象，如 {\"first_token_time_p95\": 2, \"max_error_rate\": 0.01}")
+
+    slo = {}
+    for key, value in spec.items():
+        match = _LATENCY_KEY.match(key)
+        if match and int(match.group(2)) not in SLO_PERCENTILES:
+            raise ValueError(f"SLO {key} 的分位数只能是 {', '.join(map(str, SLO_PERCENTILES))}")
+        if not match and key not in ("max_error_rate", "min_rps"):
+            raise ValueError(f"不支持的SLO指标: {key}")
+        try:
+            threshold = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"SLO {key} 必须是数字")
+        if threshold < 0:
+            raise ValueError(f"SLO {key} 不能为负数")
+        slo[key] = threshold
+    return slo
+
+
+def _actual_value(metrics: Dict[str, Any], key: str) -> Optional[float]:
+    """从汇总指标中取出SLO对应的实际值"""
+    match = _LATENCY_KEY.match(key)
+    if match:
+        stats = (metrics.get("response_time") or {}).get(match.group(1))
+        return stats.get(f"p{match.group(2)}") if stats else None
+    if key == "min_rps":
+        return (metrics.get("throughput") or {}).get("requests_per_second")
+    # 汇总指标中只有成功率时按1-成功率计算错误率
+    if metrics.get("error_rate") is not None:
+        return metrics["error_rate"]
+    if metrics.get("success_rate") is not None:
+        # 消除浮点误差，避免恰好等于阈值时误判
+        return round(1 - metrics["success_rate"], 12)
+    return None
+
+
+def evaluate_slo(metrics: Dict[str, Any], slo: Dict[str, float]) -> Dict[str, Any]:
+    """
+    按SLO检查汇总指标，指标结构与summary_metrics一致
+    缺少数据的指标（如全部请求失败时的延迟）判为不通过
+    """
+    checks: List[Dict[str, Any]] = []
+    for key, threshold in slo.items():
+        actual = _actual_value(metrics, key)
+        if actual is None:
+            passed = False
+        elif key == "min_rps":
+            passed = actual >= threshold
+        else:
+            passed = actual <= threshold
+        checks.append({"metric": key, "threshold": threshold, "actual": actual, "passed": passed})
+    return {
+        "passed": all(check["passed"] for check in checks),
+        "checks": checks,
+        "violations": [check for check in checks if not check["passed"]]
+    }
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+分布式性能测试工作节点
+
+用法: python -m app.workers.perf_worker [--worker-id NAME]
+通过 REDIS_HOST / REDIS_PORT 连接协调用的Redis，只需要能访问Redis和被测RAG系统
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from app.core.redis_client import close_redis, get_redis
+from app.services.distributed_runner import DistributedWorker
+
+
+async def main(worker_id: str = None) -> None:
+    worker = DistributedWorker(get_redis(), worker_id=worker_id)
+    loop = asyncio.get_running_loop()
+    # 收到退出信号时交回当前批次后再退出
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分布式性能测试工作节点")
+    parser.add_argument("--worker-id", help="节点标识，默认为主机名加随机后缀")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(args.worker_id))
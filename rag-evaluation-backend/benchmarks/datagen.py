@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+基准测试数据生成器，在SQLite或PostgreSQL中按表结构批量生成大规模数据
+
+用法: python -m benchmarks.datagen --database-url sqlite:///benchmark.db [--questions 100000] [--versions 3]
+
+生成内容：
+- 一个用户、项目和数据集，数据集包含指定数量的问题
+- 每个问题在每个版本下各一条RAG回答，最后一个版本的回答属于一个运行中的性能测试
+- 一个运行中的AI精度评测，覆盖全部问题，按比例预置已完成的评分，其余为待评测
+生成结果（各对象ID和数据规模）保存在基准项目的settings.benchmark中，供run_benchmarks读取
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+# 添加项目根目录到Python路径
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.db.base import Base
+from app.models.accuracy import AccuracyTest, AccuracyTestItem
+from app.models.dataset import Dataset
+from app.models.performance import PerformanceTest
+from app.models.project import Project
+from app.models.question import Question
+from app.models.rag_answer import RagAnswer
+from app.models.user import User
+import app.models.report  # noqa: F401  注册全部表
+
+BENCHMARK_PROJECT_NAME = "__benchmark__"
+CREATE_SQL_PATH = os.path.join(BACKEND_DIR, "app", "db", "create.sql")
+INSERT_CHUNK_SIZE = 10000
+DIMENSIONS = ["accuracy", "relevance", "completeness"]
+CATEGORIES = ["事实型", "推理型", "比较型", "流程型", "开放型"]
+DIFFICULTIES = ["简单", "中等", "困难"]
+_WORDS = ("检索", "增强", "生成", "评测", "系统", "模型", "向量", "文档", "召回", "排序", "答案", "上下文")
+_CREATE_INDEX = re.compile(r"create\s+index\s+(\w+)\s+on\s+public\.(\w+)\s*\(([^)]+)\)", re.IGNORECASE)
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    # SQLite没有JSONB类型，按JSON列建表
+    return "JSON"
+
+
+def create_benchmark_engine(database_url: str) -> Engine:
+    """创建基准测试使用的数据库引擎"""
+    return create_engine(database_url)
+
+
+def prepare_schema(engine: Engine, reset: bool = False) -> None:
+    """按模型建表，并补建create.sql中定义的索引，使两种数据库的查询计划与生产环境接近"""
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with open(CREATE_SQL_PATH, encoding="utf-8") as f:
+        indexes = _CREATE_INDEX.findall(f.read())
+    with engine.begin() as conn:
+        for name, table, columns in indexes:
+            if table in Base.metadata.tables:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _text(rng: np.random.Generator, words: int) -> str:
+    return "".join(_WORDS[index] for index in rng.integers(0, len(_WORDS), words))
+
+
+def _insert_chunks(db: Session, model, rows: List[Dict[str, Any]]) -> None:
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(insert(model), rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def generate(
+    engine: Engine,
+    *,
+    questions: int,
+    versions: int = 3,
+    completed_ratio: float = 0.9,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """生成一套基准数据并返回清单"""
+    rng = np.random.default_rng(seed)
+    version_names = [f"v{index + 1}" for index in range(versions)]
+    now = datetime.utcnow()
+
+    with Session(engine) as db:
+        user = User(email=f"benchmark-{uuid.uuid4().hex[:8]}@example.com", password_hash="x", is_admin=True)
+        db.add(user)
+        db.flush()
+        project = Project(user_id=user.id, name=BENCHMARK_PROJECT_NAME)
+        dataset = Dataset(user_id=user.id, name=f"benchmark-{questions}")
+        db.add_all([project, dataset])
+        db.flush()
+
+        question_ids = [uuid.uuid4() for _ in range(questions)]
+        categories = rng.integers(0, len(CATEGORIES), questions)
+        difficulties = rng.integers(0, len(DIFFICULTIES), questions)
+        _insert_chunks(db, Question, [{
+            "id": question_id,
+            "dataset_id": dataset.id,
+            "question_text": f"问题{index}：{_text(rng, 8)}？",
+            "standard_answer": _text(rng, 30),
+            "category": CATEGORIES[categories[index]],
+            "difficulty": DIFFICULTIES[difficulties[index]],
+            "tags": [CATEGORIES[categories[index]]],
+        } for index, question_id in enumerate(question_ids)])
+
+        performance_test = PerformanceTest(
+            name="benchmark",
+            project_id=project.id,
+            dataset_id=dataset.id,
+            concurrency=8,
+            version=version_names[-1],
+            status="running",
+            started_at=now - timedelta(seconds=questions / 50),
+            total_questions=questions,
+            config={},
+            summary_metrics={}
+        )
+        db.add(performance_test)
+        db.flush()
+
+        # 各版本回答：耗时服从伽马分布，创建时间按每秒50个请求铺开
+        answer_ids = {}
+        for version in version_names:
+            first_times = rng.gamma(2.0, 0.25, questions)
+            total_times = first_times + rng.gamma(4.0, 0.5, questions)
+            characters = rng.integers(50, 800, questions)
+            is_tested = version == version_names[-1]
+            answer_ids[version] = [uuid.uuid4() for _ in range(questions)]
+            _insert_chunks(db, RagAnswer, [{
+                "id": answer_ids[version][index],
+                "question_id": question_id,
+                "answer": _text(rng, int(characters[index]) // 2),
+                "collection_method": "api",
+                "version": version,
+                "first_response_time": float(first_times[index]),
+                "total_response_time": float(total_times[index]),
+                "character_count": int(characters[index]),
+                "characters_per_second": float(characters[index] / (total_times[index] - first_times[index])),
+                "performance_test_id": performance_test.id if is_tested else None,
+                "sequence_number": index + 1 if is_tested else None,
+                "created_at": performance_test.started_at + timedelta(seconds=index / 50 + float(total_times[index])),
+            } for index, question_id in enumerate(question_ids)])
+
+        accuracy_test = AccuracyTest(
+            project_id=project.id,
+            dataset_id=dataset.id,
+            name="benchmark",
+            evaluation_type="ai",
+            scoring_method="five_scale",
+            dimensions=DIMENSIONS,
+            weights={dimension: 1.0 for dimension in DIMENSIONS},
+            version=version_names[-1],
+            status="running",
+            started_at=now,
+            total_questions=questions,
+            created_by=user.id
+        )
+        db.add(accuracy_test)
+        db.flush()
+
+        # 前completed_ratio的评测项已有AI评分，其余待评测，供提交结果的基准测试使用
+        completed = int(questions * completed_ratio)
+        scores = rng.integers(1, 6, (questions, len(DIMENSIONS)))
+        items = []
+        for index, question_id in enumerate(question_ids):
+            item = {
+                "id": uuid.uuid4(),
+                "evaluation_id": accuracy_test.id,
+                "question_id": question_id,
+                "rag_answer_id": answer_ids[version_names[-1]][index],
+                "sequence_number": index + 1,
+                "status": "pending",
+            }
+            if index < completed:
+                dimension_scores = {dimension: int(score) for dimension, score in zip(DIMENSIONS, scores[index])}
+                score = round(float(np.mean(scores[index])), 2)
+                item.update({
+                    "status": "ai_completed",
+                    "ai_score": score,
+                    "ai_dimension_scores": dimension_scores,
+                    "ai_evaluation_reason": "基准测试生成的评分",
+                    "final_score": score,
+                    "final_dimension_scores": dimension_scores,
+                    "final_evaluation_reason": "基准测试生成的评分",
+                    "final_evaluation_type": "ai",
+                })
+            items.append(item)
+        # 每批插入的行需要相同的列
+        _insert_chunks(db, AccuracyTestItem, [item for item in items if item["status"] != "pending"])
+        _insert_chunks(db, AccuracyTestItem, [item for item in items if item["status"] == "pending"])
+        accuracy_test.processed_questions = completed
+        accuracy_test.success_questions = completed
+
+        manifest = {
+            "user_id": str(user.id),
+            "project_id": str(project.id),
+            "dataset_id": str(dataset.id),
+            "versions": version_names,
+            "performance_test_id": str(performance_test.id),
+            "accuracy_test_id": str(accuracy_test.id),
+            "scale": {
+                "questions": questions,
+                "versions": versions,
+                "rag_answers": questions * versions,
+                "accuracy_items": questions,
+                "completed_items": completed
+            },
+            "seed": seed,
+            "generated_at": now.isoformat()
+        }
+        project.settings = {"benchmark": manifest}
+        db.commit()
+    return manifest
+
+
+def load_manifest(engine: Engine) -> Optional[Dict[str, Any]]:
+    """读取最近一次生成的基准数据清单"""
+    with Session(engine) as db:
+        project = db.query(Project).filter(
+            Project.name == BENCHMARK_PROJECT_NAME
+        ).order_by(Project.created_at.desc()).first()
+        return (project.settings or {}).get("benchmark") if project else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成基准测试数据")
+    parser.add_argument("--database-url", default="sqlite:///benchmark.db", help="SQLAlchemy数据库URL")
+    parser.add_argument("--questions", type=int, default=100000, help="问题数量")
+    parser.add_argument("--versions", type=int, default=3, help="每个问题的RAG回答版本数")
+    parser.add_argument("--completed-ratio", type=float, default=0.9, help="精度评测中已有评分的评测项比例")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="删除并重建全部表")
+    args = parser.parse_args()
+
+    engine = create_benchmark_engine(args.database_url)
+    prepare_schema(engine, reset=args.reset)
+    start = time.perf_counter()
+    manifest = generate(
+        engine,
+        questions=args.questions,
+        versions=args.versions,
+        completed_ratio=args.completed_ratio,
+        seed=args.seed
+    )
+    print(f"生成完成，耗时 {time.perf_counter() - start:.1f} 秒: {manifest['scale']}")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+测量评测引擎自身的开销和单核可达到的最大吞吐量
+
+用法: python -m benchmarks.harness_overhead [--requests 2000] [--concurrency 1,8,32,128] [--output result.json]
+
+在子进程中启动模拟RAG服务（benchmarks.mock_rag_server），用性能测试引擎的闭环执行路径
+（发送请求、解析响应、更新实时指标、构建结果行）进行压测，结果行不写入数据库。
+
+- overhead: JSON响应、固定服务端耗时，客户端测得的总耗时减去服务端返回的service_time即为引擎开销
+- saturation: 服务端零延迟，逐级提高并发数，记录吞吐量和每CPU秒完成的请求数（单核最大RPS）
+- streaming: SSE逐token返回，衡量流式解析的开销
+时间单位均为秒
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import httpx
+
+# 添加项目根目录到Python路径
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.core.http_client import http_client_registry
+from app.schemas.rag_answer import ApiRequestConfig
+from app.services.live_metrics import LiveTestMetrics
+from app.services.performance_runner import performance_runner
+from app.services.performance_service import calculate_percentiles
+
+
+class _DiscardWriter:
+    """代替ResultWriter，只收集结果行不写数据库"""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    def put(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+
+
+class MockServer:
+    """在子进程中运行的模拟RAG服务"""
+
+    def __init__(self, port: int, workers: int, config: Dict[str, Any]):
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.mock_rag_server",
+                "--port", str(port), "--workers", str(workers), "--config", json.dumps(config)
+            ],
+            cwd=BACKEND_DIR
+        )
+
+    def __enter__(self) -> "MockServer":
+        for _ in range(100):
+            try:
+                httpx.get(f"{self.url}/stats", timeout=1).raise_for_status()
+                return self
+            except httpx.HTTPError:
+                if self.process.poll() is not None:
+                    raise RuntimeError("模拟RAG服务启动失败")
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("等待模拟RAG服务启动超时")
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def run_closed_loop(url: str, requests: int, concurrency: int, stream: bool) -> Dict[str, Any]:
+    """以闭环模式发送requests个请求，返回结果行和客户端耗时、CPU时间"""
+    api_config = ApiRequestConfig(
+        endpoint_url=f"{url}/query",
+        request_template={"query": "{{question}}", "stream": stream},
+        response_path="answer",
+        stream_event_field="event" if stream else None,
+        stream_event_value="message" if stream else None
+    )
+    questions = [(index, str(uuid.uuid4()), f"基准测试问题{index}") for index in range(1, requests + 1)]
+    test = SimpleNamespace(id=str(uuid.uuid4()), version="benchmark")
+    writer = _DiscardWriter()
+    client = http_client_registry.get_client(api_config.endpoint_url, pool_size=concurrency)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await performance_runner._run_closed_loop(
+        client, writer, LiveTestMetrics(test.id), test, questions, api_config, concurrency
+    )
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    succeeded = [row for row in writer.rows if row["total_response_time"] is not None]
+    return {
+        "rows": succeeded,
+        "summary": {
+            "concurrency": concurrency,
+            "requests": requests,
+            "failed": requests - len(succeeded),
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "requests_per_second": len(succeeded) / wall if wall > 0 else 0,
+            # 单个进程只占用一个核，每CPU秒完成的请求数即单核可达到的最大RPS
+            "requests_per_cpu_second": len(succeeded) / cpu if cpu > 0 else 0,
+            "total_time": calculate_percentiles([row["total_response_time"] for row in succeeded])
+        }
+    }
+
+
+async def bench_overhead(args) -> Dict[str, Any]:
+    config = {"ttft": args.service_time, "token_rate": 0, "output_tokens": 100}
+    results = []
+    with MockServer(args.port, args.server_workers, config) as server:
+        for concurrency in (1, max(args.concurrency)):
+            run = await run_closed_loop(server.url, args.requests, concurrency, stream=False)
+            overheads = [
+                row["total_response_time"] - row["raw_response"]["service_time"] for row in run["rows"]
+            ]
+            results.append({**run["summary"], "overhead": calculate_percentiles(overheads)})
+    return {"service_time": args.service_time, "runs": results}
+
+
+async def bench_saturation(args) -> Dict[str, Any]:
+    config = {"ttft": 0, "token_rate": 0, "output_tokens": 100}
+    results = []
+    with MockServer(args.port, args.server_workers, config) as server:
+        # 预热连接池
+        await run_closed_loop(server.url, min(args.requests, 200), max(args.concurrency), stream=False)
+        for concurrency in args.concurrency:
+            run = await run_closed_loop(server.url, args.requests, concurrency, stream=False)
+            results.append(run["summary"])
+    return {
+        "runs": results,
+        "max_requests_per_second": max(run["requests_per_second"] for run in results),
+        "max_requests_per_cpu_second": max(run["requests_per_cpu_second"] for run in results)
+    }
+
+
+async def bench_streaming(args) -> Dict[str, Any]:
+    config = {"ttft": 0, "token_rate": 0, "output_tokens": args.stream_tokens, "chunk_tokens": 1}
+    with MockServer(args.port, args.server_workers, config) as server:
+        run = await run_closed_loop(server.url, args.requests, max(args.concurrency), stream=True)
+    summary = run["summary"]
+    summary["events_per_request"] = args.stream_tokens
+    summary["cpu_seconds_per_event"] = (
+        summary["cpu_seconds"] / (args.requests * args.stream_tokens) if args.requests else None
+    )
+    return summary
+
+
+async def main(args) -> Dict[str, Any]:
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "server_workers": args.server_workers
+        }
+    }
+    for name, bench in (("overhead", bench_overhead), ("saturation", bench_saturation), ("streaming", bench_streaming)):
+        try:
+            report[name] = await bench(args)
+        finally:
+            # 每个场景都会重启模拟服务，释放指向旧服务的连接
+            await http_client_registry.aclose()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="测量评测引擎自身的开销和单核最大吞吐量")
+    parser.add_argument("--requests", type=int, default=2000, help="每轮发送的请求数")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="saturation场景逐级使用的并发数，逗号分隔")
+    parser.add_argument("--service-time", type=float, default=0.05, help="overhead场景的服务端耗时(秒)")
+    parser.add_argument("--stream-tokens", type=int, default=200, help="streaming场景每个回答的token数")
+    parser.add_argument("--port", type=int, default=9100, help="模拟RAG服务端口")
+    parser.add_argument("--server-workers", type=int, default=1, help="模拟RAG服务进程数，多核机器上可适当调大以免服务端成为瓶颈")
+    parser.add_argument("--output", help="结果JSON文件路径，默认输出到标准输出")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+
+    result = asyncio.run(main(args))
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+模拟OpenAI兼容的评测模型服务，用于在本地测试服务端精度评测
+
+用法: python -m benchmarks.mock_llm_server [--port 9200] [--config JSON或文件路径]
+
+提供 POST /v1/chat/completions 和 GET /stats，评测模型配置: base_url=http://127.0.0.1:9200/v1。
+回复格式与前端生成的评测提示词一致：思考过程、"####" 分隔符和YAML代码块。
+评分由提示词内容的哈希决定，同一提示词总是得到相同评分；评估维度取自提示词中的 "评估维度:" 行，
+分数上限取自 "评分范围:" 行，或按 "评分方法:" 行确定（binary为1、three_point/three_scale为2，否则为4）。
+提示词包含 "### 评测项 N" 段落时按批量评测处理，返回JSON数组，每个评测项的评分由该段落内容的哈希决定。
+
+配置项（均可省略）:
+- latency: 响应耗时分布(秒)，写法同 mock_rag_server，默认 {"dist": "constant", "value": 0.05}
+- error_rate: 按概率返回错误，默认0
+- error_status: 错误时的状态码，默认500；429/503时带 Retry-After 头（retry_after，默认1秒）
+- malformed_rate: 按概率返回无法解析的内容，默认0；批量评测时按该概率逐项省略结果
+- seed: 随机种子
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from benchmarks.mock_rag_server import Distribution, load_config
+
+# 多进程启动时通过该环境变量传递配置
+CONFIG_ENV = "MOCK_LLM_CONFIG"
+DEFAULT_CONFIG = {
+    "latency": {"dist": "constant", "value": 0.05},
+    "error_rate": 0.0,
+    "error_status": 500,
+    "retry_after": 1,
+    "malformed_rate": 0.0,
+    "seed": None,
+}
+_DIMENSIONS_LINE = re.compile(r"评估维度[:：]\s*(.+)")
+_METHOD_LINE = re.compile(r"评分方法[:：]\s*(\w+)")
+_RANGE_LINE = re.compile(r"评分范围[:：]\s*\d+\s*-\s*(\d+)")
+_BATCH_ITEM = re.compile(r"^### 评测项 (\d+)\n", re.MULTILINE)
+
+
+def _max_score(prompt: str) -> int:
+    match = _RANGE_LINE.search(prompt)
+    if match:
+        return int(match.group(1))
+    match = _METHOD_LINE.search(prompt)
+    method = match.group(1) if match else ""
+    if method == "binary":
+        return 1
+    if method in ("three_point", "three_scale"):
+        return 2
+    return 4
+
+
+def _dimensions(prompt: str) -> List[str]:
+    match = _DIMENSIONS_LINE.search(prompt)
+    if not match:
+        return ["accuracy"]
+    return [dimension.strip() for dimension in match.group(1).split(",") if dimension.strip()] or ["accuracy"]
+
+
+def _scores(text: str, max_score: int, dimensions: List[str]) -> Dict[str, int]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return {dimension: digest[index % len(digest)] % (max_score + 1) for index, dimension in enumerate(dimensions)}
+
+
+def _batch_items(prompt: str) -> List[tuple]:
+    """拆分批量评测提示词中的评测项，返回 [(编号, 段落内容)]"""
+    matches = list(_BATCH_ITEM.finditer(prompt))
+    return [
+        (int(match.group(1)), prompt[match.end():matches[index + 1].start() if index + 1 < len(matches) else len(prompt)])
+        for index, match in enumerate(matches)
+    ]
+
+
+def judge_reply(prompt: str) -> str:
+    """按提示词生成确定的评测回复"""
+    scores = _scores(prompt, _max_score(prompt), _dimensions(prompt))
+    lines = "\n".join(f"  - {dimension}: {score}" for dimension, score in scores.items())
+    overall = round(sum(scores.values()) / len(scores), 2)
+    return (
+        "思考1: 对比参考答案\n####\n\n```yaml\n"
+        f"overall_score: {overall}\n"
+        f"dimension_scores:\n{lines}\n"
+        "evaluation_reason: |\n  - 模拟评测结果\n```"
+    )
+
+
+def batch_judge_reply(prompt: str, omit: Optional[List[int]] = None) -> str:
+    """按批量评测提示词生成确定的JSON数组回复，omit中的评测项编号不返回结果"""
+    max_score = _max_score(prompt)
+    dimensions = _dimensions(prompt)
+    entries = []
+    for number, text in _batch_items(prompt):
+        if omit and number in omit:
+            continue
+        scores = _scores(text, max_score, dimensions)
+        entries.append({
+            "id": number,
+            "overall_score": round(sum(scores.values()) / len(scores), 2),
+            "dimension_scores": scores,
+            "evaluation_reason": "模拟评测结果",
+        })
+    return "```json\n" + json.dumps(entries, ensure_ascii=False, indent=2) + "\n```"
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Starlette:
+    """按配置创建模拟评测模型服务的ASGI应用"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    latency = Distribution(config["latency"])
+    error_rate = float(config["error_rate"])
+    error_status = int(config["error_status"])
+    malformed_rate = float(config["malformed_rate"])
+    rng = np.random.default_rng(config["seed"])
+    stats = {
+        "requests": 0, "batch_requests": 0, "errors": 0, "malformed": 0,
+        "prompt_tokens": 0, "completion_tokens": 0,
+    }
+
+    async def chat_completions(request: Request) -> Response:
+        start = time.perf_counter()
+        body = await request.json()
+        messages = body.get("messages") or []
+        prompt = "\n".join(str(message.get("content", "")) for message in messages if message.get("role") == "user")
+        stats["requests"] += 1
+
+        delay = latency.sample(rng) - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            headers = {"Retry-After": str(config["retry_after"])} if error_status in (429, 503) else None
+            return JSONResponse({"error": {"message": "mock error"}}, status_code=error_status, headers=headers)
+
+        batch_items = _batch_items(prompt)
+        if batch_items:
+            stats["batch_requests"] += 1
+            omit = [number for number, _ in batch_items if malformed_rate and rng.random() < malformed_rate]
+            stats["malformed"] += len(omit)
+            content = batch_judge_reply(prompt, omit)
+        elif malformed_rate and rng.random() < malformed_rate:
+            stats["malformed"] += 1
+            content = "无法给出评分"
+        else:
+            content = judge_reply(prompt)
+
+        # 按每个字符一个token粗略估算用量
+        usage = {
+            "prompt_tokens": sum(len(str(message.get("content", ""))) for message in messages),
+            "completion_tokens": len(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        stats["prompt_tokens"] += usage["prompt_tokens"]
+        stats["completion_tokens"] += usage["completion_tokens"]
+        return JSONResponse({
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse({**stats, "config": config})
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
+
+
+def create_app_from_env() -> Starlette:
+    """uvicorn多进程启动时使用的工厂函数，配置取自MOCK_LLM_CONFIG环境变量"""
+    return create_app(load_config(os.environ.get(CONFIG_ENV)))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟OpenAI兼容的评测模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn工作进程数")
+    parser.add_argument("--config", help="JSON配置字符串或JSON文件路径")
+    args = parser.parse_args()
+
+    if args.config:
+        os.environ[CONFIG_ENV] = json.dumps(load_config(args.config))
+    uvicorn.run(
+        "benchmarks.mock_llm_server:create_app_from_env",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level="warning"
+    )
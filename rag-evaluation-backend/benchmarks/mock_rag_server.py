@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+模拟RAG服务，用于单独测量评测引擎自身的开销
+
+用法: python -m benchmarks.mock_rag_server [--port 9000] [--workers 1] [--config JSON或文件路径]
+
+请求体中 stream 为 true（或配置 stream=true）时以SSE逐个token返回：
+    data: {"event": "message", "answer": "..."}  ...  data: {"event": "message_end", ...}  data: [DONE]
+否则返回JSON: {"answer": "...", "service_time": 服务端耗时(秒), "output_tokens": token数}
+对应的接口配置: request_template={"query": "{{question}}", "stream": true/false}, response_path=answer，
+流式时 stream_event_field=event、stream_event_value=message
+
+配置项（均可省略）:
+- ttft: 首token耗时分布(秒)，默认 {"dist": "constant", "value": 0.05}
+- token_rate: 生成速度分布(token/秒)，0表示瞬时生成，默认 {"dist": "constant", "value": 50}
+- output_tokens: 回答token数分布，决定响应大小，默认 {"dist": "constant", "value": 100}
+- chunk_tokens: SSE每个事件包含的token数，默认1
+- error_rate: 按概率返回错误，默认0
+- error_status: 错误时的状态码，默认500；429/503时带 Retry-After 头（retry_after，默认1秒）
+- stream: 请求体未指定stream时是否流式返回，默认false
+- seed: 随机种子
+
+分布写法: {"dist": "constant", "value": x} | {"dist": "uniform", "low": a, "high": b}
+| {"dist": "normal", "mean": m, "std": s} | {"dist": "lognormal", "median": m, "sigma": s}
+| {"dist": "exponential", "mean": m}，采样结果小于0时取0；也可直接写数字表示常数
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# 多进程启动时通过该环境变量传递配置
+CONFIG_ENV = "MOCK_RAG_CONFIG"
+DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+DEFAULT_CONFIG = {
+    "ttft": {"dist": "constant", "value": 0.05},
+    "token_rate": {"dist": "constant", "value": 50},
+    "output_tokens": {"dist": "constant", "value": 100},
+    "chunk_tokens": 1,
+    "error_rate": 0.0,
+    "error_status": 500,
+    "retry_after": 1,
+    "stream": False,
+    "seed": None,
+}
+# 回答内容由固定词表循环拼接，每个token两个字符
+_VOCABULARY = ("检索", "增强", "生成", "评测", "系统", "回答", "问题", "文档")
+_TOKEN_CHARS = 2
+
+
+class Distribution:
+    """按配置采样的非负随机数"""
+
+    def __init__(self, spec: Any):
+        if isinstance(spec, (int, float)):
+            spec = {"dist": "constant", "value": spec}
+        if not isinstance(spec, dict) or spec.get("dist", "constant") not in DISTRIBUTIONS:
+            raise ValueError(f"不支持的分布配置: {spec}")
+        self.kind = spec.get("dist", "constant")
+        self.spec = spec
+
+    def sample(self, rng: np.random.Generator) -> float:
+        spec = self.spec
+        if self.kind == "constant":
+            value = float(spec["value"])
+        elif self.kind == "uniform":
+            value = rng.uniform(spec["low"], spec["high"])
+        elif self.kind == "normal":
+            value = rng.normal(spec["mean"], spec["std"])
+        elif self.kind == "lognormal":
+            value = spec["median"] * np.exp(rng.normal(0.0, spec["sigma"]))
+        else:
+            value = rng.exponential(spec["mean"])
+        return max(0.0, float(value))
+
+
+def load_config(value: Optional[str]) -> Dict[str, Any]:
+    """解析命令行或环境变量中的配置，既可以是JSON字符串也可以是JSON文件路径"""
+    if not value:
+        return {}
+    if os.path.isfile(value):
+        with open(value, encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def answer_text(tokens: int, offset: int = 0) -> str:
+    """生成第offset个token起共tokens个token的回答文本"""
+    return "".join(_VOCABULARY[index % len(_VOCABULARY)] for index in range(offset, offset + tokens))
+
+
+def create_app(config: Optional[Dict[str, Any]] = None) -> Starlette:
+    """按配置创建模拟RAG服务的ASGI应用"""
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    ttft = Distribution(config["ttft"])
+    token_rate = Distribution(config["token_rate"])
+    output_tokens = Distribution(config["output_tokens"])
+    chunk_tokens = max(1, int(config["chunk_tokens"]))
+    error_rate = float(config["error_rate"])
+    error_status = int(config["error_status"])
+    rng = np.random.default_rng(config["seed"])
+    stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    async def wait_until(deadline: float) -> None:
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def query(request: Request) -> Response:
+        start = time.perf_counter()
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        stream = body.get("stream", config["stream"]) if isinstance(body, dict) else config["stream"]
+
+        stats["requests"] += 1
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            await wait_until(start + ttft.sample(rng))
+            headers = {"Retry-After": str(config["retry_after"])} if error_status in (429, 503) else None
+            return JSONResponse({"error": "mock error"}, status_code=error_status, headers=headers)
+
+        first_token_at = start + ttft.sample(rng)
+        rate = token_rate.sample(rng)
+        tokens = max(1, int(round(output_tokens.sample(rng))))
+        # 第i个token的计划发出时刻，rate为0表示所有token随首token一起返回
+        interval = 1.0 / rate if rate > 0 else 0.0
+
+        if not stream:
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            try:
+                await wait_until(first_token_at + (tokens - 1) * interval)
+            finally:
+                stats["in_flight"] -= 1
+            return JSONResponse({
+                "answer": answer_text(tokens),
+                "service_time": time.perf_counter() - start,
+                "output_tokens": tokens
+            })
+
+        async def events():
+            stats["in_flight"] += 1
+            stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+            try:
+                for offset in range(0, tokens, chunk_tokens):
+                    await wait_until(first_token_at + offset * interval)
+                    count = min(chunk_tokens, tokens - offset)
+                    event = {"event": "message", "answer": answer_text(count, offset)}
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                end = {"event": "message_end", "service_time": time.perf_counter() - start, "output_tokens": tokens}
+                yield f"data: {json.dumps(end)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse({**stats, "config": config})
+
+    return Starlette(routes=[
+        Route("/query", query, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
+
+
+def create_app_from_env() -> Starlette:
+    """uvicorn多进程启动时使用的工厂函数，配置取自MOCK_RAG_CONFIG环境变量"""
+    return create_app(load_config(os.environ.get(CONFIG_ENV)))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟RAG服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn工作进程数")
+    parser.add_argument("--config", help="JSON配置字符串或JSON文件路径")
+    args = parser.parse_args()
+
+    if args.config:
+        os.environ[CONFIG_ENV] = json.dumps(load_config(args.config))
+    uvicorn.run(
+        "benchmarks.mock_rag_server:create_app_from_env",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level="warning"
+    )
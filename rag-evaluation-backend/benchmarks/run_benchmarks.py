@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+后端热点路径的基准测试
+
+用法:
+    python -m benchmarks.run_benchmarks --database-url sqlite:///benchmark.db [--generate --questions 100000]
+        [--repeat 5] [--only read_questions,export_questions] [--output results.json]
+        [--compare baseline.json --threshold 0.2]
+
+数据由 benchmarks.datagen 生成（--generate 时先生成）。每个用例重复执行 --repeat 次，每次使用新的数据库会话，
+准备和清理工作不计入耗时，清理后数据恢复原状，保证多次运行和不同提交之间可比。
+结果JSON包含提交号、数据库和数据规模；指定 --compare 时与基线结果逐项比较中位数，
+任一用例变慢超过 --threshold 时以非0状态码退出，可用于CI中发现性能退化。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# 添加项目根目录到Python路径
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.datagen import create_benchmark_engine, generate, load_manifest, prepare_schema
+from app.api.api_v1.endpoints.dataset_questions import export_questions, read_questions
+from app.models.accuracy import AccuracyTest, AccuracyTestItem
+from app.models.performance import PerformanceTest
+from app.schemas.accuracy import AccuracyTestCreate
+from app.services.accuracy_service import AccuracyService
+from app.services.performance_service import performance_service
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+SUBMIT_BATCH_SIZE = 100
+PAGE_SIZE = 100
+
+
+class BenchmarkCase:
+    """
+    单个基准测试用例
+
+    setup在计时前执行并返回本次运行的状态，run为计时部分，teardown在计时后恢复数据
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[Session, SimpleNamespace, Any], Any],
+        setup: Optional[Callable[[Session, SimpleNamespace], Any]] = None,
+        teardown: Optional[Callable[[Session, SimpleNamespace, Any], None]] = None,
+        description: str = ""
+    ):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.description = description
+
+
+def _read_questions(db: Session, ctx: SimpleNamespace, state: Any, version: Optional[str]) -> None:
+    read_questions(
+        db=db,
+        dataset_id=ctx.dataset_id,
+        page=ctx.middle_page,
+        size=PAGE_SIZE,
+        search=None,
+        category=None,
+        difficulty=None,
+        version=version,
+        current_user=ctx.user
+    )
+
+
+def _export_questions(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    export_questions(
+        db=db, dataset_id=ctx.dataset_id, current_user=ctx.user, search=None, category=None, difficulty=None
+    )
+
+
+def _create_accuracy_test(db: Session, ctx: SimpleNamespace, state: Any) -> str:
+    test = AccuracyService(db).create_test(AccuracyTestCreate(
+        project_id=ctx.project_id,
+        dataset_id=ctx.dataset_id,
+        name="benchmark-create",
+        evaluation_type="ai",
+        scoring_method="five_scale",
+        dimensions=["accuracy"],
+        version=ctx.versions[-1]
+    ), user_id=ctx.user.id)
+    state["test_id"] = test.id
+
+
+def _delete_accuracy_test(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    if state.get("test_id"):
+        db.query(AccuracyTestItem).filter(AccuracyTestItem.evaluation_id == state["test_id"]).delete()
+        db.query(AccuracyTest).filter(AccuracyTest.id == state["test_id"]).delete()
+        db.commit()
+
+
+def _calculate_test_results(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    AccuracyService(db)._calculate_test_results(ctx.accuracy_test_id)
+
+
+def _update_lexical_metrics(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    AccuracyService(db).update_lexical_metrics(ctx.accuracy_test_id)
+
+
+def _pending_question_ids(db: Session, ctx: SimpleNamespace) -> List[str]:
+    rows = db.query(AccuracyTestItem.question_id).filter(
+        AccuracyTestItem.evaluation_id == ctx.accuracy_test_id,
+        AccuracyTestItem.status == "pending"
+    ).order_by(AccuracyTestItem.sequence_number).limit(SUBMIT_BATCH_SIZE).all()
+    return [row[0] for row in rows]
+
+
+def _submit_test_item_results(db: Session, ctx: SimpleNamespace, question_ids: List[str]) -> None:
+    AccuracyService(db).submit_test_item_results(ctx.accuracy_test_id, [{
+        "id": question_id,
+        "ai_score": 4,
+        "ai_dimension_scores": {"accuracy": 4, "relevance": 4, "completeness": 4},
+        "ai_evaluation_reason": "基准测试提交的评分",
+    } for question_id in question_ids])
+
+
+def _reset_submitted_items(db: Session, ctx: SimpleNamespace, question_ids: List[str]) -> None:
+    cleared = {
+        column: None for column in (
+            "ai_score", "ai_dimension_scores", "ai_evaluation_reason", "ai_evaluation_time",
+            "final_score", "final_dimension_scores", "final_evaluation_reason", "final_evaluation_type"
+        )
+    }
+    db.query(AccuracyTestItem).filter(
+        AccuracyTestItem.evaluation_id == ctx.accuracy_test_id,
+        AccuracyTestItem.question_id.in_(question_ids)
+    ).update({**cleared, "status": "pending"}, synchronize_session=False)
+    # 提交结果时若全部评测项完成会自动结束测试，这里恢复为运行中
+    db.query(AccuracyTest).filter(AccuracyTest.id == ctx.accuracy_test_id).update(
+        {"status": "running", "completed_at": None, "results_summary": None}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _complete_performance_test(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    performance_service.complete_performance_test(db, performance_test_id=ctx.performance_test_id)
+
+
+def _reset_performance_test(db: Session, ctx: SimpleNamespace, state: Any) -> None:
+    db.query(PerformanceTest).filter(PerformanceTest.id == ctx.performance_test_id).update(
+        {"status": "running", "completed_at": None}, synchronize_session=False
+    )
+    db.commit()
+
+
+CASES = [
+    BenchmarkCase(
+        "read_questions",
+        lambda db, ctx, state: _read_questions(db, ctx, state, None),
+        description=f"数据集问题列表中间一页（每页{PAGE_SIZE}条）及各问题的全部回答"
+    ),
+    BenchmarkCase(
+        "read_questions_by_version",
+        lambda db, ctx, state: _read_questions(db, ctx, state, ctx.versions[-1]),
+        description="按回答版本筛选的问题列表中间一页"
+    ),
+    BenchmarkCase("export_questions", _export_questions, description="导出数据集全部问题为Excel"),
+    BenchmarkCase(
+        "accuracy_create_test",
+        _create_accuracy_test,
+        setup=lambda db, ctx: {},
+        teardown=_delete_accuracy_test,
+        description="为整个数据集创建精度评测及评测项"
+    ),
+    BenchmarkCase(
+        "accuracy_calculate_test_results",
+        _calculate_test_results,
+        description="汇总精度评测全部已完成评测项的得分"
+    ),
+    BenchmarkCase(
+        "accuracy_lexical_metrics",
+        _update_lexical_metrics,
+        description="批量计算精度评测全部评测项的词汇重合指标并写回"
+    ),
+    BenchmarkCase(
+        "accuracy_submit_test_item_results",
+        _submit_test_item_results,
+        setup=_pending_question_ids,
+        teardown=_reset_submitted_items,
+        description=f"提交{SUBMIT_BATCH_SIZE}个评测项的AI评分并更新测试进度"
+    ),
+    BenchmarkCase(
+        "complete_performance_test",
+        _complete_performance_test,
+        teardown=_reset_performance_test,
+        description="完成性能测试并计算汇总指标和时间线"
+    ),
+]
+
+
+def run_case(engine: Engine, ctx: SimpleNamespace, case: BenchmarkCase, repeat: int) -> Dict[str, Any]:
+    """执行单个用例并返回各次耗时及统计值(秒)"""
+    durations = []
+    for _ in range(repeat):
+        with Session(engine) as db:
+            state = case.setup(db, ctx) if case.setup else None
+            start = time.perf_counter()
+            case.run(db, ctx, state)
+            durations.append(time.perf_counter() - start)
+            if case.teardown:
+                db.rollback()
+                case.teardown(db, ctx, state)
+    return {
+        "description": case.description,
+        "runs": durations,
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "mean": statistics.fmean(durations),
+        "max": max(durations)
+    }
+
+
+def _git_info() -> Dict[str, Any]:
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """按中位数与基线结果比较，变慢比例超过threshold的用例视为退化"""
+    comparisons = {}
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median" not in base or "median" not in result:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] > 0 else None
+        comparisons[name] = {
+            "baseline_median": base["median"],
+            "median": result["median"],
+            "ratio": ratio,
+            "regressed": ratio is not None and ratio > 1 + threshold
+        }
+    return {
+        "baseline_commit": baseline.get("meta", {}).get("git", {}).get("commit"),
+        "same_scale": baseline.get("meta", {}).get("scale") == current["meta"]["scale"],
+        "threshold": threshold,
+        "cases": comparisons,
+        "regressions": [name for name, item in comparisons.items() if item["regressed"]]
+    }
+
+
+def main(args) -> int:
+    engine = create_benchmark_engine(args.database_url)
+    prepare_schema(engine)
+    manifest = load_manifest(engine)
+    if args.generate or manifest is None:
+        print(f"生成基准数据: {args.questions} 个问题, {args.versions} 个版本", file=sys.stderr)
+        manifest = generate(engine, questions=args.questions, versions=args.versions, seed=args.seed)
+
+    ctx = SimpleNamespace(
+        user=SimpleNamespace(id=manifest["user_id"], is_admin=True),
+        project_id=manifest["project_id"],
+        dataset_id=manifest["dataset_id"],
+        versions=manifest["versions"],
+        performance_test_id=manifest["performance_test_id"],
+        accuracy_test_id=manifest["accuracy_test_id"],
+        middle_page=max(1, manifest["scale"]["questions"] // PAGE_SIZE // 2)
+    )
+
+    selected = set(args.only.split(",")) if args.only else None
+    results = {}
+    for case in CASES:
+        if selected and case.name not in selected:
+            continue
+        print(f"运行 {case.name} ...", file=sys.stderr)
+        try:
+            results[case.name] = run_case(engine, ctx, case, args.repeat)
+            print(f"  中位数 {results[case.name]['median']:.4f} 秒", file=sys.stderr)
+        except Exception as e:
+            # 某些路径依赖PostgreSQL特性，记录错误后继续执行其他用例
+            results[case.name] = {"description": case.description, "error": f"{type(e).__name__}: {e}"}
+            print(f"  失败: {results[case.name]['error']}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "git": _git_info(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": {
+                "dialect": engine.dialect.name,
+                "server_version": ".".join(map(str, engine.dialect.server_version_info or ()))
+            },
+            "scale": manifest["scale"],
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare_results(report, json.load(f), args.threshold)
+        if not report["comparison"]["same_scale"]:
+            print("警告: 与基线的数据规模不同，比较结果仅供参考", file=sys.stderr)
+        for name, item in report["comparison"]["cases"].items():
+            flag = "  退化" if item["regressed"] else ""
+            print(f"{name}: {item['baseline_median']:.4f} -> {item['median']:.4f} 秒 (x{item['ratio']:.2f}){flag}", file=sys.stderr)
+        if report["comparison"]["regressions"]:
+            exit_code = 1
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="后端热点路径基准测试")
+    parser.add_argument("--database-url", default="sqlite:///benchmark.db", help="SQLAlchemy数据库URL")
+    parser.add_argument("--generate", action="store_true", help="先生成一套新的基准数据")
+    parser.add_argument("--questions", type=int, default=100000, help="生成数据时的问题数量")
+    parser.add_argument("--versions", type=int, default=3, help="生成数据时每个问题的回答版本数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="每个用例的重复次数")
+    parser.add_argument("--only", help="只运行指定用例，逗号分隔")
+    parser.add_argument("--output", help="结果JSON文件路径，默认输出到标准输出")
+    parser.add_argument("--compare", help="用于比较的基线结果JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定退化的变慢比例")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    """PostgreSQL测试库，由环境变量TEST_DATABASE_URL指定，未设置时跳过依赖PostgreSQL的用例"""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("未设置TEST_DATABASE_URL")
+    engine = create_engine(url)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,307 @@
+import asyncio
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import httpx
+import pytest
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.http_client import http_client_registry
+from app.models.accuracy import AccuracyTest, AccuracyTestItem
+from app.models.dataset import Dataset
+from app.models.project import Project
+from app.models.question import Question
+from app.models.rag_answer import RagAnswer
+from app.models.user import User
+from app.schemas.accuracy import AccuracyTestCreate, JudgeModelConfig
+from app.services import accuracy_runner as runner_module
+from app.services.accuracy_runner import AccuracyRunner
+from app.services.accuracy_service import AccuracyService
+from app.services.judge_cache import judge_cache
+from app.services.llm_judge import build_judge_prompt, parse_judge_response
+from benchmarks.datagen import prepare_schema
+from benchmarks.mock_llm_server import create_app, judge_reply
+
+DIMENSIONS = ["事实准确性", "完整性"]
+
+
+@pytest.fixture
+def session_factory(monkeypatch, tmp_path):
+    """SQLite文件库，执行引擎在线程池中打开的会话也连接到同一个库"""
+    # UUID主键以字符串存储，批量插入时无法按哨兵值匹配返回行，关闭insertmanyvalues
+    engine = create_engine(f"sqlite:///{tmp_path / 'accuracy.db'}", use_insertmanyvalues=False)
+    prepare_schema(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(runner_module, "SessionLocal", factory)
+    judge_cache.clear()
+    yield factory
+    judge_cache.clear()
+    engine.dispose()
+
+
+def _create_test(factory, count: int, batch_settings: Dict[str, Any]) -> str:
+    with factory() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        project = Project(user_id=user.id, name="p")
+        dataset = Dataset(user_id=user.id, name="d")
+        db.add_all([project, dataset])
+        db.flush()
+        questions = [
+            Question(dataset_id=dataset.id, question_text=f"问题{index}", standard_answer=f"答案{index}")
+            for index in range(count)
+        ]
+        db.add_all(questions)
+        db.flush()
+        db.add_all([
+            RagAnswer(question_id=question.id, answer=f"回答{index}", collection_method="api", version="v1")
+            for index, question in enumerate(questions)
+        ])
+        db.commit()
+        test = AccuracyService(db).create_test(AccuracyTestCreate(
+            project_id=project.id,
+            dataset_id=dataset.id,
+            name="server judge",
+            evaluation_type="ai",
+            scoring_method="three_scale",
+            dimensions=DIMENSIONS,
+            version="v1",
+            batch_settings=batch_settings,
+        ), user_id=user.id)
+        test.status = "running"
+        db.commit()
+        return str(test.id)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_with_judge_server(test_id: str, server_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """在同一事件循环中启动模拟评测模型服务并执行评测，返回服务的请求统计"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app({"latency": 0.01, "seed": 0, **(server_config or {})}),
+        host="127.0.0.1", port=port, log_level="warning"
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        judge_config = JudgeModelConfig(base_url=f"{base_url}/v1", api_key="test", model_name="mock-judge")
+        await asyncio.wait_for(AccuracyRunner().start(test_id, judge_config), timeout=60)
+        async with httpx.AsyncClient() as client:
+            return (await client.get(f"{base_url}/stats")).json()
+    finally:
+        await http_client_registry.aclose()
+        server.should_exit = True
+        await serving
+
+
+def test_runner_judges_all_items(session_factory):
+    """评分写入对应的评测项，全部完成后测试自动完成"""
+    test_id = _create_test(session_factory, 23, {"concurrency": 4, "batch_size": 5, "use_cache": False})
+    stats = asyncio.run(_run_with_judge_server(test_id))
+    assert stats["requests"] == 23
+
+    with session_factory() as db:
+        test = db.get(AccuracyTest, test_id)
+        assert test.status == "completed"
+        assert test.processed_questions == test.success_questions == 23
+        assert test.model_config_test["model_name"] == "mock-judge"
+        items = db.query(AccuracyTestItem, Question, RagAnswer).join(
+            Question, AccuracyTestItem.question_id == Question.id
+        ).join(
+            RagAnswer, AccuracyTestItem.rag_answer_id == RagAnswer.id
+        ).filter(AccuracyTestItem.evaluation_id == test_id).all()
+        for item, question, answer in items:
+            prompt = build_judge_prompt(
+                None, question.question_text, question.standard_answer, answer.answer, "three_scale", DIMENSIONS
+            )
+            expected = parse_judge_response(judge_reply(prompt), "three_scale", DIMENSIONS)
+            assert item.status == "ai_completed"
+            assert float(item.ai_score) == pytest.approx(expected["overall_score"])
+            assert item.ai_dimension_scores == expected["dimension_scores"]
+
+
+def test_database_work_runs_off_the_event_loop(session_factory, monkeypatch):
+    """加载评测项和标记失败都在线程池中执行，评测出错时测试标记为失败"""
+    test_id = _create_test(session_factory, 5, {"concurrency": 2, "batch_size": 5, "use_cache": False})
+    threads = {}
+    original_load = AccuracyRunner._load_pending_items
+    original_fail = AccuracyService.fail_test
+
+    def recording_load(self, db, test_id):
+        threads["load"] = threading.get_ident()
+        return original_load(self, db, test_id)
+
+    def recording_fail(self, test_id, error_details):
+        threads["fail"] = threading.get_ident()
+        return original_fail(self, test_id, error_details)
+
+    async def failing_judge_item(self, *args, **kwargs):
+        raise RuntimeError("评测模型不可用")
+
+    monkeypatch.setattr(AccuracyRunner, "_load_pending_items", recording_load)
+    monkeypatch.setattr(AccuracyService, "fail_test", recording_fail)
+    monkeypatch.setattr(AccuracyRunner, "_judge_item", failing_judge_item)
+
+    async def scenario():
+        threads["loop"] = threading.get_ident()
+        judge_config = JudgeModelConfig(base_url="http://judge.test/v1", model_name="mock-judge")
+        await AccuracyRunner()._run(test_id, judge_config)
+        await http_client_registry.aclose()
+
+    asyncio.run(scenario())
+    assert threads["load"] != threads["loop"] and threads["fail"] != threads["loop"]
+    with session_factory() as db:
+        assert db.get(AccuracyTest, test_id).status == "failed"
+
+
+def test_cached_results_reused(session_factory):
+    """评测输入相同的第二次评测从数据库中的缓存取得全部评分，不调用评测模型"""
+    settings = {"concurrency": 4, "batch_size": 5}
+    first_id = _create_test(session_factory, 12, settings)
+    assert asyncio.run(_run_with_judge_server(first_id))["requests"] == 12
+
+    # 清空进程内LRU，第二次评测只能命中数据库中的缓存
+    judge_cache.clear()
+    second_id = _create_test(session_factory, 12, settings)
+    assert asyncio.run(_run_with_judge_server(second_id))["requests"] == 0
+
+    with session_factory() as db:
+        second = db.get(AccuracyTest, second_id)
+        assert second.status == "completed"
+        assert second.results_summary["judge_cache"]["hits"] == 12
+        assert second.results_summary["overall_score"] == db.get(AccuracyTest, first_id).results_summary["overall_score"]
+
+
+def test_batched_and_single_results_cached_separately(session_factory):
+    """批量评测与逐项评测的提示词不同，评分分开缓存，逐项评测不会命中批量评测的结果"""
+    batched = {"concurrency": 2, "batch_size": 5, "judge_batch_size": 5, "max_attempts": 5}
+    first_id = _create_test(session_factory, 20, batched)
+    # 按概率省略批量回复中的评测项，使部分评测项回退为逐项评测
+    asyncio.run(_run_with_judge_server(first_id, {"malformed_rate": 0.3}))
+    with session_factory() as db:
+        items = db.query(AccuracyTestItem).filter(
+            AccuracyTestItem.evaluation_id == first_id, AccuracyTestItem.status == "ai_completed"
+        ).all()
+        from_batch = sum(1 for item in items if "batch_index" in item.ai_raw_response)
+        from_single = len(items) - from_batch
+    assert from_batch > 0 and from_single > 0
+
+    judge_cache.clear()
+    single_id = _create_test(session_factory, 20, {"concurrency": 2, "batch_size": 5})
+    stats = asyncio.run(_run_with_judge_server(single_id))
+    assert stats["requests"] == 20 - from_single
+
+    judge_cache.clear()
+    batched_id = _create_test(session_factory, 20, batched)
+    asyncio.run(_run_with_judge_server(batched_id))
+    with session_factory() as db:
+        assert db.get(AccuracyTest, single_id).results_summary["judge_cache"]["hits"] == from_single
+        assert db.get(AccuracyTest, batched_id).results_summary["judge_cache"]["hits"] == from_batch
+
+
+def test_judging_continues_while_results_are_written(session_factory, monkeypatch):
+    """写库期间其他工作协程继续评测，写库本身串行执行"""
+    test_id = _create_test(session_factory, 60, {"concurrency": 4, "batch_size": 5, "use_cache": False})
+    judged = {"count": 0}
+    writes = {"active": 0, "max_active": 0, "judged_during_write": []}
+    lock = threading.Lock()
+
+    original_judge_item = AccuracyRunner._judge_item
+    original_flush = AccuracyRunner._flush
+
+    async def counting_judge_item(self, *args, **kwargs):
+        outcome = await original_judge_item(self, *args, **kwargs)
+        judged["count"] += 1
+        return outcome
+
+    def slow_flush(self, *args, **kwargs):
+        with lock:
+            writes["active"] += 1
+            writes["max_active"] = max(writes["max_active"], writes["active"])
+        before = judged["count"]
+        time.sleep(0.3)
+        writes["judged_during_write"].append(judged["count"] - before)
+        original_flush(self, *args, **kwargs)
+        with lock:
+            writes["active"] -= 1
+
+    monkeypatch.setattr(AccuracyRunner, "_judge_item", counting_judge_item)
+    monkeypatch.setattr(AccuracyRunner, "_flush", slow_flush)
+    asyncio.run(_run_with_judge_server(test_id))
+
+    assert writes["max_active"] == 1
+    # 评测请求约10ms，写库300ms内其余工作协程应评测远多于并发数的评测项
+    assert max(writes["judged_during_write"]) > 8
+    with session_factory() as db:
+        test = db.get(AccuracyTest, test_id)
+        assert test.status == "completed" and test.processed_questions == 60
+
+
+def test_incremental_test_judges_changed_items_only(session_factory):
+    """增量评测复制未变化评测项的评分，只把回答有变化或没有内容摘要的评测项交给服务端评测"""
+    settings = {"concurrency": 2, "batch_size": 5, "use_cache": False}
+    base_id = _create_test(session_factory, 10, settings)
+    asyncio.run(_run_with_judge_server(base_id))
+
+    with session_factory() as db:
+        base = db.get(AccuracyTest, base_id)
+        changed = db.query(AccuracyTestItem).filter(
+            AccuracyTestItem.evaluation_id == base_id, AccuracyTestItem.sequence_number == 1
+        ).one()
+        db.get(RagAnswer, changed.rag_answer_id).answer = "新回答"
+        # 没有记录内容摘要的评测项无法确认评分对应的内容，即使内容未变化也重新评测
+        unhashed = db.query(AccuracyTestItem).filter(
+            AccuracyTestItem.evaluation_id == base_id, AccuracyTestItem.sequence_number == 2
+        ).one()
+        unhashed.item_metadata = {key: value for key, value in unhashed.item_metadata.items() if key != "content_hash"}
+        db.commit()
+
+        service = AccuracyService(db)
+        data = AccuracyTestCreate(
+            project_id=base.project_id,
+            dataset_id=base.dataset_id,
+            name="incremental",
+            evaluation_type="ai",
+            scoring_method="three_scale",
+            dimensions=DIMENSIONS,
+            version="v1",
+            batch_settings=settings,
+            base_test_id=base.id,
+        )
+        # 未声明评测模型时无法确认与基准测试一致
+        with pytest.raises(ValueError, match="model_name"):
+            service.create_test(data, user_id=base.created_by)
+        derived = service.create_test(
+            data.model_copy(update={"model_config_test": {"model_name": "mock-judge"}}), user_id=base.created_by
+        )
+        assert derived.processed_questions == 8
+
+        # 浏览器端执行和更换评测模型都会使复制的评分与新评分不可比
+        with pytest.raises(ValueError, match="服务端"):
+            service.check_incremental_start(derived, None)
+        with pytest.raises(ValueError, match="不一致"):
+            service.check_incremental_start(
+                derived, JudgeModelConfig(base_url="http://judge.test/v1", model_name="other-judge")
+            )
+        derived.status = "running"
+        db.commit()
+        derived_id = str(derived.id)
+
+    assert asyncio.run(_run_with_judge_server(derived_id))["requests"] == 2
+    with session_factory() as db:
+        derived = db.get(AccuracyTest, derived_id)
+        assert derived.status == "completed" and derived.success_questions == 10
+        assert derived.model_config_test["base_test_id"] == base_id
@@ -0,0 +1,87 @@
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.models.dataset import Dataset
+from app.models.performance import PerformanceTest
+from app.models.project import Project
+from app.models.question import Question
+from app.models.rag_answer import RagAnswer
+from app.models.user import User
+from app.schemas.rag_answer import PerformanceAnswerItem
+from app.services.performance_service import performance_service
+from app.services.rag_service import RagService, decode_chunk_offsets, encode_chunk_offsets, valid_chunk_offsets
+from benchmarks.datagen import create_benchmark_engine, prepare_schema
+
+
+def test_chunk_offsets_round_trip():
+    offsets = [0.1204, 0.15, 0.15, 0.9]
+    item = PerformanceAnswerItem(question_id="q", chunk_offsets=offsets)
+    assert decode_chunk_offsets(encode_chunk_offsets(item.chunk_offsets)).tolist() == [120, 150, 150, 900]
+
+
+@pytest.mark.parametrize("offsets", [[-0.1, 0.2], [0.3, 0.2], [0.1, float("nan")], [0.1, float("inf")]])
+def test_invalid_chunk_offsets_detected(offsets):
+    assert not valid_chunk_offsets(offsets)
+    assert valid_chunk_offsets([0.0, 0.1, 0.1, 0.5])
+
+
+def test_invalid_chunk_offsets_rejected_per_row(tmp_path):
+    """分片到达时间不合法的记录单独标记为 invalid_chunk_offsets，同批其他记录正常写入"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'answers.db'}", use_insertmanyvalues=False)
+    prepare_schema(engine)
+    with Session(engine) as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        project = Project(user_id=user.id, name="p")
+        dataset = Dataset(user_id=user.id, name="d")
+        db.add_all([project, dataset])
+        db.flush()
+        questions = [Question(dataset_id=dataset.id, question_text=f"问题{index}", standard_answer="答案") for index in range(3)]
+        test = PerformanceTest(name="t", project_id=project.id, dataset_id=dataset.id, concurrency=1, version="v1")
+        db.add_all([*questions, test])
+        db.commit()
+
+        items = [
+            PerformanceAnswerItem(question_id=str(questions[0].id), answer="a", total_response_time=0.5,
+                                  chunk_offsets=[0.1, 0.2]),
+            PerformanceAnswerItem(question_id=str(questions[1].id), answer="b", total_response_time=0.5,
+                                  chunk_offsets=[0.3, 0.2]),
+            # 失败的请求不保存分片到达时间，不做校验
+            PerformanceAnswerItem(question_id=str(questions[2].id), success=False, chunk_offsets=[-1.0]),
+        ]
+        result = RagService(db).bulk_create_performance_answers(test, items)
+
+        assert [row["status"] for row in result["results"]] == ["created", "invalid_chunk_offsets", "created"]
+        assert result["success_count"] == 2 and result["failed_count"] == 1
+        assert db.query(RagAnswer).filter(RagAnswer.performance_test_id == str(test.id)).count() == 2
+    engine.dispose()
+
+
+def test_empty_chunk_offsets_allowed():
+    assert PerformanceAnswerItem(question_id="q", chunk_offsets=[]).chunk_offsets == []
+    assert encode_chunk_offsets([]) is None
+
+
+def test_inter_token_latency_skips_negative_gaps():
+    """历史数据中的负分片间隔不参与ITL统计"""
+    engine = create_benchmark_engine("sqlite://")
+    prepare_schema(engine)
+    rows = [
+        {"id": str(uuid.uuid4()), "question_id": str(uuid.uuid4()), "answer": "", "collection_method": "api",
+         "chunk_offsets": data}
+        for data in (
+            encode_chunk_offsets([0.1, 0.12, 0.15]),
+            np.array([100, -30, 40], dtype="<i4").tobytes(),
+        )
+    ]
+    with Session(engine) as db:
+        db.execute(insert(RagAnswer), rows)
+        stats = performance_service._calculate_inter_token_latency(db)
+    assert stats["samples"] == 3
+    assert stats["min"] == pytest.approx(0.02)
+    assert stats["max"] == pytest.approx(0.04)
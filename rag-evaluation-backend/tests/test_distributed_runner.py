@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import fakeredis
+import pytest
+
+from app.schemas.rag_answer import ApiRequestConfig
+from app.services import distributed_runner
+from app.services.distributed_runner import (
+    DistributedCoordinator,
+    DistributedWorker,
+    _LeasedBatch,
+    lease_key,
+    test_keys as redis_keys,
+)
+from app.services.live_metrics import LiveTestMetrics
+from app.services.result_writer import build_answer_row
+
+TEST_ID = "test-distributed"
+API_CONFIG = ApiRequestConfig(endpoint_url="http://rag.test/api", request_template={"query": "{{question}}"})
+
+
+class _CollectingWriter:
+    """代替ResultWriter，只收集协调端写入的回答行"""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    def put(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+
+
+def _result(question_text: str) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "answer": f"回答:{question_text}",
+        "error": None,
+        "error_class": None,
+        "raw_response": None,
+        "character_count": 8,
+        "first_byte_time": 0.005,
+        "first_response_time": 0.01,
+        "total_response_time": 0.02,
+        "generation_time": 0.01,
+        "characters_per_second": 800.0,
+        "chunk_offsets": None,
+        "attempts": 1,
+        "attempt_errors": [],
+    }
+
+
+@pytest.fixture
+def rag_calls(monkeypatch):
+    """替换被测RAG请求，记录每个问题被请求的次数；delay为每次请求的耗时"""
+    calls: Dict[str, Any] = {"count": {}, "delay": 0.001}
+
+    async def fake_request(client, question_text, api_config, max_attempts, semaphore=None):
+        calls["count"][question_text] = calls["count"].get(question_text, 0) + 1
+        await asyncio.sleep(calls["delay"])
+        return _result(question_text)
+
+    monkeypatch.setattr(distributed_runner, "request_rag_answer_with_retry", fake_request)
+    return calls
+
+
+def _questions(count: int):
+    return [(index + 1, f"q-{index}", f"问题{index}") for index in range(count)]
+
+
+async def _run_test(
+    server, questions, *, workers=3, concurrency=2, batch_size=10, lease_seconds=1, before_workers=None
+):
+    """在同一事件循环中运行协调端和多个工作节点，返回 (分布式统计, 写入的行, Redis客户端)"""
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    writer = _CollectingWriter()
+    coordinator = DistributedCoordinator(client, lease_seconds=lease_seconds)
+    run = asyncio.create_task(coordinator.run(
+        TEST_ID, questions, API_CONFIG,
+        concurrency=concurrency, max_attempts=1, version="v1", batch_size=batch_size,
+        writer=writer, live=LiveTestMetrics(TEST_ID)
+    ))
+    while not await client.llen(redis_keys(TEST_ID)["pending"]):
+        await asyncio.sleep(0.01)
+    if before_workers is not None:
+        await before_workers(client)
+
+    nodes = [
+        DistributedWorker(
+            fakeredis.FakeAsyncRedis(server=server, decode_responses=True), worker_id=f"w{index}", poll_interval=0.05
+        )
+        for index in range(workers)
+    ]
+    tasks = [asyncio.create_task(node.run()) for node in nodes]
+    try:
+        summary = await asyncio.wait_for(run, timeout=30)
+    finally:
+        for node in nodes:
+            node.stop()
+        await asyncio.gather(*tasks)
+    return summary["distributed"], writer.rows, client
+
+
+def test_workers_split_batches(rag_calls):
+    """多个工作节点分批领取，每个问题只执行一次，结束后清理Redis中的键"""
+    questions = _questions(95)
+
+    async def scenario():
+        stats, rows, client = await _run_test(fakeredis.FakeServer(), questions)
+        assert await client.keys("perf:*") == []
+        return stats, rows
+
+    stats, rows = asyncio.run(scenario())
+    assert sorted(row["sequence_number"] for row in rows) == list(range(1, 96))
+    assert all(count == 1 for count in rag_calls["count"].values()) and len(rag_calls["count"]) == 95
+    assert stats["batches"] == 10 and stats["requeued_batches"] == 0
+    assert sum(worker["batches"] for worker in stats["workers"]) == 10
+    assert sum(worker["processed_questions"] for worker in stats["workers"]) == 95
+    assert stats["response_time"]["total_time"]["samples"] == 95
+
+
+def test_heartbeat_renews_lease(rag_calls):
+    """请求耗时超过租约时长时，心跳续租使批次不会被重新入队"""
+    rag_calls["delay"] = 2.2
+    observed = {}
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        probe = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+        async def watch_lease():
+            while not rag_calls["count"]:
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(1.5)
+            observed["owner"] = await probe.get(lease_key(TEST_ID, 0))
+            observed["ttl"] = await probe.ttl(lease_key(TEST_ID, 0))
+
+        watcher = asyncio.create_task(watch_lease())
+        result = await _run_test(server, _questions(1), workers=1, concurrency=1, batch_size=1, lease_seconds=1)
+        await watcher
+        return result
+
+    stats, rows, _ = asyncio.run(scenario())
+    assert observed["owner"] == "w0" and 0 < observed["ttl"] <= 1
+    assert stats["requeued_batches"] == 0
+    assert rag_calls["count"] == {"问题0": 1}
+    assert len(rows) == 1
+
+
+def test_expired_lease_requeued(rag_calls):
+    """领取批次后失联的节点不再续租，租约过期后批次由其他节点重新执行"""
+    questions = _questions(40)
+
+    async def lost_worker(client):
+        keys = redis_keys(TEST_ID)
+        raw = await client.lmove(keys["pending"], keys["processing"], "LEFT", "RIGHT")
+        await client.set(lease_key(TEST_ID, json.loads(raw)["id"]), "lost", ex=1)
+
+    start = time.monotonic()
+    stats, rows, _ = asyncio.run(
+        _run_test(fakeredis.FakeServer(), questions, lease_seconds=1, before_workers=lost_worker)
+    )
+    assert stats["requeued_batches"] == 1
+    assert sorted(row["sequence_number"] for row in rows) == list(range(1, 41))
+    assert all(count == 1 for count in rag_calls["count"].values())
+    assert "lost" not in {worker["worker_id"] for worker in stats["workers"]}
+    # 租约1秒过期后，再经过1秒租约缺失判定才重新入队
+    assert time.monotonic() - start >= 2
+
+
+def test_duplicate_batch_results_deduplicated(rag_calls):
+    """重新入队的批次被原节点和新节点各交回一次时，协调端按批次ID只采用第一份结果"""
+    questions = _questions(40)
+
+    async def slow_worker_returns_late(client):
+        keys = redis_keys(TEST_ID)
+        raw = await client.lmove(keys["pending"], keys["processing"], "LEFT", "RIGHT")
+        batch = _LeasedBatch(raw)
+        await client.set(lease_key(TEST_ID, batch.id), "slow", ex=1)
+        # 等到租约过期、批次被重新入队后，原节点才交回结果
+        while raw not in await client.lrange(keys["pending"], 0, -1):
+            await asyncio.sleep(0.05)
+        for sequence_number, question_id, question_text in batch.questions:
+            result = _result(question_text)
+            batch.add(build_answer_row(
+                question_id, result, version="v1", performance_test_id=TEST_ID, sequence_number=sequence_number
+            ), result)
+        await DistributedWorker(client, worker_id="slow")._submit(TEST_ID, batch)
+
+    stats, rows, _ = asyncio.run(
+        _run_test(fakeredis.FakeServer(), questions, lease_seconds=1, before_workers=slow_worker_returns_late)
+    )
+    assert stats["requeued_batches"] == 1
+    # 新节点同样执行了该批次，但交回的结果被丢弃
+    assert len(rag_calls["count"]) == 40 and all(count == 1 for count in rag_calls["count"].values())
+    assert sorted(row["sequence_number"] for row in rows) == list(range(1, 41))
+    workers = {worker["worker_id"]: worker for worker in stats["workers"]}
+    assert workers["slow"]["batches"] == 1
+    assert sum(worker["batches"] for worker in workers.values()) == 4
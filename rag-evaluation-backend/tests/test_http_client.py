@@ -0,0 +1,85 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+import uvicorn
+
+from app.core import http_client
+from app.core.http_client import HttpClientRegistry
+from benchmarks.mock_rag_server import create_app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _with_server(scenario, config=None):
+    """在同一事件循环中启动模拟RAG服务并执行scenario(base_url)"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_app({"ttft": 0.05, "token_rate": 0, "output_tokens": 20, **(config or {})}),
+        host="127.0.0.1", port=port, log_level="warning"
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        return await scenario(f"http://127.0.0.1:{port}")
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def test_in_flight_counts_until_response_closed():
+    """在途请求数从发出请求计到响应关闭，流式读取、出错的请求结束后都归零"""
+    registry = HttpClientRegistry()
+
+    async def scenario(base_url):
+        client = registry.get_client(base_url)
+        entry = registry._get_entry(base_url, None)
+
+        tasks = [asyncio.create_task(client.post(f"{base_url}/query", json={"query": "q"})) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        assert entry.in_flight == 3
+        await asyncio.gather(*tasks)
+        assert entry.in_flight == 0
+
+        async with client.stream("POST", f"{base_url}/query", json={"query": "q", "stream": True}) as response:
+            assert entry.in_flight == 1
+            async for _ in response.aiter_bytes():
+                pass
+        assert entry.in_flight == 0
+
+        with pytest.raises(httpx.ConnectError):
+            await client.get(f"http://127.0.0.1:{_free_port()}/")
+        await registry.aclose()
+        return entry
+
+    entry = asyncio.run(_with_server(scenario))
+    assert entry.in_flight == 0 and entry.requests == 5
+    assert entry.client.is_closed
+
+
+def test_retired_pool_closed_after_in_flight_requests(monkeypatch):
+    """被更大的池替换的旧池等在途请求完成后用aclose()关闭，在途请求正常完成"""
+    monkeypatch.setattr(http_client, "RETIRED_POOL_CHECK_SECONDS", 0.05)
+    registry = HttpClientRegistry()
+
+    async def scenario(base_url):
+        old = registry._get_entry(base_url, None)
+        request = asyncio.create_task(old.client.post(f"{base_url}/query", json={"query": "q"}))
+        await asyncio.sleep(0.01)
+        new = registry._get_entry(base_url, old.pool_size * 2)
+        assert new is not old and not old.client.is_closed
+        response = await request
+        while not old.client.is_closed:
+            await asyncio.sleep(0.05)
+        await registry.aclose()
+        return response, new
+
+    response, new = asyncio.run(_with_server(scenario, {"ttft": 0.2}))
+    assert response.status_code == 200
+    assert new.client.is_closed
@@ -0,0 +1,124 @@
+import random
+from collections import Counter
+from typing import List
+
+import numpy as np
+import pytest
+
+from app.services import lexical_metrics
+from app.services.lexical_metrics import CHRF_BETA, CHRF_ORDER, METRIC_NAMES, compute_lexical_metrics, tokenize
+
+
+def _f_score(precision: float, recall: float, beta: float = 1.0) -> float:
+    denominator = beta * beta * precision + recall
+    return (1 + beta * beta) * precision * recall / denominator if denominator > 0 else 0.0
+
+
+def _unigram_f1(reference: List[str], candidate: List[str]) -> float:
+    if not reference and not candidate:
+        return 1.0
+    overlap = sum((Counter(reference) & Counter(candidate)).values())
+    precision = overlap / len(candidate) if candidate else 0.0
+    recall = overlap / len(reference) if reference else 0.0
+    return _f_score(precision, recall)
+
+
+def _lcs_length(reference: List[str], candidate: List[str]) -> int:
+    previous = [0] * (len(candidate) + 1)
+    for token in reference:
+        current = [0]
+        for index, other in enumerate(candidate):
+            current.append(previous[index] + 1 if token == other else max(previous[index + 1], current[index]))
+        previous = current
+    return previous[-1]
+
+
+def _chrf(reference: str, candidate: str) -> float:
+    if not reference and not candidate:
+        return 1.0
+    precisions, recalls = [], []
+    for n in range(1, CHRF_ORDER + 1):
+        ref_ngrams = Counter(reference[i:i + n] for i in range(len(reference) - n + 1))
+        cand_ngrams = Counter(candidate[i:i + n] for i in range(len(candidate) - n + 1))
+        overlap = sum((ref_ngrams & cand_ngrams).values())
+        # 只对存在该阶n-gram的一方计入平均
+        if cand_ngrams:
+            precisions.append(overlap / sum(cand_ngrams.values()))
+        if ref_ngrams:
+            recalls.append(overlap / sum(ref_ngrams.values()))
+    precision = sum(precisions) / len(precisions) if precisions else 0.0
+    recall = sum(recalls) / len(recalls) if recalls else 0.0
+    return _f_score(precision, recall, CHRF_BETA)
+
+
+def _naive_metrics(reference_text: str, candidate_text: str) -> dict:
+    """逐条按定义计算的参考实现"""
+    reference, candidate = tokenize(reference_text), tokenize(candidate_text)
+    reference_chars, candidate_chars = "".join(reference), "".join(candidate)
+    lcs = _lcs_length(reference, candidate)
+    rouge_l = 1.0 if not reference and not candidate else _f_score(
+        lcs / len(candidate) if candidate else 0.0, lcs / len(reference) if reference else 0.0
+    )
+    return {
+        "exact_match": float(reference == candidate),
+        "token_f1": _unigram_f1(reference, candidate),
+        "char_f1": _unigram_f1(list(reference_chars), list(candidate_chars)),
+        "rouge_l": rouge_l,
+        "chrf": _chrf(reference_chars, candidate_chars),
+    }
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    words = ["检索", "增强", "生成", "模型", "回答", "RAG", "system", "answer", "token", "42", "，", "。", " ", "！"]
+    return "".join(rng.choice(words) for _ in range(length))
+
+
+def _cases(rng: random.Random, count: int):
+    references, candidates = [], []
+    for _ in range(count):
+        reference = _random_text(rng, rng.choice([0, 1, 5, 30, 120]))
+        kind = rng.random()
+        if kind < 0.15:
+            candidate = reference
+        elif kind < 0.5:
+            # 在参考答案基础上局部改写，使重合度分布在0-1之间
+            candidate = reference[:len(reference) // 2] + _random_text(rng, rng.randint(0, 20))
+        else:
+            candidate = _random_text(rng, rng.choice([0, 1, 5, 30, 120]))
+        references.append(reference)
+        candidates.append(candidate)
+    references += [None, "", "Hello, World!", "ＲＡＧ　系统"]
+    candidates += [None, "回答", "hello world", "rag系统"]
+    return references, candidates
+
+
+@pytest.mark.parametrize("budget", [lexical_metrics.LCS_MEMORY_BUDGET, 64 * 1024])
+def test_metrics_match_naive_reference(monkeypatch, budget):
+    """向量化实现与逐条计算的参考实现一致；内存预算很小时ROUGE-L按多个小块计算，结果不变"""
+    monkeypatch.setattr(lexical_metrics, "LCS_MEMORY_BUDGET", budget)
+    references, candidates = _cases(random.Random(7), 300)
+
+    metrics = compute_lexical_metrics(references, candidates)
+
+    expected = [_naive_metrics(reference or "", candidate or "") for reference, candidate in zip(references, candidates)]
+    for name in METRIC_NAMES:
+        assert metrics[name] == pytest.approx([row[name] for row in expected], abs=1e-9), name
+
+
+def test_chunks_respect_memory_budget(monkeypatch):
+    """每块按估算大小不超过内存预算，单个评测项超出预算时单独成块"""
+    monkeypatch.setattr(lexical_metrics, "LCS_MEMORY_BUDGET", 256 * 1024)
+    references, candidates = _cases(random.Random(11), 500)
+    vocabulary = {}
+    reference = lexical_metrics._encode([tokenize(text) for text in references], vocabulary)
+    candidate = lexical_metrics._encode([tokenize(text) for text in candidates], vocabulary)
+
+    chunks = list(lexical_metrics._lcs_chunks(reference, candidate, len(references)))
+
+    assert sorted(np.concatenate(chunks).tolist()) == list(range(len(references)))
+    for rows in chunks:
+        words = max(1, (int(candidate.lengths[rows].max()) + 63) // 64)
+        estimate = len(rows) * 8 * (
+            words * (int(candidate.lengths[rows].max()) + 1) + 4 * int(reference.lengths[rows].max())
+        )
+        assert len(rows) == 1 or estimate <= lexical_metrics.LCS_MEMORY_BUDGET
@@ -0,0 +1,43 @@
+from app.services.llm_judge import (
+    DEFAULT_PROMPT_TEMPLATE,
+    batch_prompt_template,
+    build_batch_judge_prompt,
+    parse_batch_judge_response,
+)
+from benchmarks.mock_llm_server import batch_judge_reply
+
+CUSTOM_TEMPLATE = """只关注数值是否一致，忽略措辞差异。
+问题: {{question}}
+参考: {{reference_answer}}
+回答: {{rag_answer}}
+评分范围: {{score_range}}
+评估维度: {{dimensions}}
+"""
+
+
+def test_batch_prompt_uses_test_template_as_rubric():
+    """批量提示词以测试的提示词模板为评分规则，评测项内容只出现在各评测项中"""
+    items = [("问题一 {{score_range}}", "答案一", "回答一"), ("问题二", "答案二", "回答二")]
+    prompt = build_batch_judge_prompt(items, "three_scale", ["准确性", "完整性"], CUSTOM_TEMPLATE)
+
+    rubric, sections = prompt.split("### 评测项 1", 1)
+    assert "只关注数值是否一致，忽略措辞差异。" in rubric
+    assert "评分范围: 0-2" in rubric and "评估维度: 准确性, 完整性" in rubric
+    assert "{{" not in rubric and "问题一" not in rubric
+    # 评测项内容中的占位符文本保持原样
+    assert "问题一 {{score_range}}" in sections and "### 评测项 2" in sections
+
+    evaluations = parse_batch_judge_response(batch_judge_reply(prompt), 2, "three_scale", ["准确性", "完整性"])
+    assert all(evaluation is not None for evaluation in evaluations)
+
+
+def test_batch_prompt_defaults_to_single_item_template():
+    prompt = build_batch_judge_prompt([("q", "a", "r")], "binary", ["accuracy"])
+    assert DEFAULT_PROMPT_TEMPLATE.splitlines()[0] in prompt
+
+
+def test_batch_cache_template_depends_on_test_template():
+    """批量评测的缓存模板随测试的提示词模板变化，且与逐项评测的模板不同"""
+    assert batch_prompt_template(CUSTOM_TEMPLATE) != batch_prompt_template(None)
+    assert batch_prompt_template(None) == batch_prompt_template(DEFAULT_PROMPT_TEMPLATE)
+    assert batch_prompt_template(CUSTOM_TEMPLATE) != CUSTOM_TEMPLATE
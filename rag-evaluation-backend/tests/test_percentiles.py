@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sqlalchemy import Column, Float, Integer, MetaData, Table, insert
+from sqlalchemy.orm import Session
+
+from app.services.performance_service import (
+    _sql_percentile_stats,
+    calculate_percentiles,
+    percentiles_from_counts,
+)
+
+
+def _assert_stats_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_percentiles_from_counts_matches_raw_data(seed):
+    """计数直方图的分位数与对原始数据计算的结果一致"""
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, rng.integers(1, 500), rng.integers(1, 3000))
+    _assert_stats_equal(percentiles_from_counts(np.bincount(data)), calculate_percentiles(data))
+
+
+@pytest.mark.parametrize("data", [[0], [7], [3, 3, 3], [0, 1000], [5, 1, 1, 9]])
+def test_percentiles_from_counts_small_samples(data):
+    data = np.array(data)
+    _assert_stats_equal(percentiles_from_counts(np.bincount(data)), calculate_percentiles(data))
+
+
+def test_percentiles_from_counts_empty():
+    assert percentiles_from_counts(np.zeros(10, dtype=np.int64)) is None
+
+
+@pytest.fixture
+def samples_table(pg_engine):
+    metadata = MetaData()
+    table = Table(
+        "test_percentile_samples",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("group_id", Integer),
+        Column("value", Float),
+    )
+    metadata.drop_all(pg_engine)
+    metadata.create_all(pg_engine)
+    yield table
+    metadata.drop_all(pg_engine)
+
+
+def test_sql_percentile_stats_matches_calculate_percentiles(pg_engine, samples_table):
+    """PostgreSQL的percentile_cont聚合与calculate_percentiles一致，空值和其他分组不参与统计"""
+    rng = np.random.default_rng(0)
+    groups = {group_id: rng.lognormal(0, 1, size) for group_id, size in enumerate([1, 2, 17, 1000, 5000])}
+    rows = [
+        {"group_id": group_id, "value": float(value)}
+        for group_id, values in groups.items()
+        for value in values
+    ]
+    rows += [{"group_id": group_id, "value": None} for group_id in groups]
+    with Session(pg_engine) as db:
+        db.execute(insert(samples_table), rows)
+        db.commit()
+        for group_id, values in groups.items():
+            actual = _sql_percentile_stats(db, samples_table.c.value, samples_table.c.group_id == group_id)
+            _assert_stats_equal(actual, calculate_percentiles(values))
+        assert _sql_percentile_stats(db, samples_table.c.value, samples_table.c.group_id == -1) is None
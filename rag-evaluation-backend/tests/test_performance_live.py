@@ -0,0 +1,103 @@
+import asyncio
+import json
+import socket
+import uuid
+
+import httpx
+import pytest
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.api_v1.endpoints import performance as performance_endpoints
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app
+from app.models.performance import PerformanceTest
+from app.models.project import Project
+from app.models.user import User
+from app.services.live_metrics import live_metrics
+from benchmarks.datagen import prepare_schema
+
+
+@pytest.fixture
+def session_factory(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    prepare_schema(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(performance_endpoints, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _create_test(factory, status: str):
+    with factory() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        project = Project(user_id=user.id, name="p")
+        db.add(project)
+        db.flush()
+        test = PerformanceTest(name="live", project_id=project.id, concurrency=1, status=status, config={})
+        db.add(test)
+        db.commit()
+        return str(test.id), create_access_token(subject=str(user.id))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _with_app(scenario):
+    """在同一事件循环中启动应用并执行scenario(client)，推送需要真实的流式响应"""
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}{settings.API_V1_STR}", timeout=10) as client:
+            return await scenario(client)
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def _events(response):
+    async for line in response.aiter_lines():
+        if line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+
+def test_live_stream_does_not_hold_a_connection(session_factory):
+    """推送开始前会话已关闭，推送期间连接池中没有借出的连接"""
+    test_id, token = _create_test(session_factory, "running")
+    pool = session_factory.kw["bind"].pool
+    metrics = live_metrics.get_or_create(test_id)
+    metrics.record(True, 0.1, 0.2)
+
+    async def scenario(client):
+        headers = {"Authorization": f"Bearer {token}"}
+        async with client.stream("GET", f"/performance/{test_id}/live", headers=headers) as response:
+            events = _events(response)
+            first = await events.__anext__()
+            assert first["total_requests"] == 1 and not first["finished"]
+            assert pool.checkedout() == 0
+            live_metrics.finish(test_id)
+            assert (await events.__anext__())["finished"]
+
+    try:
+        asyncio.run(_with_app(scenario))
+    finally:
+        live_metrics.finish(test_id)
+
+
+def test_live_stream_requires_existing_test(session_factory):
+    _, token = _create_test(session_factory, "completed")
+
+    async def scenario(client):
+        return await client.get(f"/performance/{uuid.uuid4()}/live", headers={"Authorization": f"Bearer {token}"})
+
+    assert asyncio.run(_with_app(scenario)).status_code == 404
@@ -0,0 +1,195 @@
+import asyncio
+import functools
+import threading
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.dataset import Dataset
+from app.models.performance import PerformanceTest
+from app.models.project import Project
+from app.models.question import Question
+from app.models.rag_answer import RagAnswer
+from app.models.user import User
+from app.schemas.rag_answer import ApiRequestConfig
+from app.services import performance_runner as runner_module
+from app.services import result_writer as writer_module
+from app.services.live_metrics import LiveTestMetrics
+from app.services.performance_runner import PerformanceRunner, parse_load_config
+from app.services.performance_service import performance_service
+from app.services.result_writer import ResultWriter, build_answer_row
+from benchmarks.datagen import prepare_schema
+
+API_CONFIG = ApiRequestConfig(endpoint_url="http://rag.test/api", request_template={"query": "{{question}}"})
+
+
+class _CollectingWriter:
+    """代替ResultWriter，只收集写入的回答行"""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    def put(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+
+
+@pytest.fixture
+def rag_calls(monkeypatch):
+    """替换被测RAG请求，每次请求耗时10ms，记录发送的问题"""
+    calls: List[str] = []
+
+    async def fake_request(client, question_text, api_config, max_attempts, semaphore=None):
+        calls.append(question_text)
+        await asyncio.sleep(0.01)
+        return {
+            "success": True,
+            "answer": f"回答:{question_text}",
+            "error": None,
+            "error_class": None,
+            "raw_response": None,
+            "character_count": 8,
+            "first_byte_time": 0.005,
+            "first_response_time": 0.005,
+            "total_response_time": 0.01,
+            "generation_time": 0.005,
+            "characters_per_second": 800.0,
+            "chunk_offsets": None,
+            "attempts": 1,
+            "attempt_errors": [],
+        }
+
+    monkeypatch.setattr(runner_module, "request_rag_answer_with_retry", fake_request)
+    return calls
+
+
+@pytest.fixture
+def session_factory(monkeypatch, tmp_path):
+    """SQLite文件库，执行引擎和后写缓冲区在线程池中打开的会话也连接到同一个库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'performance.db'}", use_insertmanyvalues=False)
+    prepare_schema(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(runner_module, "SessionLocal", factory)
+    monkeypatch.setattr(writer_module, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _create_test(factory, count: int, config: Dict[str, Any]) -> str:
+    with factory() as db:
+        user = User(email=f"{uuid.uuid4().hex}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        project = Project(user_id=user.id, name="p")
+        dataset = Dataset(user_id=user.id, name="d")
+        db.add_all([project, dataset])
+        db.flush()
+        db.add_all([
+            Question(dataset_id=dataset.id, question_text=f"问题{index}", standard_answer=f"答案{index}")
+            for index in range(count)
+        ])
+        test = PerformanceTest(
+            name="server run", project_id=project.id, dataset_id=dataset.id,
+            concurrency=4, version="v1", status="running", config=config
+        )
+        db.add(test)
+        db.commit()
+        return str(test.id)
+
+
+def test_database_work_runs_off_the_event_loop(session_factory, rag_calls, monkeypatch):
+    """准备和完成测试的数据库操作在线程池中执行，测试结束后结果和进度都已写库"""
+    test_id = _create_test(session_factory, 30, {})
+    threads = {}
+    original_get = performance_service.get
+    original_complete = performance_service.complete_performance_test
+
+    def recording_get(db, id):
+        threads["get"] = threading.get_ident()
+        return original_get(db, id=id)
+
+    def recording_complete(db, **kwargs):
+        threads["complete"] = threading.get_ident()
+        return original_complete(db, **kwargs)
+
+    monkeypatch.setattr(performance_service, "get", recording_get)
+    monkeypatch.setattr(performance_service, "complete_performance_test", recording_complete)
+
+    async def scenario():
+        threads["loop"] = threading.get_ident()
+        await PerformanceRunner()._run(test_id, API_CONFIG, None)
+
+    asyncio.run(scenario())
+    assert threads["get"] != threads["loop"] and threads["complete"] != threads["loop"]
+    with session_factory() as db:
+        test = db.get(PerformanceTest, test_id)
+        assert test.status == "completed"
+        assert test.total_questions == test.processed_questions == test.success_questions == 30
+        assert db.query(RagAnswer).filter(RagAnswer.performance_test_id == test_id).count() == 30
+
+
+def test_staged_stages_run_full_duration_when_questions_run_out(rag_calls):
+    """阶段时长内可发送的请求数远多于问题数时，问题循环使用，每个阶段都持续完整时长"""
+    questions = [(index + 1, f"q-{index}", f"问题{index}") for index in range(5)]
+    load_config = parse_load_config({"stages": [
+        {"concurrency": 1, "duration_seconds": 0.3},
+        {"concurrency": 2, "duration_seconds": 0.3},
+        {"concurrency": 4, "duration_seconds": 0.3},
+    ]})
+    writer = _CollectingWriter()
+    test = SimpleNamespace(id="test-staged", version="v1")
+
+    summary = asyncio.run(PerformanceRunner()._run_staged(
+        None, writer, LiveTestMetrics(test.id), test, questions, API_CONFIG, load_config
+    ))
+
+    stages = summary["stages"]
+    assert [stage["concurrency"] for stage in stages] == [1, 2, 4]
+    for stage in stages:
+        assert stage["duration_seconds"] >= 0.3
+        assert stage["processed_questions"] > len(questions)
+    assert summary["questions_recycled"]
+    # 每个问题只有首次发送的结果写库
+    assert sorted(row["sequence_number"] for row in writer.rows) == [1, 2, 3, 4, 5]
+    assert len(rag_calls) == sum(stage["processed_questions"] for stage in stages)
+
+
+def test_progress_counts_only_inserted_rows(session_factory):
+    """租约过期重新入队的批次再次交回已写入的问题时，这些记录不计入进度，进度不超过问题总数"""
+    test_id = _create_test(session_factory, 4, {})
+    with session_factory() as db:
+        question_ids = [str(question.id) for question in db.query(Question).order_by(Question.question_text)]
+
+    def rows(indexes, failed=()):
+        result = {
+            "success": True, "answer": "回答", "error": None, "error_class": None, "raw_response": None,
+            "character_count": 2, "first_byte_time": 0.005, "first_response_time": 0.005,
+            "total_response_time": 0.01, "generation_time": 0.005, "characters_per_second": 200.0,
+            "chunk_offsets": None, "attempts": 1, "attempt_errors": [],
+        }
+        failure = {**result, "success": False, "answer": None, "error": "超时", "error_class": "timeout",
+                   "first_response_time": None, "total_response_time": None}
+        return [
+            build_answer_row(
+                question_ids[index], failure if index in failed else result,
+                version="v1", performance_test_id=test_id, sequence_number=index + 1
+            )
+            for index in indexes
+        ]
+
+    async def write(batch):
+        async with ResultWriter(on_flush=functools.partial(PerformanceRunner()._flush_progress, test_id)) as writer:
+            for row in batch:
+                writer.put(row)
+
+    # 原节点交回部分结果后失联，重新入队的批次由新节点完整执行并交回
+    asyncio.run(write(rows([0, 1])))
+    asyncio.run(write(rows([0, 1, 2, 3], failed={1, 3})))
+
+    with session_factory() as db:
+        test = db.get(PerformanceTest, test_id)
+        assert (test.processed_questions, test.success_questions, test.failed_questions) == (4, 3, 1)
+        assert db.query(RagAnswer).filter(RagAnswer.performance_test_id == test_id).count() == 4
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from app.services.performance_stats import COMPARE_PERCENTILES, bootstrap_percentiles
+
+N_RESAMPLES = 4000
+
+
+def _naive_bootstrap(data, levels, n_resamples, rng):
+    """逐组有放回重采样后直接计算分位数"""
+    resamples = rng.choice(data, size=(n_resamples, len(data)), replace=True)
+    return np.percentile(resamples, levels, axis=1)
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 30, 200, 1500])
+@pytest.mark.parametrize("distribution", ["lognormal", "integers"])
+def test_bootstrap_percentiles_matches_naive_resampling(size, distribution):
+    """顺序统计量抽样得到的分位数分布与逐组重采样的分布一致"""
+    rng = np.random.default_rng(size)
+    if distribution == "lognormal":
+        data = rng.lognormal(0, 1, size)
+    else:
+        # 含大量并列值
+        data = rng.integers(0, 20, size).astype(float)
+    sorted_data = np.sort(data)
+
+    fast = bootstrap_percentiles(sorted_data, COMPARE_PERCENTILES, N_RESAMPLES, np.random.default_rng(1))
+    naive = _naive_bootstrap(data, COMPARE_PERCENTILES, N_RESAMPLES, np.random.default_rng(2))
+    assert fast.shape == naive.shape == (len(COMPARE_PERCENTILES), N_RESAMPLES)
+
+    # 两组独立抽样只应相差抽样误差：经验分布函数的最大差(KS统计量)和均值、标准差都很接近
+    scale = max(float(np.ptp(data)), 1e-12)
+    # 两种算法插值的浮点误差会把同一取值分成两个点，取值点略微右移后再比较
+    grid = np.unique(np.concatenate([fast.ravel(), naive.ravel()])) + 1e-9 * scale
+    for level_fast, level_naive in zip(fast, naive):
+        assert level_fast.min() >= data.min() and level_fast.max() <= data.max()
+        cdf_fast = np.searchsorted(np.sort(level_fast), grid, side="right") / N_RESAMPLES
+        cdf_naive = np.searchsorted(np.sort(level_naive), grid, side="right") / N_RESAMPLES
+        assert np.max(np.abs(cdf_fast - cdf_naive)) < 0.05
+        assert level_fast.mean() == pytest.approx(level_naive.mean(), abs=0.02 * scale)
+        assert level_fast.std() == pytest.approx(level_naive.std(), abs=0.02 * scale)
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.rate_limiter import LLMRateLimiter
+
+BASE_URL = "http://judge.test/v1"
+MESSAGES = [{"role": "user", "content": "评分"}]
+
+
+@pytest.fixture
+def shared_limits(monkeypatch):
+    """系统配置 judge.test 的共享限额为每分钟1200次，令牌桶容量为1次"""
+    monkeypatch.setattr(settings, "LLM_RATE_LIMITS", {"judge.test": {"rpm": 1200}})
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_BURST_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "LLM_DEFAULT_RPM", 0)
+    monkeypatch.setattr(settings, "LLM_DEFAULT_TPM", 0)
+
+
+async def _send(limiter: LLMRateLimiter, count: int, **kwargs) -> float:
+    start = time.monotonic()
+    for _ in range(count):
+        async with limiter.limit(BASE_URL, "judge", "key", MESSAGES, **kwargs) as permit:
+            permit.record_usage({"completion_tokens": 5})
+    return time.monotonic() - start
+
+
+def _by_scope(limiter: LLMRateLimiter):
+    return {entry["scope"]: entry for entry in limiter.stats()}
+
+
+def test_caller_limits_do_not_change_shared_limit(shared_limits):
+    """调用方传入的限额或0都不会修改、取消其他调用方共用的限额"""
+    limiter = LLMRateLimiter()
+    asyncio.run(_send(limiter, 1, rpm=60))
+    asyncio.run(_send(limiter, 1, rpm=0, tpm=0))
+    asyncio.run(_send(limiter, 1))
+
+    stats = _by_scope(limiter)
+    assert stats["shared"]["rpm"] == 1200 and stats["shared"]["requests"] == 3
+    assert stats["caller"]["rpm"] == 60 and stats["caller"]["requests"] == 1
+
+
+def test_stricter_limit_applies(shared_limits):
+    """请求须同时取得共享限额和调用方限额的令牌，较严格的一方决定等待时间"""
+    limiter = LLMRateLimiter()
+    # 调用方限额比共享限额宽松时仍按共享限额每50ms放行一次
+    assert asyncio.run(_send(limiter, 5, rpm=60000)) >= 0.15
+
+    # 调用方限额更严格时按调用方限额每200ms放行一次
+    assert asyncio.run(_send(limiter, 3, rpm=300, tpm=0)) >= 0.3
+    stats = limiter.stats()
+    assert {(entry["scope"], entry["rpm"]) for entry in stats} == {("shared", 1200), ("caller", 60000), ("caller", 300)}
+    assert sum(entry["requests"] for entry in stats if entry["scope"] == "shared") == 8
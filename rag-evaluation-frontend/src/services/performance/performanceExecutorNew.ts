@@ -73,9 +73,15 @@ interface TestResult {
   /** 每秒处理字符数 */
   charactersPerSecond?: number;
 
+  /** 各响应分片相对请求开始的到达时间（秒） */
+  chunkOffsets?: number[];
+
   /** 错误详情（如果失败） */
   errorDetails?: any;
 
+  /** 请求完成时间（ISO格式UTC时间），用于后端还原测试时间线 */
+  completedAt?: string;
+
   /** 响应内容 */
   response?: string;
 
@@ -124,6 +130,7 @@ const executeRagRequest = async (question: any, test: any): Promise<TestResult>
     let totalChars = 0;
     let content = '';
     let lastChunkTime = startTime;
+    const chunkOffsets: number[] = [];
 
     // 使用RAG请求服务进行流式请求，并收集性能数据
     for await (const chunk of ragRequestService.streamRequest(test.rag_config, questionText)) {
@@ -134,6 +141,9 @@ const executeRagRequest = async (question: any, test: any): Promise<TestResult>
         firstTokenTime = currentTime - startTime;
       }
 
+      // 记录分片到达时间，用于计算分片间隔
+      chunkOffsets.push((currentTime - startTime) / 1000);
+
       // 累计响应内容和字符数
       content += chunk;
       totalChars += chunk.length;
@@ -151,6 +161,8 @@ const executeRagRequest = async (question: any, test: any): Promise<TestResult>
       totalResponseTime: totalTime / 1000, // 转换为秒
       characterCount: totalChars,
       charactersPerSecond: totalChars / (totalTime / 1000),
+      chunkOffsets,
+      completedAt: new Date().toISOString(),
       response: content,
       version: question.version,
       performance_test_id: question.performance_test_id,
@@ -163,37 +175,54 @@ const executeRagRequest = async (question: any, test: any): Promise<TestResult>
       questionId: question.id,
       success: false,
       errorDetails: { message: error.message },
+      completedAt: new Date().toISOString(),
       sequenceNumber: question.sequence_number || 0
     };
   }
 };
 
+/** 批量写入测试结果的条数阈值 */
+const RESULT_FLUSH_SIZE = 50;
+
+/** 批量写入测试结果的时间阈值（毫秒） */
+const RESULT_FLUSH_INTERVAL = 1000;
+
 /**
- * 保存测试结果到后端
+ * 批量保存测试结果到后端
  *
- * 将单个问题的测试结果保存到后端数据库，包括性能指标和响应内容。
+ * 将一批问题的测试结果通过批量接口写入后端数据库，包括性能指标和响应内容。
  * 即使保存失败，也不会中断测试流程，只会记录错误日志。
  *
  * @param {any} test - 测试配置对象
- * @param {TestResult} result - 测试结果对象
+ * @param {TestResult[]} results - 测试结果列表
  * @returns {Promise<void>}
  */
-const saveTestResult = async (test: any, result: TestResult): Promise<void> => {
+const saveTestResults = async (test: any, results: TestResult[]): Promise<void> => {
   try {
-    // 向后端API发送测试结果数据
-    await api.post('/v1/rag-answers', {
+    // 向后端批量接口发送测试结果数据
+    const response: any = await api.post('/v1/rag-answers/bulk', {
       performance_test_id: test.id,
-      question_id: result.questionId,
-      first_response_time: result.firstResponseTime,
-      total_response_time: result.totalResponseTime,
-      character_count: result.characterCount,
-      characters_per_second: result.charactersPerSecond,
-      answer: result.response,
-      version: test.version,
-      sequence_number: result.sequenceNumber,
-      success: result.success,
-      error_details: result.errorDetails
+      items: results.map(result => ({
+        question_id: result.questionId,
+        first_response_time: result.firstResponseTime,
+        total_response_time: result.totalResponseTime,
+        character_count: result.characterCount,
+        characters_per_second: result.charactersPerSecond,
+        chunk_offsets: result.chunkOffsets,
+        completed_at: result.completedAt,
+        answer: result.response,
+        version: test.version,
+        sequence_number: result.sequenceNumber,
+        success: result.success,
+        error_details: result.errorDetails
+      }))
     });
+
+    // 记录未写入的结果
+    const rejected = (response?.results || []).filter((item: any) => !item.success);
+    if (rejected.length > 0) {
+      console.warn(`有 ${rejected.length} 条测试结果未写入:`, rejected);
+    }
   } catch (error) {
     // 记录错误但不中断测试流程
     console.error('保存测试结果失败:', error);
@@ -201,6 +230,45 @@ const saveTestResult = async (test: any, result: TestResult): Promise<void> => {
   }
 };
 
+/**
+ * 创建测试结果写入器
+ *
+ * 缓存测试结果，每满 RESULT_FLUSH_SIZE 条或每隔 RESULT_FLUSH_INTERVAL 毫秒批量写入一次，
+ * 多次写入按顺序串行执行。
+ *
+ * @param {any} test - 测试配置对象
+ * @returns 包含 add 和 flush 方法的写入器
+ */
+const createResultWriter = (test: any) => {
+  let pending: TestResult[] = [];
+  let timer: ReturnType<typeof setTimeout> | null = null;
+  let writing: Promise<void> = Promise.resolve();
+
+  const flush = (): Promise<void> => {
+    if (timer) {
+      clearTimeout(timer);
+      timer = null;
+    }
+    if (pending.length > 0) {
+      const batch = pending;
+      pending = [];
+      writing = writing.then(() => saveTestResults(test, batch));
+    }
+    return writing;
+  };
+
+  const add = (result: TestResult) => {
+    pending.push(result);
+    if (pending.length >= RESULT_FLUSH_SIZE) {
+      flush();
+    } else if (!timer) {
+      timer = setTimeout(flush, RESULT_FLUSH_INTERVAL);
+    }
+  };
+
+  return { add, flush };
+};
+
 /**
  * 使用缓冲区管理器实现有限并发的测试执行
  *
@@ -219,6 +287,7 @@ const executeWithBufferedQuestions = async (
 ): Promise<void> => {
   // 存储所有测试结果
   const results: TestResult[] = [];
+  const resultWriter = createResultWriter(test);
   const startTime = performance.now();
 
   // 初始化进度对象
@@ -311,8 +380,8 @@ const executeWithBufferedQuestions = async (
         failed: failedCount
       });
 
-      // 保存结果到后端
-      await saveTestResult(test, result);
+      // 加入待写入队列，由写入器批量保存到后端
+      resultWriter.add(result);
 
     } catch (error) {
       console.error('处理问题失败:', error);
@@ -329,7 +398,7 @@ const executeWithBufferedQuestions = async (
   };
 
   // 使用Promise来控制测试完成
-  return new Promise((resolve, reject) => {
+  await new Promise<void>((resolve, reject) => {
     /**
      * 检查是否应该继续测试
      *
@@ -397,6 +466,9 @@ const executeWithBufferedQuestions = async (
       }
     }).catch(reject);
   });
+
+  // 写入剩余的测试结果，确保后端汇总指标时结果已全部落库
+  await resultWriter.flush();
 };
 
 // QuestionBufferManager已在文件顶部导入